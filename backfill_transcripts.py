@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+One-time copy of DJ transcripts from .txt files into tts_entries.text
+
+History and the API read transcripts from the database only. This fills in
+entries whose text is still empty from the .txt file next to their audio,
+creates entries for DJ plays whose audio never got one, and links those plays.
+Safe to re-run; entries that already have text are never touched.
+
+Usage:
+    backfill_transcripts.py [--dry-run] [--tts-dir DIR ...]
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DATABASE_PATH, DatabaseManager, clean_transcript
+
+TTS_DIRS = ["/opt/ai-radio/tts", "/opt/ai-radio/tts_queue"]
+
+UNLINKED_COUNT_SQL = """
+    SELECT COUNT(*) FROM play_history
+    WHERE type = 'dj' AND tts_entry_id IS NULL AND filename LIKE '%.mp3'
+"""
+
+
+def read_transcript(audio_path: str) -> str:
+    """Text of the .txt file beside an audio file, or "" if there is none"""
+    txt_path = os.path.splitext(audio_path)[0] + ".txt"
+    try:
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            return clean_transcript(f.read())
+    except OSError:
+        return ""
+    except UnicodeDecodeError as e:
+        print(f"Warning: Could not read {txt_path}: {e}")
+        return ""
+
+
+def find_transcript(audio_filename: str, tts_dirs: List[str], audio_path: Optional[str] = None) -> str:
+    """Look for the transcript beside audio_path first, then in each TTS directory"""
+    candidates = [audio_path] if audio_path else []
+    candidates += [os.path.join(directory, audio_filename) for directory in tts_dirs]
+    for candidate in candidates:
+        text = read_transcript(candidate)
+        if text:
+            return text
+    return ""
+
+
+def backfill_transcripts(manager: DatabaseManager, tts_dirs: List[str] = TTS_DIRS,
+                         dry_run: bool = False) -> Dict[str, int]:
+    """
+    Copy on-disk transcripts into the database.
+
+    Returns:
+        Counts: "filled" entries given text, "created" entries for unknown
+        audio, newly "linked" DJ plays and "missing" transcripts found nowhere
+    """
+    counts = {"filled": 0, "created": 0, "linked": 0, "missing": 0}
+
+    with manager.get_connection() as conn:
+        empty = conn.execute("""
+            SELECT audio_filename FROM tts_entries WHERE text IS NULL OR text = ''
+        """).fetchall()
+        unlinked = conn.execute("""
+            SELECT DISTINCT filename FROM play_history
+            WHERE type = 'dj' AND tts_entry_id IS NULL AND filename LIKE '%.mp3'
+        """).fetchall()
+        known = {row[0] for row in conn.execute("SELECT audio_filename FROM tts_entries")}
+        unlinked_rows = conn.execute(UNLINKED_COUNT_SQL).fetchone()[0]
+
+    # Everything is read from disk first, so the write transaction stays short
+    fills = []
+    for (audio_filename,) in empty:
+        text = find_transcript(audio_filename, tts_dirs)
+        if text:
+            fills.append((text, audio_filename))
+        else:
+            counts["missing"] += 1
+    creates = {}
+    for (audio_path,) in unlinked:
+        audio_filename = os.path.basename(audio_path)
+        if audio_filename in known or audio_filename in creates:
+            continue
+        text = find_transcript(audio_filename, tts_dirs, audio_path)
+        if text:
+            creates[audio_filename] = text
+        else:
+            counts["missing"] += 1
+
+    counts["filled"] = len(fills)
+    counts["created"] = len(creates)
+    if dry_run:
+        return counts
+
+    with manager.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            UPDATE tts_entries SET text = ?
+            WHERE audio_filename = ? AND (text IS NULL OR text = '')
+        """, fills)
+        conn.commit()
+    for audio_filename, text in creates.items():
+        manager.save_transcript(audio_filename, text)
+
+    # Same basename join the schema migration and insert trigger use
+    with manager.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE play_history SET tts_entry_id = (
+                SELECT id FROM tts_entries
+                WHERE audio_filename = replace(play_history.filename,
+                    rtrim(play_history.filename, replace(play_history.filename, '/', '')), '')
+                ORDER BY id DESC LIMIT 1
+            )
+            WHERE type = 'dj' AND tts_entry_id IS NULL AND filename LIKE '%.mp3'
+        """)
+        conn.commit()
+        still_unlinked = conn.execute(UNLINKED_COUNT_SQL).fetchone()[0]
+    counts["linked"] = unlinked_rows - still_unlinked
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy DJ transcripts from .txt files into the database")
+    parser.add_argument("--db", default=DATABASE_PATH)
+    parser.add_argument("--tts-dir", action="append", dest="tts_dirs",
+                        help=f"directory holding TTS audio and .txt files (default {', '.join(TTS_DIRS)})")
+    parser.add_argument("--dry-run", action="store_true", help="count what would change without writing")
+    args = parser.parse_args()
+
+    manager = DatabaseManager(args.db)
+    try:
+        counts = backfill_transcripts(manager, args.tts_dirs or TTS_DIRS, dry_run=args.dry_run)
+    finally:
+        manager.writer.close()
+        manager.close()
+
+    prefix = "Would fill" if args.dry_run else "✅ Filled"
+    print(f"{prefix} {counts['filled']} entries, created {counts['created']}; "
+          f"{counts['linked']} DJ plays newly linked, {counts['missing']} transcripts not found")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
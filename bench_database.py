@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark history reads while another thread keeps inserting
+
+Compares the previous behaviour (process-wide lock, fresh rollback-journal
+connection per call), the pooled WAL DatabaseManager with synchronous inserts,
+and the same manager with inserts queued to the batched writer, on a scratch
+copy of the schema.
+
+Usage:
+    bench_database.py [--rows 20000] [--readers 4] [--seconds 5] [--write-rate 200]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DatabaseManager
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_init.sql")
+
+
+class LegacyDatabaseManager(DatabaseManager):
+    """The old behaviour: global lock, a new connection and a commit per insert"""
+
+    _lock = threading.Lock()
+
+    @contextmanager
+    def get_connection(self):
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    def add_history_entry(self, entry_type, timestamp, title="", artist="", sync=True, **kwargs):
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO play_history (type, timestamp, title, artist) VALUES (?, ?, ?, ?)",
+                (entry_type, timestamp, title, artist))
+            conn.commit()
+            return cursor.lastrowid
+
+
+def create_database(path, rows):
+    conn = sqlite3.connect(path)
+    with open(SCHEMA) as f:
+        conn.executescript(f.read())
+    start = int(time.time() * 1000) - rows * 1000
+    conn.executemany(
+        "INSERT INTO play_history (type, timestamp, title, artist, album, filename) VALUES ('song', ?, ?, ?, ?, ?)",
+        ((start + i * 1000, f"Title {i}", f"Artist {i % 500}", f"Album {i % 2000}", f"/mnt/music/{i}.mp3")
+         for i in range(rows)))
+    conn.commit()
+    # The legacy manager used the default rollback journal
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+
+
+def run(manager, readers, seconds, sync, write_rate):
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0]
+    insert_time = [0.0]
+
+    def writer():
+        timestamp = int(time.time() * 1000)
+        started = time.monotonic()
+        while not stop.is_set():
+            timestamp += 1
+            call_started = time.perf_counter()
+            manager.add_history_entry("song", timestamp, title="Bench", artist="Writer", sync=sync)
+            insert_time[0] += time.perf_counter() - call_started
+            writes[0] += 1
+            if write_rate:
+                # Pace inserts so every manager sees the same write load
+                delay = started + writes[0] / write_rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def reader(slot):
+        while not stop.is_set():
+            manager.get_history(limit=50)
+            reads[slot] += 1
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / seconds, writes[0] / seconds, insert_time[0] / max(writes[0], 1) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent read benchmark for DatabaseManager")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-rate", type=float, default=200,
+                        help="inserts per second offered by the writer (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rate = f"{args.write_rate:.0f}/s" if args.write_rate else "unthrottled"
+        print(f"{args.rows} history rows, {args.readers} reader threads, 1 writer ({rate}), {args.seconds:.0f}s each")
+        print(f"{'manager':<10} {'reads/s':>10} {'writes/s':>10} {'insert us':>10}")
+        runs = (("legacy", LegacyDatabaseManager, True),
+                ("pooled", DatabaseManager, True),
+                ("batched", DatabaseManager, False))
+        for name, cls, sync in runs:
+            path = os.path.join(tmp, f"{name}.db")
+            create_database(path, args.rows)
+            manager = cls(path)
+            reads, writes, insert_us = run(manager, args.readers, args.seconds, sync, args.write_rate)
+            manager.writer.close()
+            manager.close()
+            print(f"{name:<10} {reads:>10.0f} {writes:>10.0f} {insert_us:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
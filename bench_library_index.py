@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark the library index on a synthetic music library
+
+Writes a tree of small tagged WAV files (artist/album/track), then reports
+progress and throughput for a cold scan, a scan resumed after losing half
+the index (as after an interruption), and an unchanged rescan, and compares
+indexed cover and track lookups with the find search they replace.
+
+Usage:
+    bench_library_index.py [--files 100000] [--workers N] [--lookups 200]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from library_index import SCAN_WORKERS, LibraryIndex, print_progress, scan_library
+
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 4
+TEMPLATES = 64  # distinct tagged files; every track is a copy of one of them
+
+
+def make_template(path, index):
+    from mutagen.id3 import APIC, TALB, TIT2, TPE1
+    from mutagen.wave import WAVE
+
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\0\0" * 800)
+    audio = WAVE(path)
+    audio.add_tags()
+    audio.tags.add(TIT2(encoding=3, text=f"Title {index}"))
+    audio.tags.add(TPE1(encoding=3, text=f"Artist {index}"))
+    audio.tags.add(TALB(encoding=3, text=f"Album {index}"))
+    if index % 2 == 0:
+        audio.tags.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="", data=b"\xff\xd8" + b"\0" * 2048))
+    audio.save()
+
+
+def build_library(root, files):
+    os.makedirs(root, exist_ok=True)
+    templates = []
+    for i in range(TEMPLATES):
+        path = os.path.join(root, f".template_{i}.wav")
+        make_template(path, i)
+        with open(path, "rb") as f:
+            templates.append(f.read())
+        os.remove(path)
+    for i in range(files):
+        album = i // TRACKS_PER_ALBUM
+        directory = os.path.join(root, f"Artist {album // ALBUMS_PER_ARTIST}", f"Album {album}")
+        if i % TRACKS_PER_ALBUM == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{i % TRACKS_PER_ALBUM:02d} Track {i}.wav"), "wb") as f:
+            f.write(templates[i % TEMPLATES])
+
+
+def timed(phase, function):
+    print(f"{phase}:")
+    start = time.perf_counter()
+    stats = function()
+    return phase, stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Library index scan benchmark")
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=SCAN_WORKERS)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "music")
+        db_path = os.path.join(tmp, "library_index.db")
+        start = time.perf_counter()
+        build_library(root, args.files)
+        print(f"Wrote {args.files} files in {time.perf_counter() - start:.1f}s")
+
+        scan = lambda: scan_library(db_path, [root], args.workers, progress=print_progress)
+        results = [timed("cold scan", scan)]
+
+        # Lose the second half of the index and leave the scan unfinished, as a crash would
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM library_files WHERE rowid > (SELECT MAX(rowid) / 2 FROM library_files)")
+        conn.execute("UPDATE library_scans SET finished_at = NULL")
+        conn.commit()
+        conn.close()
+        results.append(timed("resumed scan", scan))
+        results.append(timed("unchanged rescan", scan))
+
+        print(f"\n{args.workers} workers, {args.files} files")
+        print(f"{'phase':<18} {'read':>8} {'unchanged':>10} {'seconds':>9} {'files/s':>9}")
+        for phase, stats, seconds in results:
+            print(f"{phase:<18} {stats['probed']:>8} {stats['unchanged']:>10} {seconds:>9.2f} "
+                  f"{stats['files'] / seconds:>9.0f}")
+
+        index = LibraryIndex(db_path)
+        albums = max(1, args.files // TRACKS_PER_ALBUM)
+        picks = [random.randrange(TEMPLATES) for _ in range(args.lookups)]
+        start = time.perf_counter()
+        hits = sum(1 for i in picks if index.find_art(f"Artist {i}", f"Album {i}"))
+        art_ms = (time.perf_counter() - start) / args.lookups * 1e3
+        start = time.perf_counter()
+        hits += sum(1 for i in picks if index.find_track(f"artist {i}", f"TITLE {i}"))
+        track_ms = (time.perf_counter() - start) / args.lookups * 1e3
+        index.close()
+
+        # What /api/cover/online used to run per pattern
+        finds = max(1, args.lookups // 50)
+        start = time.perf_counter()
+        for _ in range(finds):
+            subprocess.run(["find", root, "-type", "f", "-iname", "*.wav",
+                            "-ipath", f"*Album {random.randrange(albums)}*"], capture_output=True)
+        find_ms = (time.perf_counter() - start) / finds * 1e3
+
+        print(f"\n{'lookup':<18} {'ms/call':>10}")
+        print(f"{'find_art':<18} {art_ms:>10.3f}")
+        print(f"{'find_track':<18} {track_ms:>10.3f}")
+        print(f"{'find subprocess':<18} {find_ms:>10.1f}")
+        print(f"Hit rate: {hits / (2 * args.lookups):.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the Liquidsoap metadata parser
+
+Usage:
+    bench_metadata_parser.py --record     # capture real responses from Liquidsoap
+    bench_metadata_parser.py              # benchmark recorded (or synthetic) responses
+
+Recorded responses are stored as raw bytes in cache/liquidsoap_samples/ so the
+benchmark runs against exactly what the telnet socket returned, cover art included.
+"""
+
+import argparse
+import base64
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from liquidsoap_client import get_client, LiquidsoapError
+from liquidsoap_metadata import parse_kv, parse_sections
+
+SAMPLES_DIR = Path(__file__).resolve().parent / "cache" / "liquidsoap_samples"
+
+
+def record(samples_dir):
+    """Save output.icecast.metadata and every queued request.metadata response"""
+    client = get_client()
+    samples_dir.mkdir(parents=True, exist_ok=True)
+
+    responses = {"output.icecast.metadata": client.command_raw("output.icecast.metadata")}
+    rid_lines = client.command("request.all")
+    for rid in re.findall(r'\d+', rid_lines[0])[:8] if rid_lines else []:
+        responses[f"request.metadata {rid}"] = client.command_raw(f"request.metadata {rid}")
+
+    for cmd, raw in responses.items():
+        path = samples_dir / (cmd.replace(" ", "_").replace(".", "_") + ".bin")
+        path.write_bytes(raw)
+        print(f"Recorded {cmd}: {len(raw)} bytes -> {path}")
+
+
+def synthetic_samples():
+    """Responses shaped like real ones, with a 256 KB embedded cover"""
+    cover = base64.b64encode(os.urandom(192 * 1024))
+    track = (b'title="Song \\"Live\\""\r\nartist="Caf\xc3\xa9 Band"\r\nalbum="Album"\r\n'
+             b'filename="/mnt/music/a.mp3"\r\nitunsmpb=" 00000000 00000210 000007C8"\r\n'
+             b'cover="' + cover + b'"\r\n')
+    sections = b"".join(b"--- %d ---\r\n" % n + track for n in range(1, 6))
+    return {"output.icecast.metadata (synthetic)": sections,
+            "request.metadata (synthetic)": track}
+
+
+def load_samples(samples_dir):
+    samples = {path.stem: path.read_bytes() for path in sorted(samples_dir.glob("*.bin"))}
+    return samples or synthetic_samples()
+
+
+def legacy_parse_sections(raw):
+    """The previous approach: decode everything, then split and strip every line"""
+    sections, current, num = {}, {}, None
+    for line in raw.decode("utf-8", errors="ignore").splitlines():
+        line = line.strip()
+        if line.startswith("--- ") and line.endswith(" ---"):
+            if num is not None and current:
+                sections[num] = current
+            num, current = int(line[4:-4]), {}
+        elif "=" in line and not line.startswith("itunsmpb") and not line.startswith("cover"):
+            key, value = line.split("=", 1)
+            current[key.strip()] = value.strip().strip('"')
+    if num is not None and current:
+        sections[num] = current
+    return sections or {0: current}
+
+
+def bench(func, raw, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(raw)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--record", action="store_true", help="record responses from Liquidsoap")
+    parser.add_argument("--samples", type=Path, default=SAMPLES_DIR)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.record:
+        try:
+            record(args.samples)
+        except LiquidsoapError as e:
+            print(f"Recording failed: {e}")
+            return 1
+        return 0
+
+    print(f"{'sample':<40} {'bytes':>9} {'legacy us':>10} {'shared us':>10} {'speedup':>8}")
+    for name, raw in load_samples(args.samples).items():
+        new = parse_sections if b"--- " in raw else parse_kv
+        legacy_us = bench(legacy_parse_sections, raw, args.rounds)
+        new_us = bench(new, raw, args.rounds)
+        print(f"{name:<40} {len(raw):>9} {legacy_us:>10.1f} {new_us:>10.1f} {legacy_us / new_us:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
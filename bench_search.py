@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark transcript search on a large TTS table
+
+Fills a scratch database with synthetic DJ transcripts (Zipf-distributed
+words), then compares a LIKE scan of tts_entries.text with
+DatabaseManager.search (FTS5, ranked, with snippets) for rare and common words.
+
+Usage:
+    bench_search.py [--transcripts 300000] [--queries 50]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DatabaseManager
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_init.sql")
+
+# Zipf-like vocabulary: a few words are in most transcripts, most words are rare
+VOCABULARY = [f"w{i}" for i in range(20000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+
+def create_database(path, transcripts):
+    conn = sqlite3.connect(path)
+    with open(SCHEMA) as f:
+        conn.executescript(f.read())
+    rng = random.Random(1)
+    conn.executemany(
+        "INSERT INTO tts_entries (timestamp, text, audio_filename, text_filename) VALUES (?, ?, ?, ?)",
+        ((i, " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=40)), f"{i}.mp3", f"{i}.txt")
+         for i in range(transcripts)))
+    conn.commit()
+    conn.close()
+
+
+def timed(run, queries):
+    start = time.perf_counter()
+    for query in queries:
+        run(query)
+    return (time.perf_counter() - start) / len(queries) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search benchmark")
+    parser.add_argument("--transcripts", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rare = [f"w{random.randrange(5000, 20000)}" for _ in range(args.queries)]
+    common = [f"w{random.randrange(10, 100)} w{random.randrange(10, 100)}" for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search.db")
+        start = time.perf_counter()
+        create_database(path, args.transcripts)
+        print(f"Built {args.transcripts} transcripts in {time.perf_counter() - start:.1f}s")
+
+        manager = DatabaseManager(path)
+        start = time.perf_counter()
+        with manager.get_connection():
+            pass  # first connection builds the FTS indexes
+        print(f"Migration + index build: {time.perf_counter() - start:.1f}s")
+
+        with manager.get_connection() as conn:
+            like = lambda q: conn.execute(
+                "SELECT id, text FROM tts_entries WHERE text LIKE ? ORDER BY timestamp DESC LIMIT 20",
+                (f"%{q.split()[0]}%",)).fetchall()
+            like_rare = timed(like, rare[:5])
+            like_common = timed(like, common[:5])
+
+        print(f"{'query':<10} {'LIKE ms':>10} {'FTS ms':>10}")
+        print(f"{'rare':<10} {like_rare:>10.1f} {timed(lambda q: manager.search(q, kind='dj'), rare):>10.2f}")
+        print(f"{'common':<10} {like_common:>10.1f} {timed(lambda q: manager.search(q, kind='dj'), common):>10.2f}")
+        manager.writer.close()
+        manager.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark lookup_track_info on a large play history
+
+Builds a scratch database in the pre-migration layout (no key columns),
+times the migration that adds and backfills artist_key/title_key, then
+compares the old LOWER() scan with the indexed lookup.
+
+Usage:
+    bench_track_lookup.py [--rows 1000000] [--lookups 200]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DatabaseManager
+
+LEGACY_QUERY = """
+    SELECT filename, album, timestamp
+    FROM play_history
+    WHERE LOWER(artist) = LOWER(?)
+    AND LOWER(title) = LOWER(?)
+    AND type = 'song'
+    ORDER BY timestamp DESC
+    LIMIT 1
+"""
+
+
+def create_legacy_database(path, rows):
+    """play_history as it looked before the key columns were added"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE play_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL CHECK (type IN ('song', 'dj')),
+            timestamp INTEGER NOT NULL,
+            title TEXT, artist TEXT, album TEXT, filename TEXT, artwork_url TEXT,
+            tts_entry_id INTEGER, metadata TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX idx_history_timestamp ON play_history(timestamp);
+        CREATE INDEX idx_history_type ON play_history(type);
+        CREATE TABLE tts_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp INTEGER NOT NULL UNIQUE,
+            text TEXT NOT NULL, audio_filename TEXT NOT NULL, text_filename TEXT NOT NULL,
+            track_title TEXT, track_artist TEXT,
+            mode TEXT DEFAULT 'custom', status TEXT DEFAULT 'active',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            file_size INTEGER, audio_duration REAL
+        );
+    """)
+    start = int(time.time() * 1000) - rows * 1000
+    conn.executemany(
+        "INSERT INTO play_history (type, timestamp, title, artist, album, filename) VALUES (?, ?, ?, ?, ?, ?)",
+        (("dj" if i % 10 == 0 else "song", start + i * 1000, f"Title {i % 50000}", f"Artist {i % 5000}",
+          f"Album {i % 8000}", f"/mnt/music/{i % 50000}.mp3") for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def timed_lookups(lookup, pairs):
+    start = time.perf_counter()
+    hits = sum(1 for artist, title in pairs if lookup(artist, title))
+    return (time.perf_counter() - start) / len(pairs) * 1e3, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lookup_track_info benchmark")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    # Mixed case and stray whitespace, as metadata arrives from Liquidsoap
+    pairs = [(f"  artist {i % 5000}", f"TITLE  {i}") for i in random.sample(range(50000), args.lookups)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        start = time.perf_counter()
+        create_legacy_database(path, args.rows)
+        print(f"Built {args.rows} history rows in {time.perf_counter() - start:.1f}s")
+
+        conn = sqlite3.connect(path)
+        legacy_lookup = lambda artist, title: conn.execute(
+            LEGACY_QUERY, (" ".join(artist.split()), " ".join(title.split()))).fetchone()
+        legacy_ms, legacy_hits = timed_lookups(legacy_lookup, pairs[:max(1, args.lookups // 20)])
+        conn.close()
+
+        manager = DatabaseManager(path)
+        start = time.perf_counter()
+        with manager.get_connection():
+            pass  # first connection runs the migration and backfill
+        print(f"Migration + backfill: {time.perf_counter() - start:.1f}s")
+
+        indexed_ms, indexed_hits = timed_lookups(manager.lookup_track_info, pairs)
+        manager.close()
+
+        print(f"{'lookup':<10} {'ms/call':>10} {'hit rate':>10}")
+        print(f"{'LOWER()':<10} {legacy_ms:>10.2f} {legacy_hits / max(1, args.lookups // 20):>10.0%}")
+        print(f"{'indexed':<10} {indexed_ms:>10.3f} {indexed_hits / args.lookups:>10.0%}")
+        print(f"Speedup: {legacy_ms / indexed_ms:.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,48 +4,708 @@ Database helper module for AI Radio
 Provides SQLite database operations for TTS entries and play history
 """
 
+import atexit
+import html
 import sqlite3
 import json
+import re
 import os
+import queue
+import threading
 import time
 from contextlib import contextmanager
-from threading import Lock
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Sequence, Tuple
 
 DATABASE_PATH = "/opt/ai-radio/ai_radio.db"
 
-# Thread-safe database operations
-_db_lock = Lock()
+# Connection pool and per-connection tuning
+POOL_SIZE = 8  # idle connections kept open per process
+BUSY_TIMEOUT_MS = 5000  # wait this long for a competing writer before failing
+CACHE_SIZE_KB = 8192  # page cache per connection
+MMAP_SIZE = 64 * 1024 * 1024  # memory-mapped I/O for reads
+JOURNAL_SIZE_LIMIT = 64 * 1024 * 1024  # truncate the WAL back to this after a checkpoint
+
+# Background writer: inserts are committed together, one transaction per batch
+WRITE_QUEUE_SIZE = 1000  # pending inserts before callers wait for room
+WRITE_BATCH_SIZE = 64  # commit once this many inserts are pending...
+WRITE_BATCH_WINDOW = 0.25  # ...or this many seconds after the first one
+WRITE_PUT_TIMEOUT = 2.0  # seconds to wait for room before writing inline
+READ_FLUSH_TIMEOUT = 1.0  # history reads wait this long for queued rows to land
+
+HOUR_MS = 3600000  # activity_hourly bucket width; timestamps are in milliseconds
+
+# Full-text search: snippet markers (swapped for <mark> after HTML escaping) and size
+SNIPPET_OPEN, SNIPPET_CLOSE = "\x02", "\x03"
+SNIPPET_TOKENS = 16
+SEARCH_RANK_WINDOW = 2000  # broad queries rank only the newest this-many matches per side
+
+# play_history columns that song plays leave NULL when they match the linked track
+TRACK_FIELDS = ("album", "filename", "artwork_url")
+
+def normalize_key(value: Optional[str]) -> str:
+    """Lookup key for artist/title matching: whitespace collapsed and casefolded"""
+    return " ".join(str(value or "").split()).casefold()
+
+def _column_names(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _migrate_track_keys(conn: sqlite3.Connection):
+    """Add normalized artist/title keys to play_history, backfill them and index them"""
+    columns = _column_names(conn, "play_history")
+    for column in ("artist_key", "title_key"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE play_history ADD COLUMN {column} TEXT")
+    conn.execute("""
+        UPDATE play_history
+        SET artist_key = normalize_key(artist), title_key = normalize_key(title)
+        WHERE artist_key IS NULL OR title_key IS NULL
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_history_track_key
+        ON play_history(artist_key, title_key, timestamp) WHERE type = 'song'
+    """)
+
+_STAT_COUNTER_DDL = [
+    """
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    """
+        -- Plays per hour; hour = timestamp (ms) / 3600000
+        CREATE TABLE IF NOT EXISTS activity_hourly (
+            hour INTEGER PRIMARY KEY,
+            plays INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_tts_insert AFTER INSERT ON tts_entries
+        BEGIN
+            UPDATE stat_counters SET value = value + 1 WHERE name = 'tts_total';
+            UPDATE stat_counters SET value = value + 1 WHERE name = 'tts_active' AND NEW.status = 'active';
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_tts_delete AFTER DELETE ON tts_entries
+        BEGIN
+            UPDATE stat_counters SET value = value - 1 WHERE name = 'tts_total';
+            UPDATE stat_counters SET value = value - 1 WHERE name = 'tts_active' AND OLD.status = 'active';
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_tts_status AFTER UPDATE OF status ON tts_entries
+        WHEN (OLD.status = 'active') != (NEW.status = 'active')
+        BEGIN
+            UPDATE stat_counters
+            SET value = value + (CASE WHEN NEW.status = 'active' THEN 1 ELSE -1 END)
+            WHERE name = 'tts_active';
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_history_insert AFTER INSERT ON play_history
+        BEGIN
+            UPDATE stat_counters SET value = value + 1 WHERE name = 'history_' || NEW.type;
+            INSERT INTO activity_hourly (hour, plays) VALUES (NEW.timestamp / 3600000, 1)
+                ON CONFLICT(hour) DO UPDATE SET plays = plays + 1;
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_history_delete AFTER DELETE ON play_history
+        BEGIN
+            UPDATE stat_counters SET value = value - 1 WHERE name = 'history_' || OLD.type;
+            UPDATE activity_hourly SET plays = plays - 1 WHERE hour = OLD.timestamp / 3600000;
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_history_update AFTER UPDATE OF type, timestamp ON play_history
+        BEGIN
+            UPDATE stat_counters SET value = value - 1 WHERE name = 'history_' || OLD.type;
+            UPDATE stat_counters SET value = value + 1 WHERE name = 'history_' || NEW.type;
+            UPDATE activity_hourly SET plays = plays - 1 WHERE hour = OLD.timestamp / 3600000;
+            INSERT INTO activity_hourly (hour, plays) VALUES (NEW.timestamp / 3600000, 1)
+                ON CONFLICT(hour) DO UPDATE SET plays = plays + 1;
+        END
+    """,
+]
+
+def _migrate_stat_counters(conn: sqlite3.Connection):
+    """
+    Create the counters and hourly activity buckets behind get_stats.
+    
+    Triggers keep them current for every writer (including scripts that bypass
+    DatabaseManager); the one-time seed below is the last full COUNT(*) scan.
+    """
+    for statement in _STAT_COUNTER_DDL:
+        conn.execute(statement)
+    
+    # Seed from the current contents, in the same transaction that created the triggers
+    conn.execute("DELETE FROM stat_counters")
+    conn.execute("DELETE FROM activity_hourly")
+    conn.execute("""
+        INSERT INTO stat_counters (name, value)
+        SELECT 'tts_total', COUNT(*) FROM tts_entries
+        UNION ALL SELECT 'tts_active', COUNT(*) FROM tts_entries WHERE status = 'active'
+        UNION ALL SELECT 'history_song', COUNT(*) FROM play_history WHERE type = 'song'
+        UNION ALL SELECT 'history_dj', COUNT(*) FROM play_history WHERE type = 'dj'
+    """)
+    conn.execute("""
+        INSERT INTO activity_hourly (hour, plays)
+        SELECT timestamp / 3600000, COUNT(*) FROM play_history GROUP BY timestamp / 3600000
+    """)
+
+_TRACKS_DDL = [
+    """
+        CREATE TABLE IF NOT EXISTS tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            artist_key TEXT NOT NULL,
+            title_key TEXT NOT NULL,
+            title TEXT,
+            artist TEXT,
+            album TEXT,
+            filename TEXT,
+            artwork_url TEXT,
+            play_count INTEGER NOT NULL DEFAULT 0,
+            first_played_at INTEGER,
+            last_played_at INTEGER,
+            UNIQUE (artist_key, title_key)
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_tracks_last_played ON tracks(last_played_at)",
+    "CREATE INDEX IF NOT EXISTS idx_tracks_play_count ON tracks(play_count, last_played_at)",
+    "CREATE INDEX IF NOT EXISTS idx_history_track ON play_history(track_id, timestamp)",
+    """
+        -- Upsert the track, link the play to it and keep only per-play values that differ
+        CREATE TRIGGER IF NOT EXISTS trg_tracks_history_insert AFTER INSERT ON play_history
+        WHEN NEW.type = 'song' AND NEW.track_id IS NULL
+            AND NEW.artist_key IS NOT NULL AND NEW.title_key IS NOT NULL
+        BEGIN
+            INSERT INTO tracks (artist_key, title_key, title, artist, album, filename, artwork_url,
+                                play_count, first_played_at, last_played_at)
+            VALUES (NEW.artist_key, NEW.title_key, NEW.title, NEW.artist, NEW.album, NEW.filename,
+                    NEW.artwork_url, 1, NEW.timestamp, NEW.timestamp)
+            ON CONFLICT(artist_key, title_key) DO UPDATE SET
+                play_count = play_count + 1,
+                last_played_at = MAX(COALESCE(last_played_at, 0), excluded.last_played_at);
+            UPDATE play_history SET
+                track_id = (SELECT id FROM tracks WHERE artist_key = NEW.artist_key AND title_key = NEW.title_key),
+                album = NULLIF(album, (SELECT album FROM tracks
+                                       WHERE artist_key = NEW.artist_key AND title_key = NEW.title_key)),
+                filename = NULLIF(filename, (SELECT filename FROM tracks
+                                             WHERE artist_key = NEW.artist_key AND title_key = NEW.title_key)),
+                artwork_url = NULLIF(artwork_url, (SELECT artwork_url FROM tracks
+                                                   WHERE artist_key = NEW.artist_key AND title_key = NEW.title_key))
+            WHERE id = NEW.id;
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_tracks_history_delete AFTER DELETE ON play_history
+        WHEN OLD.track_id IS NOT NULL
+        BEGIN
+            UPDATE tracks SET
+                play_count = play_count - 1,
+                last_played_at = (SELECT MAX(timestamp) FROM play_history WHERE track_id = OLD.track_id)
+            WHERE id = OLD.track_id;
+        END
+    """,
+]
+
+def _migrate_tracks(conn: sqlite3.Connection):
+    """
+    Split track metadata out of play_history into a tracks table.
+    
+    Each song play links to its track by track_id. A track keeps the metadata
+    from its first play; a play row stores album/filename/artwork_url only where
+    they differ from the track's (NULL means "same as the track"), so nothing is
+    lost and the common row carries just the play itself.
+    """
+    if "track_id" not in _column_names(conn, "play_history"):
+        conn.execute("ALTER TABLE play_history ADD COLUMN track_id INTEGER REFERENCES tracks(id)")
+    for statement in _TRACKS_DDL:
+        conn.execute(statement)
+    # Lookups seek tracks(artist_key, title_key) now; the play_history key index only cost inserts
+    conn.execute("DROP INDEX IF EXISTS idx_history_track_key")
+    
+    # Backfill: one track per key with the metadata of its earliest play (the bare
+    # columns come from the MIN(timestamp) row), then link and thin the plays
+    conn.execute("""
+        INSERT OR IGNORE INTO tracks (artist_key, title_key, title, artist, album, filename, artwork_url,
+                                      play_count, first_played_at)
+        SELECT artist_key, title_key, title, artist, album, filename, artwork_url, COUNT(*), MIN(timestamp)
+        FROM play_history
+        WHERE type = 'song' AND track_id IS NULL AND artist_key IS NOT NULL AND title_key IS NOT NULL
+        GROUP BY artist_key, title_key
+    """)
+    conn.execute("""
+        UPDATE play_history SET track_id = (
+            SELECT id FROM tracks t
+            WHERE t.artist_key = play_history.artist_key AND t.title_key = play_history.title_key
+        )
+        WHERE type = 'song' AND track_id IS NULL AND artist_key IS NOT NULL AND title_key IS NOT NULL
+    """)
+    conn.execute("""
+        UPDATE play_history SET
+            album = NULLIF(album, (SELECT album FROM tracks t WHERE t.id = play_history.track_id)),
+            filename = NULLIF(filename, (SELECT filename FROM tracks t WHERE t.id = play_history.track_id)),
+            artwork_url = NULLIF(artwork_url, (SELECT artwork_url FROM tracks t WHERE t.id = play_history.track_id))
+        WHERE track_id IS NOT NULL
+    """)
+    conn.execute("""
+        UPDATE tracks SET
+            play_count = (SELECT COUNT(*) FROM play_history h WHERE h.track_id = tracks.id),
+            last_played_at = (SELECT MAX(timestamp) FROM play_history h WHERE h.track_id = tracks.id)
+    """)
+
+# Content columns behind each full-text index
+_SEARCH_COLUMNS = {
+    "tts_entries": ("text", "track_title", "track_artist"),
+    "tracks": ("title", "artist", "album"),
+}
+
+_SEARCH_DDL = [
+    # External-content indexes: the text lives once, in tts_entries and tracks
+    """
+        CREATE VIRTUAL TABLE IF NOT EXISTS tts_search USING fts5(
+            text, track_title, track_artist,
+            content='tts_entries', content_rowid='id', tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """,
+    """
+        CREATE VIRTUAL TABLE IF NOT EXISTS track_search USING fts5(
+            title, artist, album,
+            content='tracks', content_rowid='id', tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_tts_search_insert AFTER INSERT ON tts_entries
+        BEGIN
+            INSERT INTO tts_search (rowid, text, track_title, track_artist)
+            VALUES (NEW.id, NEW.text, NEW.track_title, NEW.track_artist);
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_tts_search_delete AFTER DELETE ON tts_entries
+        BEGIN
+            INSERT INTO tts_search (tts_search, rowid, text, track_title, track_artist)
+            VALUES ('delete', OLD.id, OLD.text, OLD.track_title, OLD.track_artist);
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_tts_search_update AFTER UPDATE OF text, track_title, track_artist
+        ON tts_entries
+        BEGIN
+            INSERT INTO tts_search (tts_search, rowid, text, track_title, track_artist)
+            VALUES ('delete', OLD.id, OLD.text, OLD.track_title, OLD.track_artist);
+            INSERT INTO tts_search (rowid, text, track_title, track_artist)
+            VALUES (NEW.id, NEW.text, NEW.track_title, NEW.track_artist);
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_track_search_insert AFTER INSERT ON tracks
+        BEGIN
+            INSERT INTO track_search (rowid, title, artist, album) VALUES (NEW.id, NEW.title, NEW.artist, NEW.album);
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_track_search_delete AFTER DELETE ON tracks
+        BEGIN
+            INSERT INTO track_search (track_search, rowid, title, artist, album)
+            VALUES ('delete', OLD.id, OLD.title, OLD.artist, OLD.album);
+        END
+    """,
+    """
+        CREATE TRIGGER IF NOT EXISTS trg_track_search_update AFTER UPDATE OF title, artist, album ON tracks
+        BEGIN
+            INSERT INTO track_search (track_search, rowid, title, artist, album)
+            VALUES ('delete', OLD.id, OLD.title, OLD.artist, OLD.album);
+            INSERT INTO track_search (rowid, title, artist, album) VALUES (NEW.id, NEW.title, NEW.artist, NEW.album);
+        END
+    """,
+]
+
+def _migrate_search(conn: sqlite3.Connection):
+    """
+    Full-text indexes over DJ transcripts and played tracks.
+    
+    Songs are searched through the tracks table, which holds each song's
+    title/artist/album once; play rows only link to it.
+    """
+    if not conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0]:
+        print("SQLite was built without FTS5; search is unavailable")
+        return
+    # An external-content rebuild reads every indexed column; older tables may lack some
+    for table, columns in _SEARCH_COLUMNS.items():
+        existing = _column_names(conn, table)
+        for column in columns:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+    for statement in _SEARCH_DDL:
+        conn.execute(statement)
+    # Default ORDER BY rank weights: a title hit beats an album hit
+    conn.execute("INSERT INTO tts_search (tts_search, rank) VALUES ('rank', 'bm25(1.0, 0.5, 0.5)')")
+    conn.execute("INSERT INTO track_search (track_search, rank) VALUES ('rank', 'bm25(3.0, 2.0, 1.0)')")
+    conn.execute("INSERT INTO tts_search (tts_search) VALUES ('rebuild')")
+    conn.execute("INSERT INTO track_search (track_search) VALUES ('rebuild')")
+
+# SQL basename of play_history.filename ("/opt/ai-radio/tts/intro_1.mp3" -> "intro_1.mp3")
+_HISTORY_BASENAME = "replace({f}, rtrim({f}, replace({f}, '/', '')), '')"
+
+_TRANSCRIPTS_DDL = [
+    "CREATE INDEX IF NOT EXISTS idx_tts_audio_filename ON tts_entries(audio_filename)",
+    # DJ plays arrive with just the audio path; link them to their TTS entry on the way in
+    f"""
+        CREATE TRIGGER IF NOT EXISTS trg_history_link_tts AFTER INSERT ON play_history
+        WHEN NEW.type = 'dj' AND NEW.tts_entry_id IS NULL AND NEW.filename LIKE '%.mp3'
+        BEGIN
+            UPDATE play_history SET tts_entry_id = (
+                SELECT id FROM tts_entries
+                WHERE audio_filename = {_HISTORY_BASENAME.format(f="NEW.filename")}
+                ORDER BY id DESC LIMIT 1
+            )
+            WHERE id = NEW.id;
+        END
+    """,
+]
+
+def _migrate_transcripts(conn: sqlite3.Connection):
+    """
+    Serve DJ transcripts from tts_entries.text alone.
+    
+    Links existing DJ plays to their TTS entry by audio filename; transcripts
+    still only on disk are copied in by backfill_transcripts.py.
+    """
+    for statement in _TRANSCRIPTS_DDL:
+        conn.execute(statement)
+    conn.execute(f"""
+        UPDATE play_history SET tts_entry_id = (
+            SELECT id FROM tts_entries
+            WHERE audio_filename = {_HISTORY_BASENAME.format(f="play_history.filename")}
+            ORDER BY id DESC LIMIT 1
+        )
+        WHERE type = 'dj' AND tts_entry_id IS NULL AND filename LIKE '%.mp3'
+    """)
+
+# Idempotent schema upgrades for existing databases, tracked in PRAGMA user_version
+SCHEMA_MIGRATIONS = [
+    (1, _migrate_track_keys),
+    (2, _migrate_stat_counters),
+    (3, _migrate_tracks),
+    (4, _migrate_search),
+    (5, _migrate_transcripts),
+]
+
+class _WriteRequest:
+    """One queued INSERT; sync callers wait on done for the row ID"""
+    __slots__ = ("sql", "params", "done", "rowid", "error", "on_commit")
+    
+    def __init__(self, sql: str, params: Sequence, sync: bool,
+                 on_commit: Optional[Callable[[int], None]] = None):
+        self.sql = sql
+        self.params = params
+        self.done = threading.Event() if sync else None
+        self.rowid = None
+        self.error = None
+        self.on_commit = on_commit
+
+# Queue marker asking the writer to commit what it has collected so far
+_FLUSH = object()
+
+class BatchedWriter:
+    """
+    Commits history and TTS inserts from a bounded queue on a background thread.
+    
+    Inserts are grouped into one transaction per batch (WRITE_BATCH_SIZE rows or
+    WRITE_BATCH_WINDOW seconds, whichever comes first), so request threads never
+    wait for the disk. A synchronous insert closes the batch immediately and
+    returns its row ID. Pending inserts are flushed at interpreter exit.
+    """
+    
+    def __init__(self, manager: "DatabaseManager", batch_size: int = WRITE_BATCH_SIZE,
+                 window: float = WRITE_BATCH_WINDOW, maxsize: int = WRITE_QUEUE_SIZE):
+        self.manager = manager
+        self.batch_size = batch_size
+        self.window = window
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._submitted = 0
+        self._completed = 0
+        self._idle = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+    
+    def submit(self, sql: str, params: Sequence, sync: bool = False,
+               on_commit: Optional[Callable[[int], None]] = None) -> Optional[int]:
+        """
+        Queue an INSERT.
+        
+        Args:
+            sql: Statement to execute
+            params: Statement parameters
+            sync: Wait for the commit and return the new row ID
+            on_commit: Called with the new row ID once it is committed (on the
+                writer thread, so it must be quick)
+            
+        Returns:
+            Row ID for synchronous inserts, None otherwise
+        """
+        self._ensure_started()
+        request = _WriteRequest(sql, params, sync, on_commit)
+        with self._idle:
+            self._submitted += 1
+        try:
+            self._queue.put(request, timeout=WRITE_PUT_TIMEOUT)
+        except queue.Full:
+            # Writer is backed up; never drop a row, write it on this thread instead
+            try:
+                request.rowid = self._write_inline(request)
+            finally:
+                self._done([request])
+            return request.rowid
+        
+        if request.done is None:
+            return None
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.rowid
+    
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every insert submitted before this call is committed.
+        
+        Inserts submitted afterwards are not waited for, so a busy writer
+        cannot starve readers that use this as a read barrier.
+        """
+        with self._idle:
+            target = self._submitted
+            if self._completed >= target:
+                return True
+        # Ask the writer to close its current batch now instead of at the window
+        try:
+            self._queue.put_nowait(_FLUSH)
+        except queue.Full:
+            pass
+        with self._idle:
+            return self._idle.wait_for(lambda: self._completed >= target, timeout=timeout)
+    
+    def close(self, timeout: float = 10):
+        """Flush pending inserts and stop the writer thread"""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+    
+    def _ensure_started(self):
+        # The thread does not survive a fork, so children start their own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            if first is _FLUSH:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stop = False
+            
+            # Collect until the batch is full, the window closes or someone is waiting
+            while len(batch) < self.batch_size and batch[-1].done is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                if request is _FLUSH:
+                    break
+                batch.append(request)
+            
+            self._commit(batch)
+            if stop:
+                # Drain whatever was queued behind the shutdown marker
+                leftovers = []
+                while True:
+                    try:
+                        request = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if request is not None and request is not _FLUSH:
+                        leftovers.append(request)
+                if leftovers:
+                    self._commit(leftovers)
+                return
+    
+    def _commit(self, batch: List[_WriteRequest]):
+        try:
+            with self.manager.get_connection() as conn:
+                cursor = conn.cursor()
+                for request in batch:
+                    try:
+                        cursor.execute(request.sql, request.params)
+                        request.rowid = cursor.lastrowid
+                    except sqlite3.Error as e:
+                        # A failed statement is undone on its own; the rest of the batch still commits
+                        request.error = e
+                        print(f"Error writing batched row: {e}")
+                conn.commit()
+        except Exception as e:
+            print(f"Error committing write batch of {len(batch)}: {e}")
+            for request in batch:
+                if request.error is None:
+                    request.error = e
+                    request.rowid = None
+        self._done(batch)
+    
+    def _done(self, batch: List[_WriteRequest]):
+        for request in batch:
+            if request.on_commit is not None and request.error is None and request.rowid:
+                try:
+                    request.on_commit(request.rowid)
+                except Exception as e:
+                    print(f"Error in commit callback: {e}")
+            if request.done is not None:
+                request.done.set()
+        with self._idle:
+            self._completed += len(batch)
+            self._idle.notify_all()
+    
+    def _write_inline(self, request: _WriteRequest) -> int:
+        with self.manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(request.sql, request.params)
+            conn.commit()
+            return cursor.lastrowid
 
 class DatabaseManager:
-    def __init__(self, db_path: str = DATABASE_PATH):
+    def __init__(self, db_path: str = DATABASE_PATH, pool_size: int = POOL_SIZE):
         self.db_path = db_path
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pid = os.getpid()
+        self._schema_checked = False
+        self._schema_lock = threading.Lock()
+        self.last_used = time.monotonic()  # when a connection was last borrowed (see db_maintenance)
+        self.writer = BatchedWriter(self)
+    
+    def migrate(self, conn: sqlite3.Connection) -> int:
+        """
+        Apply pending SCHEMA_MIGRATIONS, each in its own transaction.
+        
+        Returns:
+            The schema version after migrating
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'play_history'").fetchone():
+            return version  # schema not created yet (see init_database.py)
+        
+        for target, migration in SCHEMA_MIGRATIONS:
+            if version >= target:
+                continue
+            # IMMEDIATE takes the write lock up front, so concurrent processes migrate one at a time
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < target:
+                    print(f"Migrating database schema to version {target} ({migration.__name__})")
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                    version = target
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return version
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a tuned connection: WAL lets readers run alongside the writer"""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA journal_size_limit={JOURNAL_SIZE_LIMIT}")
+        conn.create_function("normalize_key", 1, normalize_key, deterministic=True)
+        
+        if not self._schema_checked:
+            with self._schema_lock:
+                if not self._schema_checked:
+                    self.migrate(conn)
+                    self._schema_checked = True
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        # Connections must not cross a fork; start a fresh pool in the child
+        if os.getpid() != self._pid:
+            self._pool = queue.LifoQueue(maxsize=self._pool.maxsize)
+            self._pid = os.getpid()
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+    
+    def _release(self, conn: sqlite3.Connection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
     
     @contextmanager
     def get_connection(self):
-        """Thread-safe database connection context manager"""
-        with _db_lock:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  # Enable dict-like access
+        """
+        Borrow a pooled connection for the duration of the block.
+        
+        Connections stay open between calls, so there is no global lock and no
+        per-call connect. Anything not committed by the caller is rolled back
+        before the connection goes back to the pool.
+        """
+        conn = self._acquire()
+        self.last_used = time.monotonic()
+        try:
+            yield conn
+        finally:
             try:
-                yield conn
-            finally:
-                conn.close()
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                conn.close()  # broken connection, don't hand it out again
+            else:
+                self._release(conn)
+    
+    def close(self):
+        """Close all idle pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
     
     def create_tts_entry(self, timestamp: int, text: str, audio_filename: str, 
                         text_filename: str, track_title: str = None, 
-                        track_artist: str = None, mode: str = 'custom') -> int:
-        """Create a new TTS entry and return its ID"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO tts_entries 
-                (timestamp, text, audio_filename, text_filename, track_title, track_artist, mode)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (timestamp, text, audio_filename, text_filename, track_title, track_artist, mode))
-            
-            conn.commit()
-            return cursor.lastrowid
+                        track_artist: str = None, mode: str = 'custom', sync: bool = True) -> Optional[int]:
+        """Create a new TTS entry and return its ID (None when sync=False)"""
+        return self.writer.submit("""
+            INSERT INTO tts_entries 
+            (timestamp, text, audio_filename, text_filename, track_title, track_artist, mode)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (timestamp, text, audio_filename, text_filename, track_title, track_artist, mode), sync=sync)
     
     def get_tts_entry_by_timestamp(self, timestamp: int) -> Optional[Dict]:
         """Get TTS entry by timestamp"""
@@ -63,40 +723,132 @@ class DatabaseManager:
             result = cursor.fetchone()
             return dict(result) if result else None
     
+    def get_transcripts(self, audio_filenames: Sequence[str]) -> Dict[str, str]:
+        """Transcript text for each audio filename that has one, in one query"""
+        names = list(dict.fromkeys(name for name in audio_filenames if name))
+        if not names:
+            return {}
+        with self.get_connection() as conn:
+            placeholders = ",".join("?" * len(names))
+            rows = conn.execute(f"""
+                SELECT audio_filename, text FROM tts_entries
+                WHERE audio_filename IN ({placeholders}) AND text IS NOT NULL AND text != ''
+                ORDER BY id
+            """, names).fetchall()
+            return {row[0]: row[1] for row in rows}
+    
+    def save_transcript(self, audio_filename: str, text: str, timestamp: int = None,
+                        mode: str = 'custom') -> bool:
+        """
+        Make sure a transcript is stored for audio_filename.
+        
+        Fills in the text of an entry that has none, or creates the entry when
+        the audio was generated without one. Existing text is left alone.
+        
+        Returns:
+            True if the transcript is now in the database
+        """
+        text = clean_transcript(text)
+        if not audio_filename or not text:
+            return False
+        if timestamp is None:
+            match = re.search(r'(\d{10,})', audio_filename)
+            timestamp = int(match.group(1)) if match else int(time.time())
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE tts_entries SET text = ?
+                    WHERE audio_filename = ? AND (text IS NULL OR text = '')
+                """, (text, audio_filename))
+                cursor.execute("SELECT 1 FROM tts_entries WHERE audio_filename = ?", (audio_filename,))
+                if cursor.fetchone() is None:
+                    # timestamp is UNIQUE and clips can share a second: take the next free one.
+                    # The UPDATE above already holds the write lock, so this cannot race.
+                    while cursor.execute("SELECT 1 FROM tts_entries WHERE timestamp = ?",
+                                         (timestamp,)).fetchone():
+                        timestamp += 1
+                    cursor.execute("""
+                        INSERT INTO tts_entries (timestamp, text, audio_filename, text_filename, mode)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (timestamp, text, audio_filename, os.path.splitext(audio_filename)[0] + ".txt", mode))
+                conn.commit()
+                return True
+        except sqlite3.Error as e:
+            print(f"Error saving transcript for {audio_filename}: {e}")
+            return False
+    
     def add_history_entry(self, entry_type: str, timestamp: int, title: str = "", 
                          artist: str = "", album: str = "", filename: str = "", 
                          artwork_url: str = "", tts_entry_id: int = None, 
-                         metadata: Dict = None) -> int:
-        """Add a new history entry"""
+                         metadata: Dict = None, sync: bool = True,
+                         on_commit: Optional[Callable[[int], None]] = None) -> Optional[int]:
+        """
+        Add a new history entry.
+        
+        With sync=False the row is committed by the background writer and None is
+        returned; with sync=True the call waits for the commit and returns the ID.
+        Either way on_commit, if given, receives the ID once the row is committed.
+        """
         metadata_json = json.dumps(metadata) if metadata else None
         
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO play_history 
-                (type, timestamp, title, artist, album, filename, artwork_url, tts_entry_id, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (entry_type, timestamp, title, artist, album, filename, artwork_url, tts_entry_id, metadata_json))
-            
-            conn.commit()
-            return cursor.lastrowid
+        return self.writer.submit("""
+            INSERT INTO play_history 
+            (type, timestamp, title, artist, album, filename, artwork_url, tts_entry_id, metadata,
+             artist_key, title_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (entry_type, timestamp, title, artist, album, filename, artwork_url, tts_entry_id, metadata_json,
+              normalize_key(artist), normalize_key(title)), sync=sync, on_commit=on_commit)
     
-    def get_history(self, limit: int = 100, offset: int = 0) -> List[Dict]:
-        """Get play history with optional pagination"""
+    def get_history(self, limit: int = 100, offset: int = 0,
+                    before: Optional[Tuple[int, int]] = None) -> List[Dict]:
+        """
+        Get play history, most recent first.
+        
+        Args:
+            limit: Maximum number of rows
+            offset: Rows to skip (legacy; cost grows with the offset)
+            before: Keyset cursor (timestamp, id) from parse_history_cursor; only
+                rows strictly older are returned and the page cost stays constant
+        """
+        self.writer.flush(timeout=READ_FLUSH_TIMEOUT)  # include rows still queued for the writer
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT h.*, t.text as tts_text, t.audio_filename as tts_audio
-                FROM play_history h
-                LEFT JOIN tts_entries t ON h.tts_entry_id = t.id
-                ORDER BY h.timestamp DESC
-                LIMIT ? OFFSET ?
-            """, (limit, offset))
+            if before is not None:
+                # Seeks straight into idx_history_timestamp (which carries id as the rowid)
+                cursor.execute("""
+                    SELECT h.*, t.text as tts_text, t.audio_filename as tts_audio,
+                           tr.album as track_album, tr.filename as track_filename,
+                           tr.artwork_url as track_artwork_url
+                    FROM play_history h
+                    LEFT JOIN tts_entries t ON h.tts_entry_id = t.id
+                    LEFT JOIN tracks tr ON h.track_id = tr.id
+                    WHERE (h.timestamp, h.id) < (?, ?)
+                    ORDER BY h.timestamp DESC, h.id DESC
+                    LIMIT ?
+                """, (before[0], before[1], limit))
+            else:
+                cursor.execute("""
+                    SELECT h.*, t.text as tts_text, t.audio_filename as tts_audio,
+                           tr.album as track_album, tr.filename as track_filename,
+                           tr.artwork_url as track_artwork_url
+                    FROM play_history h
+                    LEFT JOIN tts_entries t ON h.tts_entry_id = t.id
+                    LEFT JOIN tracks tr ON h.track_id = tr.id
+                    ORDER BY h.timestamp DESC, h.id DESC
+                    LIMIT ? OFFSET ?
+                """, (limit, offset))
             
             results = []
             for row in cursor.fetchall():
                 row_dict = dict(row)
                 
+                # Song plays only store metadata that differs from their track's
+                for field in TRACK_FIELDS:
+                    track_value = row_dict.pop(f'track_{field}', None)
+                    if row_dict.get(field) is None:
+                        row_dict[field] = track_value
+                
                 # Parse metadata JSON
                 if row_dict.get('metadata'):
                     try:
@@ -106,11 +858,9 @@ class DatabaseManager:
                 
                 # For DJ entries, ensure we have the right audio URL and text content
                 if row_dict['type'] == 'dj':
-                    filename = row_dict.get('filename', '')
-                    if filename and filename.startswith('/opt/ai-radio/tts/') and filename.endswith('.mp3'):
-                        # Extract just the filename from the full path
-                        tts_filename = filename.split('/')[-1]
-                        row_dict['audio_url'] = f"/api/tts/{tts_filename}"
+                    audio_url = dj_audio_url(row_dict.get('filename', ''))
+                    if audio_url:
+                        row_dict['audio_url'] = audio_url
                     
                     # Add TTS text as 'text' field for DJ entries
                     if row_dict.get('tts_text'):
@@ -192,18 +942,19 @@ class DatabaseManager:
             conn.commit()
     
     def lookup_track_info(self, artist: str, title: str) -> Optional[Dict]:
-        """Look up track information by artist and title from history"""
+        """Look up track information by artist and title from history (case- and spacing-insensitive)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            # One seek on the tracks key, then the newest play through idx_history_track
             cursor.execute("""
-                SELECT filename, album, timestamp 
-                FROM play_history 
-                WHERE LOWER(artist) = LOWER(?) 
-                AND LOWER(title) = LOWER(?) 
-                AND type = 'song'
-                ORDER BY timestamp DESC 
+                SELECT COALESCE(h.filename, t.filename), COALESCE(h.album, t.album), t.last_played_at
+                FROM tracks t
+                JOIN play_history h ON h.track_id = t.id AND h.timestamp = t.last_played_at
+                WHERE t.artist_key = ? 
+                AND t.title_key = ? 
+                ORDER BY h.id DESC 
                 LIMIT 1
-            """, (artist, title))
+            """, (normalize_key(artist), normalize_key(title)))
             result = cursor.fetchone()
             
             if result:
@@ -214,37 +965,188 @@ class DatabaseManager:
                 }
             return None
     
-    def get_stats(self) -> Dict[str, Any]:
-        """Get database statistics"""
+    def get_recently_played(self, limit: int = 50, since: Optional[int] = None) -> List[Dict]:
+        """
+        Get distinct tracks, most recently played first.
+        
+        Args:
+            limit: Maximum number of tracks
+            since: Only tracks last played at or after this timestamp (ms)
+        """
+        self.writer.flush(timeout=READ_FLUSH_TIMEOUT)
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            # Walks idx_tracks_last_played backwards; no aggregation over play_history
+            cursor.execute("""
+                SELECT * FROM tracks
+                WHERE play_count > 0 AND last_played_at >= ?
+                ORDER BY last_played_at DESC
+                LIMIT ?
+            """, (since or 0, limit))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_most_played(self, limit: int = 50) -> List[Dict]:
+        """Get the most played tracks, ties broken by the most recent play"""
+        self.writer.flush(timeout=READ_FLUSH_TIMEOUT)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Walks idx_tracks_play_count backwards
+            cursor.execute("""
+                SELECT * FROM tracks
+                WHERE play_count > 0
+                ORDER BY play_count DESC, last_played_at DESC
+                LIMIT ?
+            """, (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_track_plays(self, artist: str, title: str) -> Optional[Dict]:
+        """Get a track's play count and first/last play times, or None if it was never played"""
+        self.writer.flush(timeout=READ_FLUSH_TIMEOUT)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM tracks WHERE artist_key = ? AND title_key = ?",
+                           (normalize_key(artist), normalize_key(title)))
+            result = cursor.fetchone()
+            return dict(result) if result else None
+    
+    def search(self, query: str, limit: int = 20, offset: int = 0, kind: Optional[str] = None) -> List[Dict]:
+        """
+        Full-text search over DJ transcripts and played tracks, best match first.
+        
+        Very broad queries are ranked among their newest SEARCH_RANK_WINDOW
+        matches on each side, which keeps them in the tens of milliseconds.
+        
+        Args:
+            query: Free text; every word must match, the last one as a prefix
+            limit: Maximum number of results
+            offset: Results to skip
+            kind: 'dj' or 'song' to search only transcripts or only tracks
             
-            # Get TTS stats
-            cursor.execute("SELECT COUNT(*) FROM tts_entries WHERE status = 'active'")
-            active_tts = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM tts_entries")
-            total_tts = cursor.fetchone()[0]
-            
-            # Get history stats
-            cursor.execute("SELECT COUNT(*) FROM play_history WHERE type = 'song'")
-            song_count = cursor.fetchone()[0]
+        Returns:
+            Results with kind, id, timestamp (ms; last play for songs), title,
+            artist, album, filename, play_count, rank and an HTML-escaped snippet
+            with the matches wrapped in <mark>
+        """
+        match = build_search_query(query)
+        if not match:
+            return []
+        
+        # Each side ranks at most its newest rank_window matches (bm25 has to score
+        # every candidate, and common words match most transcripts), then stops
+        # at offset + limit
+        window = offset + limit
+        rank_window = max(SEARCH_RANK_WINDOW, window)
+        parts, params = [], []
+        if kind in (None, 'dj'):
+            parts.append("""
+                SELECT * FROM (
+                    SELECT 'dj' AS kind, e.id, e.timestamp * 1000 AS timestamp,
+                           e.track_title AS title, e.track_artist AS artist, NULL AS album,
+                           e.audio_filename AS filename, NULL AS play_count,
+                           snippet(tts_search, -1, ?, ?, '…', ?) AS snippet, tts_search.rank AS rank
+                    FROM tts_search
+                    JOIN tts_entries e ON e.id = tts_search.rowid
+                    WHERE tts_search MATCH ? AND e.status = 'active'
+                    AND tts_search.rowid >= (
+                        SELECT COALESCE(MIN(rowid), 0) FROM (
+                            SELECT rowid FROM tts_search WHERE tts_search MATCH ? ORDER BY rowid DESC LIMIT ?
+                        )
+                    )
+                    ORDER BY tts_search.rank
+                    LIMIT ?
+                )
+            """)
+            params += [SNIPPET_OPEN, SNIPPET_CLOSE, SNIPPET_TOKENS, match, match, rank_window, window]
+        if kind in (None, 'song'):
+            parts.append("""
+                SELECT * FROM (
+                    SELECT 'song' AS kind, t.id, t.last_played_at AS timestamp,
+                           t.title, t.artist, t.album, t.filename, t.play_count,
+                           snippet(track_search, -1, ?, ?, '…', ?) AS snippet, track_search.rank AS rank
+                    FROM track_search
+                    JOIN tracks t ON t.id = track_search.rowid
+                    WHERE track_search MATCH ? AND t.play_count > 0
+                    AND track_search.rowid >= (
+                        SELECT COALESCE(MIN(rowid), 0) FROM (
+                            SELECT rowid FROM track_search WHERE track_search MATCH ? ORDER BY rowid DESC LIMIT ?
+                        )
+                    )
+                    ORDER BY track_search.rank
+                    LIMIT ?
+                )
+            """)
+            params += [SNIPPET_OPEN, SNIPPET_CLOSE, SNIPPET_TOKENS, match, match, rank_window, window]
+        if not parts:
+            return []
+        
+        self.writer.flush(timeout=READ_FLUSH_TIMEOUT)
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(" UNION ALL ".join(parts) + " ORDER BY rank LIMIT ? OFFSET ?",
+                               params + [limit, offset])
+                results = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.OperationalError as e:
+            print(f"Search failed for {query!r}: {e}")
+            return []
+        
+        for result in results:
+            result['snippet'] = (html.escape(result['snippet'] or "")
+                                 .replace(SNIPPET_OPEN, "<mark>").replace(SNIPPET_CLOSE, "</mark>"))
+        return results
+    
+    def get_storage_info(self) -> Dict[str, Any]:
+        """Database and WAL file sizes and free pages, for watching bloat"""
+        sizes = {}
+        for key, suffix in (('db_bytes', ''), ('wal_bytes', '-wal')):
+            try:
+                sizes[key] = os.path.getsize(self.db_path + suffix)
+            except OSError:
+                sizes[key] = 0
+        
+        with self.get_connection() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        
+        return {
+            **sizes,
+            'page_size': page_size,
+            'page_count': page_count,
+            'freelist_pages': freelist,
+            'free_bytes': freelist * page_size,
+            'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, str(auto_vacuum)),
+            'database_path': self.db_path
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get database statistics from the trigger-maintained counters"""
+        self.writer.flush(READ_FLUSH_TIMEOUT)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
             
-            cursor.execute("SELECT COUNT(*) FROM play_history WHERE type = 'dj'")
-            dj_count = cursor.fetchone()[0]
+            cursor.execute("SELECT name, value FROM stat_counters")
+            counters = dict(cursor.fetchall())
             
-            # Get recent activity
+            # Recent activity: whole hours from the buckets, plus an indexed count
+            # over the one partial hour at the start of the 24h window
+            cutoff = int((time.time() - 86400) * 1000)
+            boundary_hour = cutoff // HOUR_MS
+            cursor.execute("SELECT COALESCE(SUM(plays), 0) FROM activity_hourly WHERE hour > ?",
+                           (boundary_hour,))
+            recent_activity = cursor.fetchone()[0]
             cursor.execute("""
                 SELECT COUNT(*) FROM play_history 
-                WHERE timestamp > ? 
-            """, (int((time.time() - 86400) * 1000),))  # Last 24 hours
-            recent_activity = cursor.fetchone()[0]
+                WHERE timestamp > ? AND timestamp < ?
+            """, (cutoff, (boundary_hour + 1) * HOUR_MS))
+            recent_activity += cursor.fetchone()[0]
             
             return {
-                'active_tts_entries': active_tts,
-                'total_tts_entries': total_tts,
-                'song_history_count': song_count,
-                'dj_history_count': dj_count,
+                'active_tts_entries': counters.get('tts_active', 0),
+                'total_tts_entries': counters.get('tts_total', 0),
+                'song_history_count': counters.get('history_song', 0),
+                'dj_history_count': counters.get('history_dj', 0),
                 'recent_activity_24h': recent_activity,
                 'database_path': self.db_path
             }
@@ -254,18 +1156,72 @@ db_manager = DatabaseManager()
 
 # Helper functions for backward compatibility
 def create_tts_entry(timestamp: int, text: str, audio_filename: str, text_filename: str, 
-                    track_title: str = None, track_artist: str = None, mode: str = 'custom') -> int:
+                    track_title: str = None, track_artist: str = None, mode: str = 'custom',
+                    sync: bool = True) -> Optional[int]:
     return db_manager.create_tts_entry(timestamp, text, audio_filename, text_filename, 
-                                      track_title, track_artist, mode)
+                                      track_title, track_artist, mode, sync=sync)
+
+def clean_transcript(text: Optional[str]) -> str:
+    """Transcript as stored: trimmed, without the quotes the generators wrap it in"""
+    return (text or "").strip().strip('"\'').strip()
+
+def get_transcripts(audio_filenames: Sequence[str]) -> Dict[str, str]:
+    return db_manager.get_transcripts(audio_filenames)
+
+def dj_audio_url(filename: Optional[str]) -> str:
+    """The /api/tts URL of a DJ clip in the TTS directory, or "" for anything else"""
+    if filename and filename.startswith('/opt/ai-radio/tts/') and filename.endswith('.mp3'):
+        return f"/api/tts/{filename.split('/')[-1]}"
+    return ""
 
-def add_history_entry(entry_type: str, timestamp: int, **kwargs) -> int:
+def save_transcript(audio_filename: str, text: str, timestamp: int = None, mode: str = 'custom') -> bool:
+    return db_manager.save_transcript(audio_filename, text, timestamp, mode)
+
+def add_history_entry(entry_type: str, timestamp: int, **kwargs) -> Optional[int]:
     return db_manager.add_history_entry(entry_type, timestamp, **kwargs)
 
-def get_history(limit: int = 100, offset: int = 0) -> List[Dict]:
-    return db_manager.get_history(limit, offset)
+def get_history(limit: int = 100, offset: int = 0, before: Optional[Tuple[int, int]] = None) -> List[Dict]:
+    return db_manager.get_history(limit, offset, before=before)
+
+def build_search_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: each word quoted (so operators and
+    stray quotes in user input are just text), all required, the last as a prefix.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return ""
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+def search(query: str, limit: int = 20, offset: int = 0, kind: Optional[str] = None) -> List[Dict]:
+    return db_manager.search(query, limit, offset, kind)
+
+def make_history_cursor(timestamp: int, row_id: int) -> str:
+    """Encode a history row position as an opaque "timestamp:id" cursor"""
+    return f"{int(timestamp)}:{int(row_id)}"
+
+def parse_history_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    """Decode a "timestamp:id" cursor, or None if it is malformed"""
+    try:
+        timestamp, row_id = cursor.split(":", 1)
+        return int(timestamp), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def get_stats() -> Dict[str, Any]:
+    return db_manager.get_stats()
+
+def get_storage_info() -> Dict[str, Any]:
+    return db_manager.get_storage_info()
 
 def get_tts_entry_by_filename(filename: str) -> Optional[Dict]:
     return db_manager.get_tts_entry_by_filename(filename)
 
 def lookup_track_info(artist: str, title: str) -> Optional[Dict]:
-    return db_manager.lookup_track_info(artist, title)
\ No newline at end of file
+    return db_manager.lookup_track_info(artist, title)
+
+def get_recently_played(limit: int = 50, since: Optional[int] = None) -> List[Dict]:
+    return db_manager.get_recently_played(limit, since)
+
+def get_most_played(limit: int = 50) -> List[Dict]:
+    return db_manager.get_most_played(limit)
\ No newline at end of file
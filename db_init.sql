@@ -1,6 +1,10 @@
 -- AI Radio Database Schema
 -- SQLite database for managing TTS entries and play history
 
+-- Must come before the first table: lets db_maintenance.py hand free pages back
+-- to the filesystem a few at a time instead of needing a full VACUUM
+PRAGMA auto_vacuum = INCREMENTAL;
+
 -- TTS entries table with proper relationships
 CREATE TABLE IF NOT EXISTS tts_entries (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -30,15 +34,40 @@ CREATE TABLE IF NOT EXISTS play_history (
     tts_entry_id INTEGER,
     metadata TEXT, -- JSON for additional metadata
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (tts_entry_id) REFERENCES tts_entries(id) ON DELETE SET NULL
+    artist_key TEXT, -- database.normalize_key(artist): casefolded, whitespace collapsed
+    title_key TEXT, -- database.normalize_key(title)
+    track_id INTEGER, -- song plays: album/filename/artwork_url are NULL where they match the track
+    FOREIGN KEY (tts_entry_id) REFERENCES tts_entries(id) ON DELETE SET NULL,
+    FOREIGN KEY (track_id) REFERENCES tracks(id)
+);
+
+-- One row per distinct song (keyed like play_history), with play counters kept
+-- current by triggers (see database._migrate_tracks)
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    artist_key TEXT NOT NULL,
+    title_key TEXT NOT NULL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    filename TEXT,
+    artwork_url TEXT,
+    play_count INTEGER NOT NULL DEFAULT 0,
+    first_played_at INTEGER,
+    last_played_at INTEGER,
+    UNIQUE (artist_key, title_key)
 );
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_tts_timestamp ON tts_entries(timestamp);
 CREATE INDEX IF NOT EXISTS idx_tts_status ON tts_entries(status);
+CREATE INDEX IF NOT EXISTS idx_tts_audio_filename ON tts_entries(audio_filename);
+-- Also serves keyset pagination on (timestamp, id): id is the rowid, which every index carries
 CREATE INDEX IF NOT EXISTS idx_history_timestamp ON play_history(timestamp);
 CREATE INDEX IF NOT EXISTS idx_history_type ON play_history(type);
 CREATE INDEX IF NOT EXISTS idx_history_tts ON play_history(tts_entry_id);
+-- Indexes on columns added after the first release (e.g. idx_history_track) are
+-- created by database.SCHEMA_MIGRATIONS, so this file stays safe to re-run on old databases
 
 -- Artwork cache table (to replace file-based cache eventually)
 CREATE TABLE IF NOT EXISTS artwork_cache (
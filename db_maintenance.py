@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+SQLite maintenance for ai_radio.db
+Runs the housekeeping SQLite never does on its own: a truncating WAL
+checkpoint, PRAGMA optimize, incremental vacuum and a periodic sampled
+ANALYZE. MaintenanceScheduler does this from a background thread of a
+long-running process, only once the database has been idle for a while, and
+starts no new step after its time budget is spent (bar the final checkpoint). Every run's step timings
+and the file sizes are written to cache/db_maintenance.json.
+
+Usage:
+    db_maintenance.py            run all steps now and print the report
+    db_maintenance.py --vacuum   one-time full VACUUM that switches an older
+                                 database to incremental auto-vacuum
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import BUSY_TIMEOUT_MS, DatabaseManager, db_manager
+
+REPORT_PATH = "/opt/ai-radio/cache/db_maintenance.json"
+
+MAINTENANCE_INTERVAL = 3600  # seconds between runs
+MAINTENANCE_IDLE = 10  # only start once the database has been unused this long...
+MAINTENANCE_MAX_DELAY = 3 * 3600  # ...unless the run is this overdue
+MAINTENANCE_BUDGET = 2.0  # seconds; no step starts after this
+MAINTENANCE_POLL = 5  # how often the scheduler thread checks
+ANALYZE_INTERVAL = 86400  # full-schema ANALYZE at most daily
+ANALYSIS_LIMIT = 1000  # rows ANALYZE samples per index, which keeps it bounded
+VACUUM_PAGES = 2048  # free pages handed back per run
+STEP_BUSY_TIMEOUT_MS = 200  # a step gives up rather than wait on a busy database
+
+
+def read_report(path: str = REPORT_PATH) -> Optional[Dict]:
+    """The last maintenance report, or None if there is none"""
+    try:
+        with open(path, 'r') as f:
+            report = json.load(f)
+        return report if isinstance(report, dict) else None
+    except (OSError, ValueError):
+        return None
+
+
+def _write_report(path: str, report: Dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def _checkpoint(conn: sqlite3.Connection) -> Dict:
+    busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return {"busy": bool(busy), "wal_pages": wal_pages, "checkpointed": checkpointed}
+
+
+def _optimize(conn: sqlite3.Connection) -> Dict:
+    conn.execute("PRAGMA optimize")
+    return {}
+
+
+def _incremental_vacuum(conn: sqlite3.Connection) -> Dict:
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return {"skipped": "auto_vacuum is not incremental (run db_maintenance.py --vacuum once)"}
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+    after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"pages_released": before - after, "free_pages_left": after}
+
+
+def _analyze(conn: sqlite3.Connection) -> Dict:
+    conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    return {}
+
+
+class MaintenanceScheduler:
+    """
+    Background thread that keeps ai_radio.db tidy at quiet moments.
+
+    Start it in one long-running process per database; runs are cheap, but
+    there is no point in several processes checkpointing the same file.
+    """
+
+    def __init__(self, manager: DatabaseManager = db_manager, report_path: str = REPORT_PATH,
+                 interval: float = MAINTENANCE_INTERVAL, budget: float = MAINTENANCE_BUDGET):
+        self.manager = manager
+        self.report_path = report_path
+        self.interval = interval
+        self.budget = budget
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Carry the schedule over from the last report so a restart doesn't re-run everything
+        last = read_report(report_path) or {}
+        self.last_run = float(last.get("finished_at", 0))
+        self.last_analyze = float(last.get("last_analyze", 0))
+
+    def steps(self, now: float) -> List[Tuple[str, Callable[[sqlite3.Connection], Dict]]]:
+        """Budgeted steps in priority order; later ones are the first to be skipped"""
+        steps = [("optimize", _optimize), ("incremental_vacuum", _incremental_vacuum)]
+        if now - self.last_analyze >= ANALYZE_INTERVAL:
+            steps.append(("analyze", _analyze))
+        return steps
+
+    def run_once(self, force_analyze: bool = False) -> Dict[str, Any]:
+        """
+        Run the maintenance steps within the time budget and write the report.
+
+        Returns:
+            The report: per-step duration and result, skipped steps and storage sizes
+        """
+        now = time.time()
+        if force_analyze:
+            self.last_analyze = 0
+        report = {"started_at": now, "budget_s": self.budget, "steps": {}, "skipped": []}
+        started = time.perf_counter()
+
+        with self.manager.get_connection() as conn:
+            conn.execute(f"PRAGMA busy_timeout={STEP_BUSY_TIMEOUT_MS}")
+            try:
+                # The checkpoint always runs, last, so the WAL is left empty; it is what
+                # keeps the WAL from growing and costs little once the others are done
+                for name, step in self.steps(now) + [("wal_checkpoint", _checkpoint)]:
+                    if name != "wal_checkpoint" and time.perf_counter() - started >= self.budget:
+                        report["skipped"].append(name)
+                        continue
+                    step_started = time.perf_counter()
+                    try:
+                        result = step(conn)
+                    except sqlite3.Error as e:
+                        result = {"error": str(e)}
+                    result["ms"] = round((time.perf_counter() - step_started) * 1000, 1)
+                    report["steps"][name] = result
+                    if name == "analyze" and "error" not in result:
+                        self.last_analyze = now
+            finally:
+                conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        report["finished_at"] = time.time()
+        report["last_analyze"] = self.last_analyze
+        report["storage"] = self.manager.get_storage_info()
+        self.last_run = report["finished_at"]
+        try:
+            _write_report(self.report_path, report)
+        except OSError as e:
+            print(f"Could not write maintenance report: {e}")
+        return report
+
+    def is_due(self) -> bool:
+        """Due once the interval has passed and the database is idle (or the run is overdue)"""
+        since_run = time.time() - self.last_run
+        if since_run < self.interval:
+            return False
+        idle = time.monotonic() - self.manager.last_used
+        return idle >= MAINTENANCE_IDLE or since_run >= MAINTENANCE_MAX_DELAY
+
+    def start(self):
+        """Start the scheduler thread (a daemon, so it never holds up shutdown)"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(MAINTENANCE_POLL):
+            if not self.is_due():
+                continue
+            try:
+                report = self.run_once()
+                print(f"Database maintenance took {report['duration_ms']:.0f} ms "
+                      f"(skipped: {', '.join(report['skipped']) or 'none'})")
+            except Exception as e:
+                print(f"Database maintenance failed: {e}")
+                self.last_run = time.time()  # don't retry every poll
+
+
+def vacuum(manager: DatabaseManager):
+    """Switch to incremental auto-vacuum and rebuild the file (blocks writers while it runs)"""
+    with manager.get_connection() as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SQLite maintenance on the AI Radio database")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="full VACUUM that enables incremental auto-vacuum on an older database")
+    parser.add_argument("--report", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.vacuum:
+        started = time.perf_counter()
+        vacuum(db_manager)
+        print(f"✅ VACUUM finished in {time.perf_counter() - started:.1f}s")
+
+    # No budget when run by hand: every step runs to completion
+    report = MaintenanceScheduler(db_manager, report_path=args.report, budget=3600).run_once(force_analyze=True)
+    print(json.dumps(report, indent=2))
+    db_manager.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
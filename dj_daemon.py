@@ -16,6 +16,11 @@ import threading
 import requests
 from typing import Dict, Optional, Tuple
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from liquidsoap_client import get_client, LiquidsoapError
+from metadata_cache import HEARTBEAT_STALE_AFTER, CacheReader
+
 # Liquidsoap connection constants
 LS_HOST = "127.0.0.1"
 LS_PORT = 1234
@@ -35,6 +40,8 @@ class DJDaemon:
         self.cache_file = "/opt/ai-radio/intro_cache.json"
         self.lock_file = "/tmp/dj_daemon.lock"
         self.api_base = "http://127.0.0.1:5055"
+        self.now_cache = CacheReader("/opt/ai-radio/cache/now_metadata.json")
+        self.next_cache = CacheReader("/opt/ai-radio/cache/next_metadata.json")
         
         # Load configuration
         self.load_cache()
@@ -155,45 +162,27 @@ class DJDaemon:
     def get_current_and_next_tracks(self) -> Tuple[Optional[Dict], Optional[Dict]]:
         """Get current and next tracks from cached metadata (no API calls)"""
         try:
-            # First try to read from daemon cache
-            now_cache_file = "/opt/ai-radio/cache/now_metadata.json"
-            next_cache_file = "/opt/ai-radio/cache/next_metadata.json"
-            
+            # First try to read from daemon cache (re-parsed only when its version moves)
             current = None
             next_list = []
             
             # Read current track from cache
-            if os.path.exists(now_cache_file):
-                try:
-                    with open(now_cache_file, 'r') as f:
-                        cached_data = json.load(f)
-                    
-                    # Check if cache is fresh (less than 30 seconds old)
-                    cache_age = time.time() - cached_data.get("cached_at", 0)
-                    if cache_age < 30:
-                        current = cached_data
-                        print(f"DJ Daemon: Using cached current track (age: {cache_age:.1f}s)")
-                    else:
-                        print(f"DJ Daemon: Current track cache is stale (age: {cache_age:.1f}s)")
-                except Exception as e:
-                    print(f"DJ Daemon: Error reading current track cache: {e}")
+            cached_data, heartbeat_age = self.now_cache.read()
+            if cached_data:
+                # Freshness comes from the daemon heartbeat; the file itself only changes with the track
+                if heartbeat_age is not None and heartbeat_age < HEARTBEAT_STALE_AFTER:
+                    current = dict(cached_data)
+                    print(f"DJ Daemon: Using cached current track (v{cached_data.get('version')}, heartbeat {heartbeat_age:.1f}s)")
+                else:
+                    print(f"DJ Daemon: Metadata daemon heartbeat is stale or missing (age: {heartbeat_age})")
             
             # Read next tracks from cache
-            if os.path.exists(next_cache_file):
-                try:
-                    with open(next_cache_file, 'r') as f:
-                        next_list = json.load(f)
-                    
-                    # Check if cache is fresh
-                    cache_age = time.time() - os.path.getmtime(next_cache_file)
-                    if cache_age > 60:  # Next tracks can be a bit more stale
-                        print(f"DJ Daemon: Next tracks cache is stale (age: {cache_age:.1f}s)")
-                        next_list = []
-                    else:
-                        print(f"DJ Daemon: Using cached next tracks (age: {cache_age:.1f}s)")
-                except Exception as e:
-                    print(f"DJ Daemon: Error reading next tracks cache: {e}")
-                    next_list = []
+            cached_next, heartbeat_age = self.next_cache.read(default=[])
+            if heartbeat_age is not None and heartbeat_age <= 2 * HEARTBEAT_STALE_AFTER:  # Next tracks can be a bit more stale
+                next_list = list(cached_next or [])
+                print(f"DJ Daemon: Using cached next tracks (heartbeat {heartbeat_age:.1f}s)")
+            else:
+                print(f"DJ Daemon: Next tracks cache is stale (heartbeat: {heartbeat_age})")
             
             # If cache failed, fallback to API calls
             if not current or not next_list:
@@ -244,24 +233,11 @@ class DJDaemon:
         """Fallback telnet push (only used when API fails)"""
         try:
             print("DJ Daemon: Falling back to telnet push (API unavailable)")
-            import socket
-            with socket.create_connection((LS_HOST, LS_PORT), timeout=5) as s:
-                s.settimeout(5)
-                # Consume banner
-                try:
-                    s.recv(1024)
-                except:
-                    pass
-                
-                # Push file to TTS queue
-                command = f"tts.push {file_path}\nquit\n"
-                s.send(command.encode())
-                
-                # Read response
-                response = s.recv(1024).decode().strip()
-                print(f"DJ Daemon: Telnet TTS queue response: {response}")
-                
-        except Exception as e:
+            # Push file to TTS queue over the shared Liquidsoap connection
+            lines = get_client(LS_HOST, LS_PORT).command(f"tts.push {file_path}", timeout=5)
+            print(f"DJ Daemon: Telnet TTS queue response: {' '.join(lines)}")
+            
+        except LiquidsoapError as e:
             print(f"DJ Daemon: Fallback telnet push failed: {e}")
     
     def is_intro_cached(self, artist: str, title: str) -> Optional[str]:
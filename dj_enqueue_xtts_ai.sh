@@ -96,6 +96,14 @@ if "${PY}" "${APP}" --text "${TEXT}" --lang "${LANG}" --speaker "${SPEAKER}" --o
         echo "$TEXT" > "$TXT_FILE"
         echo "DEBUG: Saved transcript to ${TXT_FILE}" >&2
         
+        # Store the transcript in the database too; history and the API read it from there
+        python3 -c "
+import sys
+sys.path.append('/opt/ai-radio')
+from database import save_transcript
+sys.exit(0 if save_transcript(sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4]) else 1)
+" "$(basename "${OUT}")" "${TEXT}" "${TS}" "${MODE}" || echo "WARNING: Failed to store transcript in database" >&2
+        
         # Auto-queue in Liquidsoap if this is an intro (via Flask API)
         if [[ "$MODE" == "intro" ]]; then
             echo "DEBUG: Enqueuing intro via Flask API..." >&2
@@ -3,67 +3,75 @@
 Fix TTS linking between history and TTS entries
 """
 
+import bisect
 import json
-import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
 from database import db_manager
 
-def fix_tts_linking():
+ORIGINAL_HISTORY = '/opt/ai-radio/play_history.json.backup.20250824_120129'
+MATCH_WINDOW_MS = 1000  # a DJ row matches a JSON item less than this far away
+
+def index_dj_items(original_history: List[Dict]) -> Tuple[List[int], List[Dict]]:
+    """DJ items that carry a TTS audio URL, sorted by time, with their times for bisecting"""
+    items = sorted((item for item in original_history
+                    if item.get('type') == 'dj' and '/tts/' in (item.get('audio_url') or '')),
+                   key=lambda item: item.get('time', 0))
+    return [item.get('time', 0) for item in items], items
+
+def find_dj_item(times: List[int], items: List[Dict], timestamp: int) -> Optional[Dict]:
+    """The item closest to timestamp within MATCH_WINDOW_MS, or None"""
+    pos = bisect.bisect_left(times, timestamp)
+    best = None
+    for candidate in (pos - 1, pos):
+        if 0 <= candidate < len(items):
+            distance = abs(times[candidate] - timestamp)
+            if distance < MATCH_WINDOW_MS and (best is None or distance < best[0]):
+                best = (distance, items[candidate])
+    return best[1] if best else None
+
+def fix_tts_linking(history_path: str = ORIGINAL_HISTORY):
     """Link existing TTS entries to history entries"""
     print("Fixing TTS linking...")
     
     # Read the original JSON to get audio URLs
     try:
-        with open('/opt/ai-radio/play_history.json.backup.20250824_120129', 'r') as f:
+        with open(history_path, 'r') as f:
             original_history = json.load(f)
     except Exception as e:
         print(f"Could not read original history: {e}")
         return
     
-    linked_count = 0
+    times, items = index_dj_items(original_history)
     
     with db_manager.get_connection() as conn:
         cursor = conn.cursor()
         
+        # Every filename -> TTS ID in one query instead of one lookup per match
+        tts_ids = dict(cursor.execute("SELECT audio_filename, id FROM tts_entries"))
+        
         # Get all DJ history entries that need linking
         cursor.execute("SELECT id, timestamp FROM play_history WHERE type = 'dj' AND tts_entry_id IS NULL")
-        dj_entries = cursor.fetchall()
         
-        for dj_entry in dj_entries:
-            history_id, history_timestamp = dj_entry
-            
-            # Find matching entry in original JSON
-            matching_item = None
-            for item in original_history:
-                if item.get('type') == 'dj' and abs(item.get('time', 0) - history_timestamp) < 1000:  # Within 1 second
-                    matching_item = item
-                    break
-            
-            if matching_item and matching_item.get('audio_url'):
-                audio_url = matching_item['audio_url']
-                if '/tts/' in audio_url:
-                    # Extract filename
-                    filename = audio_url.split('/tts/')[-1]
-                    
-                    # Find matching TTS entry
-                    cursor.execute("SELECT id, text FROM tts_entries WHERE audio_filename = ?", (filename,))
-                    tts_result = cursor.fetchone()
-                    
-                    if tts_result:
-                        tts_id, tts_text = tts_result
-                        
-                        # Update history entry
-                        cursor.execute("""
-                            UPDATE play_history 
-                            SET tts_entry_id = ?, title = ? 
-                            WHERE id = ?
-                        """, (tts_id, matching_item.get('text', ''), history_id))
-                        
-                        linked_count += 1
-                        print(f"Linked history ID {history_id} to TTS ID {tts_id}: {tts_text[:50]}...")
+        updates = []
+        for history_id, history_timestamp in cursor.fetchall():
+            matching_item = find_dj_item(times, items, history_timestamp)
+            if not matching_item:
+                continue
+            tts_id = tts_ids.get(matching_item['audio_url'].split('/tts/')[-1])
+            if tts_id is not None:
+                updates.append((tts_id, matching_item.get('text', ''), history_id))
         
+        # Update history entries in one transaction
+        cursor.executemany("""
+            UPDATE play_history
+            SET tts_entry_id = ?, title = ?
+            WHERE id = ?
+        """, updates)
         conn.commit()
     
-    print(f"✅ Successfully linked {linked_count} TTS entries to history")
+    print(f"✅ Successfully linked {len(updates)} TTS entries to history")
 
 if __name__ == "__main__":
-    fix_tts_linking()
\ No newline at end of file
+    fix_tts_linking(*sys.argv[1:2])
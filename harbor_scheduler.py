@@ -13,6 +13,8 @@ import subprocess
 from pathlib import Path
 import urllib.parse
 
+from library_index import library_index
+
 HARBOR_URL = "http://127.0.0.1:8001/music"
 PLAYLIST_FILE = "/opt/ai-radio/library_clean.m3u"
 CACHE_DIR = "/opt/ai-radio/cache"
@@ -50,7 +52,7 @@ class HarborScheduler:
         self.save_queue_cache()
     
     def extract_metadata(self, filepath):
-        """Extract metadata from file path and ffprobe"""
+        """Extract metadata from the library index, or ffprobe for files it has not seen yet"""
         metadata = {
             'title': 'Unknown',
             'artist': 'Unknown',
@@ -58,6 +60,15 @@ class HarborScheduler:
             'filename': filepath
         }
         
+        indexed = library_index.get(filepath)
+        if indexed:
+            metadata.update({
+                'title': indexed['title'] or metadata['title'],
+                'artist': indexed['artist'] or metadata['artist'],
+                'album': indexed['album'] or metadata['album']
+            })
+            return metadata
+        
         # Try ffprobe first
         try:
             cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', filepath]
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Monthly archives for old play history
+Rows older than the retention horizon are moved out of the live ai_radio.db
+into one gzip-compressed SQLite database per calendar month, so the hot
+database (and every scan and backup of it) stays small. archive_connection()
+attaches the archives on demand for the occasional query over old data.
+
+Track play counts and last-played times are lifetime figures and survive
+archiving; get_stats() counts only what is left in the live database.
+
+Usage:
+    history_archive.py [--days 180] [--dry-run]
+    (cron: 30 4 * * * /opt/ai-radio/history_archive.py)
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DATABASE_PATH, TRACK_FIELDS, DatabaseManager
+
+ARCHIVE_DIR = "/opt/ai-radio/archive"
+RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", "180"))
+
+# SQLite attaches at most 10 databases by default; the live database is "main"
+MAX_ATTACHED_ARCHIVES = 9
+
+HISTORY_COLUMNS = ("id", "type", "timestamp", "title", "artist", "album", "filename", "artwork_url",
+                   "tts_entry_id", "metadata", "created_at", "artist_key", "title_key", "track_id")
+TTS_COLUMNS = ("id", "timestamp", "text", "audio_filename", "text_filename", "track_title", "track_artist",
+               "mode", "status", "created_at", "file_size", "audio_duration")
+
+# Archives are self-contained: song plays carry their resolved track metadata
+ARCHIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS archive.play_history (
+        id INTEGER PRIMARY KEY, type TEXT, timestamp INTEGER, title TEXT, artist TEXT,
+        album TEXT, filename TEXT, artwork_url TEXT, tts_entry_id INTEGER, metadata TEXT,
+        created_at DATETIME, artist_key TEXT, title_key TEXT, track_id INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS archive.idx_history_timestamp ON play_history(timestamp);
+    CREATE TABLE IF NOT EXISTS archive.tts_entries (
+        id INTEGER PRIMARY KEY, timestamp INTEGER, text TEXT, audio_filename TEXT, text_filename TEXT,
+        track_title TEXT, track_artist TEXT, mode TEXT, status TEXT, created_at DATETIME,
+        file_size INTEGER, audio_duration REAL
+    );
+    CREATE INDEX IF NOT EXISTS archive.idx_tts_timestamp ON tts_entries(timestamp);
+"""
+
+
+def month_start(timestamp_ms: int) -> datetime:
+    """First instant (UTC) of the month containing a millisecond timestamp"""
+    moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start: datetime) -> datetime:
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+def to_ms(moment: datetime) -> int:
+    return int(moment.timestamp() * 1000)
+
+
+def archive_path(archive_dir: str, month: datetime) -> str:
+    return os.path.join(archive_dir, f"history-{month:%Y-%m}.db.gz")
+
+
+def list_archives(archive_dir: str = ARCHIVE_DIR) -> List[Tuple[datetime, str]]:
+    """Archived months in order, as (month start, path)"""
+    archives = []
+    try:
+        names = os.listdir(archive_dir)
+    except OSError:
+        return archives
+    for name in names:
+        if not (name.startswith("history-") and name.endswith(".db.gz")):
+            continue
+        try:
+            month = datetime.strptime(name[len("history-"):-len(".db.gz")], "%Y-%m").replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        archives.append((month, os.path.join(archive_dir, name)))
+    return sorted(archives)
+
+
+def _decompress(source: str, dest: str):
+    with gzip.open(source, 'rb') as src, open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def _compress(source: str, dest: str):
+    temp_path = dest + ".tmp"
+    with open(source, 'rb') as src, gzip.open(temp_path, 'wb', compresslevel=9) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(temp_path, dest)
+
+
+def _resolved_history_columns() -> str:
+    """Select list for live play_history (alias h) joined to tracks (alias t)"""
+    return ", ".join(f"COALESCE(h.{c}, t.{c}) AS {c}" if c in TRACK_FIELDS else f"h.{c}"
+                     for c in HISTORY_COLUMNS)
+
+
+def archivable_months(manager: DatabaseManager, cutoff_ms: int) -> List[datetime]:
+    """Months that end before the cutoff and still have rows in the live database"""
+    months = []
+    with manager.get_connection() as conn:
+        oldest = conn.execute("""
+            SELECT MIN(ts) FROM (
+                SELECT MIN(timestamp) AS ts FROM play_history
+                UNION ALL SELECT MIN(timestamp) * 1000 FROM tts_entries
+            )
+        """).fetchone()[0]
+        if oldest is None:
+            return months
+        month = month_start(oldest)
+        while to_ms(next_month(month)) <= cutoff_ms:
+            start_ms, end_ms = to_ms(month), to_ms(next_month(month))
+            # Both probes are single index seeks, so gaps in the history cost nothing
+            if conn.execute("""
+                SELECT EXISTS (SELECT 1 FROM play_history WHERE timestamp >= ? AND timestamp < ?)
+                    OR EXISTS (SELECT 1 FROM tts_entries WHERE timestamp >= ? AND timestamp < ?)
+            """, (start_ms, end_ms, start_ms // 1000, end_ms // 1000)).fetchone()[0]:
+                months.append(month)
+            month = next_month(month)
+    return months
+
+
+def archive_month(manager: DatabaseManager, month: datetime, archive_dir: str = ARCHIVE_DIR) -> Dict[str, int]:
+    """
+    Move one month of history and TTS entries into its compressed archive.
+
+    Rows are merged into an existing archive for the month. The uncompressed
+    working copy is kept next to the archive until it has been compressed, so
+    a run interrupted at any point resumes without losing rows.
+
+    Returns:
+        Counts of archived history and TTS rows
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    start_ms, end_ms = to_ms(month), to_ms(next_month(month))
+    gz_path = archive_path(archive_dir, month)
+    work_path = gz_path[:-len(".gz")] + ".work"
+    if not os.path.exists(work_path) and os.path.exists(gz_path):
+        _decompress(gz_path, work_path)
+
+    with manager.get_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS archive", (work_path,))
+        try:
+            conn.executescript(ARCHIVE_SCHEMA)
+
+            # Copy first and commit, so the rows are safe before they leave the live database
+            conn.execute("BEGIN")
+            conn.execute(f"""
+                INSERT OR IGNORE INTO archive.play_history ({", ".join(HISTORY_COLUMNS)})
+                SELECT {_resolved_history_columns()}
+                FROM main.play_history h
+                LEFT JOIN main.tracks t ON h.track_id = t.id
+                WHERE h.timestamp >= ? AND h.timestamp < ?
+            """, (start_ms, end_ms))
+            # TTS timestamps are in seconds; entries still referenced by live plays stay
+            conn.execute(f"""
+                INSERT OR IGNORE INTO archive.tts_entries ({", ".join(TTS_COLUMNS)})
+                SELECT {", ".join(TTS_COLUMNS)} FROM main.tts_entries e
+                WHERE e.timestamp >= ? AND e.timestamp < ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM main.play_history h
+                    WHERE h.tts_entry_id = e.id AND (h.timestamp < ? OR h.timestamp >= ?)
+                )
+            """, (start_ms // 1000, end_ms // 1000, start_ms, end_ms))
+            conn.commit()
+
+            # Then delete exactly the rows that reached the archive
+            conn.execute("BEGIN IMMEDIATE")
+            replays = conn.execute("""
+                SELECT track_id, COUNT(*), MAX(timestamp) FROM main.play_history
+                WHERE timestamp >= ? AND timestamp < ? AND track_id IS NOT NULL
+                AND id IN (SELECT id FROM archive.play_history)
+                GROUP BY track_id
+            """, (start_ms, end_ms)).fetchall()
+            history_rows = conn.execute("""
+                DELETE FROM main.play_history
+                WHERE timestamp >= ? AND timestamp < ?
+                AND id IN (SELECT id FROM archive.play_history)
+            """, (start_ms, end_ms)).rowcount
+            tts_rows = conn.execute("""
+                DELETE FROM main.tts_entries
+                WHERE timestamp >= ? AND timestamp < ?
+                AND id IN (SELECT id FROM archive.tts_entries)
+            """, (start_ms // 1000, end_ms // 1000)).rowcount
+            # The delete triggers rewound the tracks; archived plays still count
+            conn.executemany("""
+                UPDATE tracks SET play_count = play_count + ?, last_played_at = COALESCE(last_played_at, ?)
+                WHERE id = ?
+            """, [(count, last_played, track_id) for track_id, count, last_played in replays])
+            conn.execute("DELETE FROM activity_hourly WHERE plays <= 0")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE archive")
+
+    _compress(work_path, gz_path)
+    os.remove(work_path)
+    return {"history": history_rows, "tts": tts_rows}
+
+
+def archive_old_history(manager: DatabaseManager, days: int = RETENTION_DAYS,
+                        archive_dir: str = ARCHIVE_DIR, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+    """
+    Archive every whole month older than the retention horizon.
+
+    Returns:
+        {"YYYY-MM": {"history": n, "tts": n}} for each archived month
+    """
+    manager.writer.flush(timeout=5)
+    cutoff_ms = int((time.time() - days * 86400) * 1000)
+    results = {}
+    for month in archivable_months(manager, cutoff_ms):
+        if dry_run:
+            results[f"{month:%Y-%m}"] = {}
+            continue
+        results[f"{month:%Y-%m}"] = archive_month(manager, month, archive_dir)
+    return results
+
+
+@contextmanager
+def archive_connection(start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                       db_path: str = DATABASE_PATH, archive_dir: str = ARCHIVE_DIR):
+    """
+    Open the live database read-only with the archives for [start_ms, end_ms) attached.
+
+    The temp views all_play_history and all_tts_entries union the live tables
+    with every attached archive (song metadata resolved in both). Archives are
+    decompressed into a scratch directory for the life of the connection.
+
+    Raises:
+        ValueError: if the range covers more archived months than can be attached
+    """
+    archives = [(month, path) for month, path in list_archives(archive_dir)
+                if (start_ms is None or to_ms(next_month(month)) > start_ms)
+                and (end_ms is None or to_ms(month) < end_ms)]
+    if len(archives) > MAX_ATTACHED_ARCHIVES:
+        raise ValueError(f"{len(archives)} archived months in range; narrow it to {MAX_ATTACHED_ARCHIVES} or fewer")
+
+    with tempfile.TemporaryDirectory(prefix="ai-radio-archive-") as scratch:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            history_parts = [f"SELECT {_resolved_history_columns()} FROM main.play_history h "
+                             f"LEFT JOIN main.tracks t ON h.track_id = t.id"]
+            tts_parts = [f"SELECT {', '.join(TTS_COLUMNS)} FROM main.tts_entries"]
+            for month, path in archives:
+                schema = f"archive_{month:%Y_%m}"
+                local_path = os.path.join(scratch, f"{schema}.db")
+                _decompress(path, local_path)
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{local_path}?mode=ro",))
+                history_parts.append(f"SELECT {', '.join(HISTORY_COLUMNS)} FROM {schema}.play_history")
+                tts_parts.append(f"SELECT {', '.join(TTS_COLUMNS)} FROM {schema}.tts_entries")
+            conn.execute("CREATE TEMP VIEW all_play_history AS " + " UNION ALL ".join(history_parts))
+            conn.execute("CREATE TEMP VIEW all_tts_entries AS " + " UNION ALL ".join(tts_parts))
+            yield conn
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old play history into monthly archives")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS,
+                        help=f"keep this many days in the live database (default {RETENTION_DAYS})")
+    parser.add_argument("--db", default=DATABASE_PATH)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="list the months that would be archived")
+    args = parser.parse_args()
+
+    manager = DatabaseManager(args.db)
+    try:
+        results = archive_old_history(manager, args.days, args.archive_dir, dry_run=args.dry_run)
+    finally:
+        manager.writer.close()
+        manager.close()
+
+    if not results:
+        print(f"Nothing older than {args.days} days to archive")
+    for month, counts in results.items():
+        if args.dry_run:
+            print(f"Would archive {month}")
+            continue
+        size = os.path.getsize(archive_path(args.archive_dir, datetime.strptime(month, "%Y-%m")))
+        print(f"✅ {month}: {counts['history']} history rows, {counts['tts']} TTS entries "
+              f"({size / 1024:.0f} KB compressed)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,10 @@ import re
 from pathlib import Path
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import normalize_key
+
 DATABASE_PATH = "/opt/ai-radio/ai_radio.db"
 SCHEMA_PATH = "/opt/ai-radio/db_init.sql"
 HISTORY_JSON = "/opt/ai-radio/play_history.json"
@@ -90,6 +94,7 @@ def scan_tts_files():
             'file_size': file_size
         })
     
+    tts_entries.sort(key=lambda entry: entry['timestamp'])
     print(f"✅ Found {len(tts_entries)} TTS entries")
     return tts_entries
 
@@ -138,64 +143,54 @@ def migrate_history_data():
             'filename': item.get('filename', ''),
             'artwork_url': item.get('artwork_url', ''),
             'metadata': json.dumps(metadata) if metadata else None,
+            'audio_url': item.get('audio_url', ''),  # used for linking, not stored
             'tts_entry_id': None  # Will be linked later
         })
     
+    # Oldest first, so rows append to the end of the timestamp index
+    history_entries.sort(key=lambda entry: entry['timestamp'] or 0)
+    
     print(f"✅ Migrated {len(history_entries)} history entries")
     return history_entries
 
-def link_tts_to_history(conn, tts_entries, history_entries):
-    """Link TTS entries to history entries based on timestamps and audio URLs"""
+def link_tts_to_history(conn, history_entries):
+    """
+    Link DJ history entries to TTS entries by the audio file in their URL.
+    
+    Runs after the TTS rows are inserted: one query maps every audio filename
+    to its ID, then each DJ entry is a dictionary lookup.
+    """
     print("Linking TTS entries to history...")
     
-    cursor = conn.cursor()
+    tts_ids = dict(conn.execute("SELECT audio_filename, id FROM tts_entries"))
     linked_count = 0
     
     for history_entry in history_entries:
         if history_entry['type'] != 'dj':
             continue
-            
-        # Look for matching TTS entry by audio URL or timestamp
-        audio_url = None
         
-        # Try to extract filename from audio URL in the original data
-        for item in json.loads(open(HISTORY_JSON, 'r').read()):
-            if item.get('time') == history_entry['timestamp'] and item.get('type') == 'dj':
-                audio_url = item.get('audio_url', '')
-                break
-        
-        if audio_url and '/tts/' in audio_url:
+        audio_url = history_entry.get('audio_url') or ''
+        if '/tts/' in audio_url:
             # Extract filename from URL like "/tts/custom_1756054435.mp3"
-            filename = audio_url.split('/tts/')[-1]
-            
-            # Find matching TTS entry
-            for tts_entry in tts_entries:
-                if tts_entry['audio_filename'] == filename:
-                    # Get the TTS entry ID from database
-                    cursor.execute(
-                        "SELECT id FROM tts_entries WHERE timestamp = ?",
-                        (tts_entry['timestamp'],)
-                    )
-                    result = cursor.fetchone()
-                    if result:
-                        history_entry['tts_entry_id'] = result[0]
-                        linked_count += 1
-                    break
+            tts_id = tts_ids.get(audio_url.split('/tts/')[-1])
+            if tts_id is not None:
+                history_entry['tts_entry_id'] = tts_id
+                linked_count += 1
     
     print(f"✅ Linked {linked_count} TTS entries to history")
 
 def insert_data(conn, tts_entries, history_entries):
-    """Insert data into database"""
+    """Insert, link and commit everything in a single transaction"""
     cursor = conn.cursor()
     
-    # Insert TTS entries
-    print("Inserting TTS entries...")
-    for entry in tts_entries:
-        cursor.execute("""
+    try:
+        # Insert TTS entries
+        print("Inserting TTS entries...")
+        cursor.executemany("""
             INSERT OR IGNORE INTO tts_entries 
             (timestamp, text, audio_filename, text_filename, track_title, track_artist, mode, status, file_size)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        """, ((
             entry['timestamp'],
             entry['text'],
             entry['audio_filename'],
@@ -205,19 +200,21 @@ def insert_data(conn, tts_entries, history_entries):
             entry['mode'],
             entry['status'],
             entry['file_size']
-        ))
-    
-    conn.commit()
-    print(f"✅ Inserted {len(tts_entries)} TTS entries")
-    
-    # Insert history entries
-    print("Inserting history entries...")
-    for entry in history_entries:
-        cursor.execute("""
+        ) for entry in tts_entries))
+        print(f"✅ Inserted {len(tts_entries)} TTS entries")
+        
+        # Link TTS to history (needs the TTS IDs assigned above)
+        if tts_entries and history_entries:
+            link_tts_to_history(conn, history_entries)
+        
+        # Insert history entries
+        print("Inserting history entries...")
+        cursor.executemany("""
             INSERT INTO play_history 
-            (type, timestamp, title, artist, album, filename, artwork_url, tts_entry_id, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+            (type, timestamp, title, artist, album, filename, artwork_url, tts_entry_id, metadata,
+             artist_key, title_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, ((
             entry['type'],
             entry['timestamp'],
             entry['title'],
@@ -226,10 +223,15 @@ def insert_data(conn, tts_entries, history_entries):
             entry['filename'],
             entry['artwork_url'],
             entry['tts_entry_id'],
-            entry['metadata']
-        ))
-    
-    conn.commit()
+            entry['metadata'],
+            normalize_key(entry['artist']),
+            normalize_key(entry['title'])
+        ) for entry in history_entries))
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     print(f"✅ Inserted {len(history_entries)} history entries")
 
 def create_backup():
@@ -257,11 +259,7 @@ def main():
         # Migrate history data
         history_entries = migrate_history_data()
         
-        # Link TTS to history
-        if tts_entries and history_entries:
-            link_tts_to_history(conn, tts_entries, history_entries)
-        
-        # Insert all data
+        # Insert and link all data
         insert_data(conn, tts_entries, history_entries)
         
         # Create backups
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Persistent index of the music library
+One row per audio file under the music roots with its size, mtime, tags,
+duration, codec, bitrate and whether it has embedded cover art, so track
+durations, cover art searches and scheduler metadata come from one indexed
+query instead of a directory walk, find or ffprobe per request.
+
+The scanner walks the roots, skips files whose size and mtime are unchanged
+and reads the rest with mutagen in a process pool, committing every
+SCAN_BATCH files. A scan that is interrupted therefore resumes where it left
+off: the next run only reads what was never committed. Files that disappeared
+are dropped once a walk completes. Each scan's progress is recorded in the
+library_scans table.
+
+Usage:
+    library_index.py [--roots DIR ...] [--workers N]   scan (or resume) now
+    library_index.py --status                          show the last scans
+    (cron: 15 * * * * /opt/ai-radio/library_index.py)
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# The music roots come from the web app's config, which also gates file access by them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui"))
+
+from config import config
+from database import normalize_key
+
+INDEX_PATH = os.environ.get("LIBRARY_INDEX_PATH", "/opt/ai-radio/library_index.db")
+MUSIC_ROOTS = config.MUSIC_ROOTS
+AUDIO_EXTENSIONS = {".mp3", ".m4a", ".flac", ".wav", ".ogg", ".opus", ".aac"}
+
+SCAN_WORKERS = os.cpu_count() or 1
+SCAN_BATCH = 1000  # files read and committed together; an interruption loses at most one batch
+
+# Tag names per format: ID3 (MP3, WAV), Vorbis comments (FLAC, Ogg) and MP4
+TAG_KEYS = {
+    "title": ("TIT2", "title", "\xa9nam"),
+    "artist": ("TPE1", "artist", "\xa9ART", "TPE2", "albumartist", "aART"),
+    "album": ("TALB", "album", "\xa9alb"),
+}
+
+INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS library_files (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        title TEXT,
+        artist TEXT,
+        album TEXT,
+        artist_key TEXT,
+        title_key TEXT,
+        album_key TEXT,
+        duration REAL,
+        codec TEXT,
+        bitrate INTEGER,
+        has_art INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        scanned_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_library_track ON library_files(artist_key, title_key);
+    CREATE INDEX IF NOT EXISTS idx_library_album_art ON library_files(album_key, artist_key) WHERE has_art = 1;
+    CREATE INDEX IF NOT EXISTS idx_library_artist_art ON library_files(artist_key) WHERE has_art = 1;
+
+    CREATE TABLE IF NOT EXISTS library_scans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        roots TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        finished_at REAL,
+        files INTEGER NOT NULL DEFAULT 0,
+        probed INTEGER NOT NULL DEFAULT 0,
+        unchanged INTEGER NOT NULL DEFAULT 0,
+        removed INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0
+    );
+"""
+
+FILE_COLUMNS = ("path", "size", "mtime_ns", "title", "artist", "album", "artist_key", "title_key",
+                "album_key", "duration", "codec", "bitrate", "has_art", "error", "scanned_at")
+
+
+def embedded_art(audio) -> Optional[bytes]:
+    """Cover art bytes embedded in a mutagen file, or None"""
+    pictures = getattr(audio, "pictures", None)
+    if pictures:
+        return pictures[0].data  # FLAC
+    tags = getattr(audio, "tags", None)
+    if not tags:
+        return None
+    for key in tags.keys():
+        if key.startswith("APIC"):
+            return tags[key].data  # ID3
+    try:
+        if "covr" in tags:
+            return bytes(tags["covr"][0])  # MP4
+    except (KeyError, ValueError):
+        pass
+    return None
+
+
+def _tag(tags, keys) -> Optional[str]:
+    for key in keys:
+        try:
+            value = tags.get(key)
+        except (KeyError, ValueError):  # Vorbis comments reject non-ASCII names
+            continue
+        if value is None:
+            continue
+        value = getattr(value, "text", value)
+        if isinstance(value, list):
+            value = value[0] if value else ""
+        value = str(value).strip()
+        if value:
+            return value
+    return None
+
+
+def probe_file(path: str) -> Dict:
+    """
+    Read one file's tags and stream info (runs in the scanner's worker processes).
+
+    Returns:
+        The tag and info columns, with "error" set if mutagen could not read it
+    """
+    result = {"title": None, "artist": None, "album": None, "duration": None,
+              "codec": None, "bitrate": None, "has_art": 0, "error": None}
+    try:
+        from mutagen import File as MutaFile
+        audio = MutaFile(path)
+        if audio is None:
+            result["error"] = "unrecognized format"
+        else:
+            if audio.tags:
+                for field, keys in TAG_KEYS.items():
+                    result[field] = _tag(audio.tags, keys)
+            info = audio.info
+            if info and getattr(info, "length", 0) > 0:
+                result["duration"] = float(info.length)
+            result["bitrate"] = getattr(info, "bitrate", None) or None
+            result["codec"] = type(audio).__name__
+            result["has_art"] = int(embedded_art(audio) is not None)
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+
+    # Same "Artist - Title.ext" fallback the scheduler has always used
+    if not (result["title"] and result["artist"]):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if " - " in stem:
+            artist, title = stem.split(" - ", 1)
+            result["artist"] = result["artist"] or artist.strip()
+            result["title"] = result["title"] or title.strip()
+    return result
+
+
+def distinct_roots(roots: List[str]) -> List[str]:
+    """Existing roots with any root nested inside another dropped, so no file is walked twice"""
+    resolved = sorted({os.path.realpath(root) for root in roots if os.path.isdir(root)})
+    distinct = []
+    for root in resolved:
+        if not any(root == kept or root.startswith(kept.rstrip(os.sep) + os.sep) for kept in distinct):
+            distinct.append(root)
+    return distinct
+
+
+def index_path(path: str) -> str:
+    """
+    The form a file's path is stored in: directories resolved like the scanned
+    roots, the file name itself kept (symlinked files are indexed as links)
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(os.path.realpath(directory), name)
+
+
+def walk_audio_files(root: str) -> Iterator[Tuple[str, int, int]]:
+    """(path, size, mtime_ns) for every audio file under root; symlinked directories are not followed"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS and entry.is_file():
+                            stat = entry.stat()
+                            yield entry.path, stat.st_size, stat.st_mtime_ns
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Cannot read {directory}: {e}")
+
+
+def open_index(path: str = INDEX_PATH) -> sqlite3.Connection:
+    """Read-write connection to the index, creating it if needed"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(INDEX_SCHEMA)
+    return conn
+
+
+def scan_library(index_path: str = INDEX_PATH, roots: List[str] = MUSIC_ROOTS, workers: int = SCAN_WORKERS,
+                 batch: int = SCAN_BATCH, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Bring the index up to date with the files under roots.
+
+    Args:
+        workers: Processes reading tags; 1 reads in this process
+        progress: Called with the running counts after every committed batch
+
+    Returns:
+        Counts: "files" seen, "probed" (read with mutagen), "unchanged",
+        "removed" and "errors", plus "seconds" and "files_per_s" (probed
+        files per second) and "resumed" if the last scan never finished
+    """
+    roots = distinct_roots(roots)
+    conn = open_index(index_path)
+    started = time.perf_counter()
+    stats = {"files": 0, "probed": 0, "unchanged": 0, "removed": 0, "errors": 0}
+
+    last = conn.execute("SELECT finished_at FROM library_scans ORDER BY id DESC LIMIT 1").fetchone()
+    resumed = last is not None and last[0] is None
+    scan_id = conn.execute("INSERT INTO library_scans (roots, started_at, updated_at) VALUES (?, ?, ?)",
+                           (os.pathsep.join(roots), time.time(), time.time())).lastrowid
+    conn.commit()
+
+    known = {path: (size, mtime_ns) for path, size, mtime_ns
+             in conn.execute("SELECT path, size, mtime_ns FROM library_files")}
+    seen = set()
+    pending = []
+    pool = None
+
+    def flush():
+        nonlocal pool
+        if pending:
+            paths = [path for path, _, _ in pending]
+            if workers > 1:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                results = pool.map(probe_file, paths, chunksize=max(1, len(paths) // (workers * 4)))
+            else:
+                results = map(probe_file, paths)
+            now = time.time()
+            rows = []
+            for (path, size, mtime_ns), info in zip(pending, results):
+                stats["errors"] += info["error"] is not None
+                rows.append((path, size, mtime_ns, info["title"], info["artist"], info["album"],
+                             normalize_key(info["artist"]), normalize_key(info["title"]),
+                             normalize_key(info["album"]), info["duration"], info["codec"], info["bitrate"],
+                             info["has_art"], info["error"], now))
+            conn.executemany(f"INSERT OR REPLACE INTO library_files ({', '.join(FILE_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(FILE_COLUMNS))})", rows)
+            stats["probed"] += len(rows)
+            pending.clear()
+        conn.execute("""
+            UPDATE library_scans SET updated_at = ?, files = ?, probed = ?, unchanged = ?, errors = ?
+            WHERE id = ?
+        """, (time.time(), stats["files"], stats["probed"], stats["unchanged"], stats["errors"], scan_id))
+        conn.commit()
+        if progress:
+            progress(dict(stats, seconds=time.perf_counter() - started))
+
+    try:
+        for root in roots:
+            for path, size, mtime_ns in walk_audio_files(root):
+                stats["files"] += 1
+                seen.add(path)
+                if known.get(path) == (size, mtime_ns):
+                    stats["unchanged"] += 1
+                    if stats["unchanged"] % batch == 0:
+                        flush()
+                    continue
+                pending.append((path, size, mtime_ns))
+                if len(pending) >= batch:
+                    flush()
+        flush()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Only files under a root that was walked are dropped, so an unmounted share keeps its rows
+    prefixes = tuple(root.rstrip(os.sep) + os.sep for root in roots)
+    gone = [(path,) for path in known if path not in seen and path.startswith(prefixes)]
+    conn.executemany("DELETE FROM library_files WHERE path = ?", gone)
+    stats["removed"] = len(gone)
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    stats["files_per_s"] = round(stats["probed"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    stats["resumed"] = resumed
+    conn.execute("UPDATE library_scans SET updated_at = ?, finished_at = ?, removed = ? WHERE id = ?",
+                 (time.time(), time.time(), stats["removed"], scan_id))
+    conn.commit()
+    conn.close()
+    return stats
+
+
+class LibraryIndex:
+    """
+    Read-only lookups against the index; each thread keeps its own connection.
+    Every lookup returns None (or []) while no index has been built yet.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = sqlite3.connect(f"file:{quote(self.path)}?mode=ro", uri=True, check_same_thread=False)
+            except sqlite3.Error:
+                return None
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql: str, params: Tuple) -> List[Dict]:
+        conn = self._connection()
+        if conn is None:
+            return []
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        except sqlite3.Error as e:
+            print(f"Library index query failed: {e}")
+            return []
+
+    def get(self, path: str) -> Optional[Dict]:
+        """The index row for one file, or None if it is not indexed"""
+        rows = self._query("SELECT * FROM library_files WHERE path = ?", (index_path(path),))
+        return rows[0] if rows else None
+
+    def find_track(self, artist: str, title: str, album: Optional[str] = None) -> Optional[Dict]:
+        """Best indexed file for a track: same album first, then any readable copy"""
+        rows = self._query("""
+            SELECT * FROM library_files
+            WHERE artist_key = ? AND title_key = ?
+            ORDER BY album_key = ? DESC, duration IS NULL, path
+            LIMIT 1
+        """, (normalize_key(artist), normalize_key(title), normalize_key(album)))
+        return rows[0] if rows else None
+
+    def find_art(self, artist: str, album: Optional[str] = None, limit: int = 3) -> List[str]:
+        """
+        Files with embedded cover art for an artist and album, best match first:
+        artist and album, then the album by any artist, then anything by the artist
+        """
+        artist_key, album_key = normalize_key(artist), normalize_key(album)
+        queries = []
+        if album_key:
+            queries.append(("album_key = ? AND artist_key = ?", (album_key, artist_key)))
+            queries.append(("album_key = ?", (album_key,)))
+        if artist_key:
+            queries.append(("artist_key = ?", (artist_key,)))
+        paths = []
+        for where, params in queries:
+            for row in self._query(f"SELECT path FROM library_files WHERE has_art = 1 AND {where} "
+                                   f"ORDER BY path LIMIT ?", params + (limit,)):
+                if row["path"] not in paths:
+                    paths.append(row["path"])
+            if len(paths) >= limit:
+                break
+        return paths[:limit]
+
+    def scans(self, limit: int = 5) -> List[Dict]:
+        """The most recent scans, newest first"""
+        return self._query("SELECT * FROM library_scans ORDER BY id DESC LIMIT ?", (limit,))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+library_index = LibraryIndex()
+
+
+def print_progress(stats: Dict):
+    rate = stats["probed"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"  {stats['files']:>8} files  {stats['probed']:>8} read  {stats['unchanged']:>8} unchanged  "
+          f"{stats['errors']:>6} errors  {rate:>8.0f} files/s  {stats['seconds']:>7.1f}s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the music library index")
+    parser.add_argument("--db", default=INDEX_PATH)
+    parser.add_argument("--roots", nargs="+", default=MUSIC_ROOTS)
+    parser.add_argument("--workers", type=int, default=SCAN_WORKERS)
+    parser.add_argument("--status", action="store_true", help="show the last scans instead of scanning")
+    args = parser.parse_args()
+
+    if args.status:
+        print(f"{'started':<20} {'files':>8} {'read':>8} {'unchanged':>10} {'removed':>8} {'errors':>7} {'state':>9}")
+        for scan in LibraryIndex(args.db).scans():
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(scan["started_at"]))
+            state = "done" if scan["finished_at"] else "stopped"
+            print(f"{started:<20} {scan['files']:>8} {scan['probed']:>8} {scan['unchanged']:>10} "
+                  f"{scan['removed']:>8} {scan['errors']:>7} {state:>9}")
+        return 0
+
+    stats = scan_library(args.db, args.roots, args.workers, progress=print_progress)
+    print(f"{'✅ Resumed' if stats['resumed'] else '✅ Scanned'} {stats['files']} files in {stats['seconds']:.1f}s: "
+          f"{stats['probed']} read ({stats['files_per_s']:.0f} files/s), {stats['unchanged']} unchanged, "
+          f"{stats['removed']} removed, {stats['errors']} unreadable")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
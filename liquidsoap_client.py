@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Shared Liquidsoap telnet client for AI Radio
+Keeps one long-lived connection per server, frames responses on END,
+pipelines several commands in a single write and reconnects with backoff.
+"""
+
+import os
+import re
+import socket
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LIQUIDSOAP_HOST = os.environ.get("QUEUE_HOST", "127.0.0.1")
+LIQUIDSOAP_PORT = int(os.environ.get("QUEUE_PORT", "1234"))
+
+CONNECT_TIMEOUT = 2.0
+READ_TIMEOUT = 2.0
+
+# Reconnect backoff (seconds): doubles after every failed connect, reset on success
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+
+# Every Liquidsoap response is terminated by a line containing only END
+_END_MARKER = re.compile(rb"(?:^|\n)END\r?\n")
+
+
+class LiquidsoapError(OSError):
+    """Raised when Liquidsoap cannot be reached or stops answering"""
+
+
+class LiquidsoapClient:
+    """Persistent, thread-safe connection to the Liquidsoap telnet server"""
+
+    def __init__(self, host: str = LIQUIDSOAP_HOST, port: int = LIQUIDSOAP_PORT,
+                 timeout: float = READ_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._buffer = b""
+        self._lock = Lock()
+        self._backoff = 0.0
+        self._next_attempt = 0.0
+
+    def command(self, cmd: str, timeout: float = None) -> List[str]:
+        """Run a single command and return its response lines (without END)"""
+        return self.pipeline([cmd], timeout=timeout)[0]
+
+    def pipeline(self, cmds: Sequence[str], timeout: float = None) -> List[List[str]]:
+        """Run several commands in one write and return one line list per command"""
+        return [_split_lines(block) for block in self.pipeline_raw(cmds, timeout=timeout)]
+
+    def command_raw(self, cmd: str, timeout: float = None) -> bytes:
+        """Run a single command and return the undecoded response body"""
+        return self.pipeline_raw([cmd], timeout=timeout)[0]
+
+    def pipeline_raw(self, cmds: Sequence[str], timeout: float = None) -> List[bytes]:
+        """
+        Send all commands in a single write and read back one response per command.
+
+        A connection that the server closed while idle is detected on the first
+        read and the batch is retried once on a fresh connection, but only when
+        nothing at all was received for it (so commands are never run twice).
+        """
+        if not cmds:
+            return []
+        if timeout is None:
+            timeout = self.timeout
+
+        payload = "".join(f"{cmd}\n" for cmd in cmds).encode("utf-8")
+
+        with self._lock:
+            for attempt in range(2):
+                sock = self._connect()
+                received = []
+                try:
+                    sock.sendall(payload)
+                    for _ in cmds:
+                        received.append(self._read_block(sock, timeout))
+                    return received
+                except OSError as e:
+                    self._disconnect()
+                    stale = not received and not isinstance(e, socket.timeout)
+                    if attempt == 0 and stale:
+                        continue
+                    raise LiquidsoapError(f"Liquidsoap command failed ({cmds[0]!r}): {e}") from e
+        raise LiquidsoapError("unreachable")
+
+    def close(self):
+        """Close the connection politely"""
+        with self._lock:
+            if self._sock is not None:
+                try:
+                    self._sock.sendall(b"quit\n")
+                except OSError:
+                    pass
+            self._disconnect()
+
+    def _connect(self) -> socket.socket:
+        if self._sock is not None:
+            return self._sock
+
+        now = time.monotonic()
+        if now < self._next_attempt:
+            raise LiquidsoapError(
+                f"Liquidsoap unavailable, next reconnect in {self._next_attempt - now:.1f}s")
+
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        except OSError as e:
+            self._backoff = min(BACKOFF_MAX, self._backoff * 2 or BACKOFF_INITIAL)
+            self._next_attempt = time.monotonic() + self._backoff
+            raise LiquidsoapError(f"Cannot connect to Liquidsoap at {self.host}:{self.port}: {e}") from e
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._buffer = b""
+        self._backoff = 0.0
+        self._next_attempt = 0.0
+        return sock
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._buffer = b""
+
+    def _read_block(self, sock: socket.socket, timeout: float) -> bytes:
+        """Read up to and including the next END line, return everything before it"""
+        deadline = time.monotonic() + timeout
+        while True:
+            match = _END_MARKER.search(self._buffer)
+            if match:
+                block = self._buffer[:match.start()]
+                self._buffer = self._buffer[match.end():]
+                return block
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("timed out waiting for END")
+            sock.settimeout(remaining)
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionResetError("connection closed by Liquidsoap")
+            self._buffer += chunk
+
+
+def _split_lines(block: bytes) -> List[str]:
+    lines = block.decode("utf-8", errors="ignore").splitlines()
+    return [line for line in lines if line.strip()]
+
+
+# Shared clients, one per (host, port)
+_clients: Dict[Tuple[str, int], LiquidsoapClient] = {}
+_clients_lock = Lock()
+
+
+def get_client(host: str = LIQUIDSOAP_HOST, port: int = LIQUIDSOAP_PORT) -> LiquidsoapClient:
+    """Return the process-wide client for a Liquidsoap server"""
+    key = (host, int(port))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = LiquidsoapClient(host, int(port))
+            _clients[key] = client
+        return client
+
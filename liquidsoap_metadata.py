@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Shared parser for Liquidsoap metadata responses
+Handles both request.metadata (flat key="value" lines) and
+output.icecast.metadata (the same lines grouped under --- N --- headers).
+
+Works on the raw bytes from the telnet socket: keys are split off first and
+ignored keys (embedded cover art, encoder padding) are skipped before their
+values are ever decoded, so a multi-megabyte cover= line costs one memchr.
+"""
+
+import re
+from typing import Dict, FrozenSet, Union
+
+# Binary or bulky tags nobody reads; compared case-insensitively
+IGNORED_KEYS: FrozenSet[bytes] = frozenset({
+    b"cover",
+    b"coverart",
+    b"apic",
+    b"metadata_block_picture",
+    b"itunsmpb",
+    b"itunnorm",
+})
+
+# Escapes produced by Liquidsoap's string quoting
+_ESCAPE = re.compile(rb'\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|[0-7]{3}|.)', re.DOTALL)
+_SIMPLE_ESCAPES = {b'n': b'\n', b't': b'\t', b'r': b'\r', b'"': b'"', b'\\': b'\\',
+                   b"'": b"'", b'/': b'/'}
+
+Payload = Union[bytes, bytearray, str]
+
+
+def _unescape_match(match) -> bytes:
+    esc = match.group(1)
+    if len(esc) == 5 and esc[:1] == b'u':
+        return chr(int(esc[1:], 16)).encode("utf-8")
+    if len(esc) == 3 and esc[:1] == b'x':
+        return bytes((int(esc[1:], 16),))
+    if len(esc) == 3:
+        return bytes((int(esc, 8) & 0xFF,))
+    return _SIMPLE_ESCAPES.get(esc, esc)
+
+
+def decode_value(raw: bytes) -> str:
+    """Strip surrounding quotes, resolve escapes and decode a value as UTF-8"""
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[:1] == b'"' and raw[-1:] == b'"':
+        raw = raw[1:-1]
+    if b'\\' in raw:
+        raw = _ESCAPE.sub(_unescape_match, raw)
+    return raw.decode("utf-8", errors="replace")
+
+
+def _as_bytes(data: Payload) -> bytes:
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    return bytes(data) if isinstance(data, bytearray) else data
+
+
+def _section_number(line: bytes):
+    """Return N for a '--- N ---' header line, None for anything else"""
+    if line.startswith(b"---") and line.endswith(b"---") and len(line) > 6:
+        try:
+            return int(line[3:-3])
+        except ValueError:
+            return None
+    return None
+
+
+def _parse(data: bytes, ignored: FrozenSet[bytes], sectioned: bool):
+    sections: Dict[int, Dict[str, str]] = {}
+    current: Dict[str, str] = {}
+    current_num = None
+
+    pos, end = 0, len(data)
+    while pos < end:
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            nl = end
+
+        # Only the key is sliced here; skipped values are never copied or decoded
+        eq = data.find(b"=", pos, nl)
+        if eq < 0:
+            line = data[pos:nl].strip()
+            if sectioned and line.startswith(b"---"):
+                num = _section_number(line)
+                if num is not None:
+                    current = sections.setdefault(num, {})
+                    current_num = num
+        elif not sectioned or current_num is not None:
+            key = data[pos:eq].strip().strip(b'"')
+            if key and key.lower() not in ignored:
+                current[key.decode("utf-8", errors="replace")] = decode_value(data[eq + 1:nl])
+        pos = nl + 1
+
+    if sectioned:
+        return {num: section for num, section in sections.items() if section}
+    return current
+
+
+def parse_kv(data: Payload, ignored: FrozenSet[bytes] = IGNORED_KEYS) -> Dict[str, str]:
+    """
+    Parse key="value" lines (e.g. request.metadata N) into a dict.
+
+    Args:
+        data: Raw response as bytes (preferred) or str
+        ignored: Lower-case keys to skip without decoding their values
+
+    Returns:
+        Dictionary of decoded keys and values
+    """
+    if not data:
+        return {}
+    return _parse(_as_bytes(data), ignored, sectioned=False)
+
+
+def parse_sections(data: Payload, ignored: FrozenSet[bytes] = IGNORED_KEYS) -> Dict[int, Dict[str, str]]:
+    """
+    Parse a --- N --- sectioned response (e.g. output.icecast.metadata).
+
+    Args:
+        data: Raw response as bytes (preferred) or str
+        ignored: Lower-case keys to skip without decoding their values
+
+    Returns:
+        Ordered dict of section number to metadata, in response order
+    """
+    if not data:
+        return {}
+    return _parse(_as_bytes(data), ignored, sectioned=True)
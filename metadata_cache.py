@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Change-only cache files for the metadata daemon
+The daemon rewrites a cache file only when its content hash changes and stamps
+it with a monotonically increasing version. Freshness lives in a tiny separate
+heartbeat file, so readers can tell the daemon is alive without the data files
+being rewritten, and can skip re-parsing a file whose version has not moved.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+HEARTBEAT_NAME = "daemon_heartbeat.json"
+HEARTBEAT_INTERVAL = 5  # seconds - the daemon beats on its own timer, not only when it fetches
+HEARTBEAT_STALE_AFTER = 30  # seconds - an older heartbeat means the daemon is down (six missed beats)
+
+# Keys that change on every poll without the content changing
+VOLATILE_KEYS = ("cached_at", "version")
+
+
+def _atomic_dump(filepath: str, data: Any):
+    temp_path = filepath + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, filepath)
+
+
+def content_hash(data: Any, volatile: Iterable[str] = VOLATILE_KEYS) -> str:
+    """Hash cache content, ignoring volatile top-level keys"""
+    if isinstance(data, dict):
+        data = {k: v for k, v in data.items() if k not in volatile}
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CacheWriter:
+    """Writes versioned cache files on change and keeps the heartbeat current"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.heartbeat_path = os.path.join(cache_dir, HEARTBEAT_NAME)
+        self._hashes: Dict[str, str] = {}
+        # Continue from the last run so versions never go backwards across restarts
+        heartbeat = read_heartbeat(self.heartbeat_path) or {}
+        self.versions: Dict[str, int] = dict(heartbeat.get("versions", {}))
+
+    def write(self, filepath: str, data: Any) -> bool:
+        """
+        Write a cache file if its content changed.
+
+        Args:
+            filepath: Cache file path
+            data: JSON-serialisable content (dicts get a "version" field)
+
+        Returns:
+            True if the file was rewritten
+        """
+        name = os.path.basename(filepath)
+        digest = content_hash(data)
+        if self._hashes.get(filepath) == digest and os.path.exists(filepath):
+            return False
+
+        version = self.versions.get(name, 0) + 1
+        if isinstance(data, dict):
+            data = {**data, "version": version}
+        _atomic_dump(filepath, data)
+
+        self._hashes[filepath] = digest
+        self.versions[name] = version
+        return True
+
+    def heartbeat(self):
+        """Record that the daemon is alive, along with the current file versions"""
+        _atomic_dump(self.heartbeat_path, {
+            "updated_at": time.time(),
+            "pid": os.getpid(),
+            "versions": self.versions
+        })
+
+
+def read_heartbeat(heartbeat_path: str) -> Optional[Dict]:
+    """Read the daemon heartbeat, or None if it is missing or unreadable"""
+    try:
+        with open(heartbeat_path, 'r') as f:
+            heartbeat = json.load(f)
+        return heartbeat if isinstance(heartbeat, dict) else None
+    except (OSError, ValueError):
+        return None
+
+
+class CacheReader:
+    """
+    Reads one daemon cache file, re-parsing it only when its version moves.
+
+    The heartbeat's version map is consulted first; without a heartbeat the
+    file's mtime is used as the version instead.
+    """
+
+    def __init__(self, filepath: str, heartbeat_path: str = None):
+        self.filepath = filepath
+        self.name = os.path.basename(filepath)
+        self.heartbeat_path = heartbeat_path or os.path.join(os.path.dirname(filepath), HEARTBEAT_NAME)
+        self._version = None
+        self._data = None
+
+    def read(self, default: Any = None) -> Tuple[Any, Optional[float]]:
+        """
+        Return the cached content and the daemon heartbeat age in seconds.
+
+        Returns:
+            (data, age) where age is None when no heartbeat is available
+        """
+        heartbeat = read_heartbeat(self.heartbeat_path)
+        age = None
+        version = None
+        if heartbeat:
+            age = time.time() - float(heartbeat.get("updated_at", 0))
+            version = heartbeat.get("versions", {}).get(self.name)
+        if version is None:
+            try:
+                version = ("mtime", os.stat(self.filepath).st_mtime_ns)
+            except OSError:
+                return default, age
+
+        if version != self._version:
+            try:
+                with open(self.filepath, 'r') as f:
+                    self._data = json.load(f)
+                self._version = version
+            except (OSError, ValueError):
+                return (self._data if self._data is not None else default), age
+
+        return self._data, age
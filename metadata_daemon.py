@@ -1,23 +1,32 @@
 #!/usr/bin/env python3
 """
 Metadata caching daemon to prevent telnet connection storms.
-This daemon periodically queries Liquidsoap and caches the results in JSON files.
+This daemon queries Liquidsoap when radio.liq pushes a track change (with a slow
+poll as a safety net) and caches the results in JSON files.
 """
 
 import json
-import socket
 import time
 import os
 import re
 import threading
 import requests
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
 import sys
 
 # Add current directory to path for database import
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from liquidsoap_client import get_client, LiquidsoapError
+from liquidsoap_metadata import parse_sections
+from metadata_cache import HEARTBEAT_INTERVAL, CacheWriter
+
 # Configuration
 LIQUIDSOAP_HOST = "127.0.0.1"
 LIQUIDSOAP_PORT = 1234
@@ -25,150 +34,177 @@ CACHE_DIR = "/opt/ai-radio/cache"
 UPDATE_INTERVAL = 3  # seconds - frequent updates for responsiveness
 TELNET_TIMEOUT = 2.0
 
+# Per-source deadlines for the concurrent snapshot fetch
+ICECAST_STATUS_URL = "http://127.0.0.1:8000/status-json.xsl"
+ICECAST_DEADLINE = 1.5  # seconds
+LIQUIDSOAP_DEADLINE = TELNET_TIMEOUT
+DEADLINE_GRACE = 0.25  # seconds - slack for the worker to hand back its result
+
+# Track-change push listener (radio.liq posts here from source.on_track)
+NOTIFY_HOST = "127.0.0.1"
+NOTIFY_PORT = 5056
+SAFETY_POLL_INTERVAL = 30  # seconds - slow poll in case a notification is lost
+CONFIRM_DELAY = 2  # seconds - re-check shortly after a push
+NEXT_INTERVAL = 15  # seconds - upcoming queue refresh cadence of the old fixed poll
+
+# Adaptive polling around track boundaries
+BOUNDARY_WINDOW = 5  # seconds either side of the expected track end that are polled hard
+FAST_POLL_INTERVAL = 1  # seconds - poll rate inside the boundary window
+MAX_POLL_INTERVAL = 30  # seconds - back-off ceiling in the middle of a track
+# Fixed 3 s polling cost two calls per tick plus three calls per 15 s next refresh
+FIXED_POLL_CALLS_PER_HOUR = 3600 / UPDATE_INTERVAL * 2 + 3600 / NEXT_INTERVAL * 3
+
 # Cache files
 NOW_CACHE = os.path.join(CACHE_DIR, "now_metadata.json")
 NEXT_CACHE = os.path.join(CACHE_DIR, "next_metadata.json")
 REMAINING_CACHE = os.path.join(CACHE_DIR, "remaining_time.json")
+POLL_STATS_CACHE = os.path.join(CACHE_DIR, "poll_stats.json")
 
-# Global lock to prevent concurrent Liquidsoap access
-liquidsoap_lock = threading.Lock()
+# Cache files are rewritten only on change; the heartbeat carries freshness
+cache_writer = None
+
+# Keep-alive HTTP session and workers for the concurrent Icecast/Liquidsoap fetch.
+# Spare workers let a new tick start while a late fetch is still finishing.
+icecast_session = requests.Session()
+fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fetch")
 
 # Track change detection
 last_track_id = None
 track_started_at = None
 
+# Set by the listener whenever Liquidsoap reports a new track
+track_change_event = threading.Event()
+
+# Expected end of the current track on the monotonic clock (None = unknown)
+expected_track_end = None
+boundary_track_id = None
+
 def setup_cache_dir():
-    """Ensure cache directory exists"""
+    """Ensure cache directory exists and set up the change-only writer"""
+    global cache_writer
     os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_writer = CacheWriter(CACHE_DIR)
 
-def liquidsoap_command(cmd, timeout=None):
+@dataclass(frozen=True)
+class MetadataSnapshot:
+    """One tick's view of Icecast and Liquidsoap, fetched and parsed exactly once"""
+    icecast_title: Optional[str]
+    sections: Tuple[Tuple[int, Mapping[str, str]], ...]  # in Liquidsoap response order
+    fetched_at: float
+
+def fetch_icecast_title():
+    """Get what Icecast thinks is playing (source of truth) over the keep-alive session"""
+    try:
+        response = icecast_session.get(ICECAST_STATUS_URL, timeout=ICECAST_DEADLINE)
+        if response.status_code == 200:
+            icecast_data = response.json()
+            icecast_title = icecast_data.get("icestats", {}).get("source", {}).get("title", "")
+            print(f"Icecast shows: {icecast_title}")
+            return icecast_title
+    except Exception as e:
+        print(f"Could not get Icecast metadata: {e}")
+    return None
+
+def fetch_liquidsoap_sections():
+    """Get Liquidsoap metadata, parsed straight from the socket bytes"""
+    try:
+        raw = get_client(LIQUIDSOAP_HOST, LIQUIDSOAP_PORT).command_raw(
+            "output.icecast.metadata", timeout=LIQUIDSOAP_DEADLINE)
+    except LiquidsoapError as e:
+        print(f"Liquidsoap connection error for 'output.icecast.metadata': {e}")
+        raw = b""
+    if not raw.strip():
+        print("No response from Liquidsoap metadata command")
+    
+    sections = parse_sections(raw)
+    print(f"Parsed {len(sections)} metadata sections")
+    return sections
+
+def fetch_snapshot():
     """
-    Execute a single command against Liquidsoap telnet interface.
-    Returns list of response lines (without 'END').
+    Fetch Icecast status and output.icecast.metadata once for this tick.
+    
+    Both sources are queried concurrently, each against its own deadline, so the
+    tick costs the slower of the two rather than their sum. A source that misses
+    its deadline is treated as unavailable for this tick.
     """
-    if timeout is None:
-        timeout = TELNET_TIMEOUT
-        
-    with liquidsoap_lock:
+    started = time.monotonic()
+    icecast_future = fetch_pool.submit(fetch_icecast_title)
+    liquidsoap_future = fetch_pool.submit(fetch_liquidsoap_sections)
+    
+    def result_by(future, deadline, name, default):
         try:
-            sock = socket.create_connection((LIQUIDSOAP_HOST, LIQUIDSOAP_PORT), timeout=timeout)
-            sock.settimeout(timeout)
-            
-            # Send command
-            sock.sendall((cmd + "\nquit\n").encode("utf-8"))
-            sock.shutdown(socket.SHUT_WR)
-            
-            # Read response
-            data = b""
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                try:
-                    chunk = sock.recv(4096)
-                    if not chunk:
-                        break
-                    data += chunk
-                    if b"\nEND" in data or data.rstrip().endswith(b"END"):
-                        break
-                except socket.timeout:
-                    break
-                    
-            sock.close()
-            
-            # Parse response
-            lines = data.decode("utf-8", errors="ignore").splitlines()
-            return [line for line in lines if line.strip() and line.strip() != "END"]
-            
-        except (socket.error, ConnectionRefusedError, OSError) as e:
-            print(f"Liquidsoap connection error for '{cmd}': {e}")
-            return []
+            return future.result(timeout=max(0, started + deadline - time.monotonic()))
+        except FutureTimeout:
+            print(f"{name} missed its {deadline:.1f}s deadline, continuing without it")
+            return default
+    
+    sections = result_by(liquidsoap_future, LIQUIDSOAP_DEADLINE + DEADLINE_GRACE, "Liquidsoap", {})
+    icecast_title = result_by(icecast_future, ICECAST_DEADLINE + DEADLINE_GRACE, "Icecast", None)
+    return MetadataSnapshot(
+        icecast_title=icecast_title,
+        sections=tuple((num, MappingProxyType(section)) for num, section in sections.items()),
+        fetched_at=time.time()
+    )
 
-def parse_kv_lines(lines):
-    """Parse Liquidsoap key="value" lines into dict"""
-    result = {}
-    for line in lines:
-        if "=" in line:
-            key, value = line.split("=", 1)
-            key = key.strip()
-            value = value.strip().strip('"')
-            result[key] = value
-    return result
-
-def parse_metadata_sections(lines):
-    """Parse Liquidsoap metadata sections (--- 1 ---, --- 2 ---, etc.) into dict"""
-    sections = {}
-    current_section = {}
-    current_section_num = None
+def note_track(artist, title, filename):
+    """
+    Detect track changes and update the start time.
     
-    for line in lines:
-        line = line.strip()
-        if line.startswith("--- ") and line.endswith(" ---"):
-            # Save previous section if it exists
-            if current_section_num is not None and current_section:
-                sections[current_section_num] = current_section
-            
-            # Extract section number
-            try:
-                section_str = line[4:-4].strip()  # Remove "--- " and " ---"
-                current_section_num = int(section_str)
-                current_section = {}
-            except ValueError:
-                print(f"Warning: Could not parse section number from '{line}'")
-                continue
-                
-        elif "=" in line and current_section_num is not None:
-            # Parse key=value lines within section
-            key, value = line.split("=", 1)
-            key = key.strip()
-            value = value.strip().strip('"')
-            current_section[key] = value
+    An Icecast-only tick has no filename, so it counts as the same track as a
+    Liquidsoap tick with matching artist and title (and vice versa).
+    """
+    global last_track_id, track_started_at
+    current_track_id = f"{artist}|{title}|{filename}"
+    if current_track_id == last_track_id:
+        return
     
-    # Don't forget the last section
-    if current_section_num is not None and current_section:
-        sections[current_section_num] = current_section
+    bare_id = f"{artist}|{title}|"
+    if last_track_id == bare_id or (not filename and (last_track_id or "").startswith(bare_id)):
+        if filename:
+            last_track_id = current_track_id
+        return
     
-    print(f"Parsed {len(sections)} metadata sections")
-    return sections
+    print(f"Track changed: {last_track_id} -> {current_track_id}")
+    last_track_id = current_track_id
+    track_started_at = time.time()
 
-def get_current_metadata():
+def icecast_only_metadata(icecast_title):
+    """Build now-playing metadata from an "Artist - Title" Icecast title alone"""
+    if not icecast_title:
+        return {}
+    
+    if " - " in icecast_title:
+        artist, title = (part.strip() for part in icecast_title.split(" - ", 1))
+    else:
+        artist, title = "Unknown", icecast_title.strip()
+    
+    note_track(artist, title, "")
+    
+    print(f"No Liquidsoap sections, using Icecast data only: {icecast_title}")
+    return {
+        "title": title,
+        "artist": artist,
+        "album": "",
+        "genre": "",
+        "date": "",
+        "filename": "",
+        "cached_at": time.time(),
+        "source": "icecast_only",
+        "track_started_at": track_started_at
+    }
+
+def get_current_metadata(snapshot):
     """Get current track metadata with Liquidsoap/Icecast validation"""
     global last_track_id, track_started_at
     try:
-        # First get what Icecast thinks is playing (source of truth)
-        icecast_title = None
-        try:
-            response = requests.get("http://127.0.0.1:8000/status-json.xsl", timeout=3)
-            if response.status_code == 200:
-                icecast_data = response.json()
-                icecast_title = icecast_data.get("icestats", {}).get("source", {}).get("title", "")
-                print(f"Icecast shows: {icecast_title}")
-        except Exception as e:
-            print(f"Could not get Icecast metadata: {e}")
-        
-        # Now get Liquidsoap metadata
-        # Get current metadata directly from Liquidsoap
-        lines = liquidsoap_command("output.icecast.metadata")
-        if not lines:
-            print("No response from Liquidsoap metadata command")
-            return {}
-        
-        # Parse metadata sections (--- 1 ---, --- 2 ---, etc.)
-        sections = []
-        current_section = {}
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith("--- ") and line.endswith(" ---"):
-                if current_section:
-                    sections.append(current_section)
-                current_section = {}
-            elif "=" in line and not line.startswith("itunsmpb") and not line.startswith("cover"):
-                key, val = line.split("=", 1)
-                key = key.strip()
-                val = val.strip().strip('"')
-                current_section[key] = val
+        icecast_title = snapshot.icecast_title
         
-        if current_section:
-            sections.append(current_section)
+        # Sections are copied so the snapshot itself stays untouched
+        sections = [dict(section) for _, section in snapshot.sections]
+        if not sections:
+            # Liquidsoap missed its deadline or had nothing: fall back to Icecast alone
+            return icecast_only_metadata(icecast_title)
         
         # Find the currently playing music track (use LAST section, which is the current one)
         current_track = None
@@ -241,11 +277,7 @@ def get_current_metadata():
         }
         
         # Detect track changes and update start time
-        current_track_id = f"{metadata['artist']}|{metadata['title']}|{filename}"
-        if current_track_id != last_track_id:
-            print(f"Track changed: {last_track_id} -> {current_track_id}")
-            last_track_id = current_track_id
-            track_started_at = time.time()
+        note_track(metadata["artist"], metadata["title"], filename)
         
         # Add track start timestamp
         metadata["track_started_at"] = track_started_at
@@ -263,11 +295,9 @@ def get_current_metadata():
                 print("METADATA STUCK: Icecast shows AI DJ but current track is music - fixing")
                 try:
                     # Use TTS flush_and_skip which is more effective for stuck DJ intros
-                    sock = socket.create_connection(("127.0.0.1", 1234), timeout=3)
-                    sock.sendall(b"tts.flush_and_skip\nquit\n")
-                    sock.close()
+                    get_client(LIQUIDSOAP_HOST, LIQUIDSOAP_PORT).command("tts.flush_and_skip", timeout=3)
                     print("Applied fix: flushed TTS and skipped to clear stuck DJ intro")
-                except Exception as e:
+                except LiquidsoapError as e:
                     print(f"Failed to apply fix: {e}")
         
         return metadata
@@ -276,28 +306,7 @@ def get_current_metadata():
         print(f"Error getting current metadata from Liquidsoap: {e}")
         return {}
 
-def get_metadata_for_rid(rid):
-    """Get metadata for a specific request ID"""
-    try:
-        lines = liquidsoap_command(f"request.metadata {rid}")
-        metadata = parse_kv_lines(lines)
-        
-        filename = metadata.get("filename") or metadata.get("initial_uri", "")
-        if filename.startswith("file://"):
-            filename = filename[7:]
-            
-        return {
-            "title": metadata.get("title", ""),
-            "artist": metadata.get("artist", ""),
-            "album": metadata.get("album", ""),
-            "filename": filename,
-            "artwork_url": f"/api/cover?file={filename}" if filename else ""
-        }
-    except Exception as e:
-        print(f"Error getting metadata for RID {rid}: {e}")
-        return {}
-
-def get_next_tracks():
+def get_next_tracks(snapshot, current_metadata):
     """Get upcoming tracks from Liquidsoap queue"""
     try:
         # Try Harbor cache first (if it exists)
@@ -315,25 +324,15 @@ def get_next_tracks():
                 print(f"Harbor next tracks: {len(next_tracks)} upcoming")
                 return next_tracks
         
-        # Get actual queue from Liquidsoap icecast metadata
-        print("Getting actual queue from Liquidsoap output.icecast.metadata")
-        lines = liquidsoap_command("output.icecast.metadata")
-        if not lines:
-            print("No response from Liquidsoap metadata command")
-            return [
-                {"title": "Random Selection", "artist": "Surprise Track Coming Up!", "album": "🎲 Shuffle Mode", "filename": "", "artwork_url": None}
-            ]
-        
-        # Parse metadata sections (--- 1 ---, --- 2 ---, --- 3 ---)
-        sections = parse_metadata_sections(lines)
+        # Get actual queue from this tick's Liquidsoap icecast metadata
+        sections = dict(snapshot.sections)
         if not sections:
             print("No metadata sections found")
             return [
                 {"title": "Random Selection", "artist": "Surprise Track Coming Up!", "album": "🎲 Shuffle Mode", "filename": "", "artwork_url": None}
             ]
         
-        # Get current track to exclude it from next tracks
-        current_metadata = get_current_metadata()
+        # Exclude the current track computed from the same snapshot
         current_track_id = f"{current_metadata.get('artist', '')}|{current_metadata.get('title', '')}" if current_metadata else ""
         
         # Build next tracks list from sections (skip current track)
@@ -402,34 +401,234 @@ def get_next_tracks():
         ]
 
 def write_cache_file(filepath, data):
-    """Atomically write cache file"""
+    """Atomically write cache file if its content changed (cached_at is ignored)"""
     try:
-        temp_path = filepath + ".tmp"
-        with open(temp_path, 'w') as f:
-            json.dump(data, f)
-        os.rename(temp_path, filepath)
-        print(f"Updated cache: {os.path.basename(filepath)}")
+        if cache_writer.write(filepath, data):
+            print(f"Updated cache: {os.path.basename(filepath)}")
     except Exception as e:
         print(f"Error writing cache file {filepath}: {e}")
 
+def write_heartbeat():
+    """Refresh the heartbeat readers use to judge cache freshness"""
+    try:
+        cache_writer.heartbeat()
+    except Exception as e:
+        print(f"Error writing heartbeat: {e}")
+
+class TrackChangeHandler(BaseHTTPRequestHandler):
+    """Accepts track-change notifications pushed by radio.liq"""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        artist = query.get("artist", [""])[0]
+        title = query.get("title", [""])[0]
+        print(f"Track change pushed by Liquidsoap: {artist} - {title}")
+
+        track_change_event.set()
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_notify_listener():
+    """Start the track-change listener, returns False if the port is unavailable"""
+    try:
+        server = ThreadingHTTPServer((NOTIFY_HOST, NOTIFY_PORT), TrackChangeHandler)
+    except OSError as e:
+        print(f"Could not start track-change listener on {NOTIFY_HOST}:{NOTIFY_PORT}: {e}")
+        return False
+
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Listening for track changes on http://{NOTIFY_HOST}:{NOTIFY_PORT}/track-change")
+    return True
+
+def read_remaining():
+    """Read seconds remaining in the current track from Liquidsoap"""
+    try:
+        lines = get_client(LIQUIDSOAP_HOST, LIQUIDSOAP_PORT).command(
+            "output.icecast.remaining", timeout=TELNET_TIMEOUT)
+    except LiquidsoapError as e:
+        print(f"Liquidsoap connection error for 'output.icecast.remaining': {e}")
+        return None
+    for line in lines:
+        try:
+            return max(0.0, float(line.strip()))
+        except ValueError:
+            continue
+    return None
+
+def update_track_boundary():
+    """
+    Read output.icecast.remaining once per track and extrapolate the track end
+    with the monotonic clock. Returns True if Liquidsoap was queried.
+    """
+    global expected_track_end, boundary_track_id
+    if last_track_id is None:
+        return False
+    if last_track_id == boundary_track_id and expected_track_end is not None:
+        return False
+    
+    remaining = read_remaining()
+    boundary_track_id = last_track_id
+    expected_track_end = time.monotonic() + remaining if remaining is not None else None
+    
+    if remaining is not None:
+        # Readers extrapolate from measured_at, so this is written once per track
+        measured_at = time.time()
+        write_cache_file(REMAINING_CACHE, {
+            "remaining": remaining,
+            "measured_at": measured_at,
+            "track_started_at": track_started_at,
+            "duration": round(measured_at - track_started_at + remaining, 1) if track_started_at else None
+        })
+    return True
+
+def choose_poll_interval(now, push_enabled):
+    """
+    Pick the delay until the next current-track poll.
+    
+    Returns (interval, reason). Without push notifications the daemon polls
+    hard only in a window around the expected track end and backs off to
+    MAX_POLL_INTERVAL mid-track. With push notifications the safety poll is
+    placed just after the expected end to catch a lost notification.
+    """
+    global expected_track_end
+    fallback = SAFETY_POLL_INTERVAL if push_enabled else UPDATE_INTERVAL
+    if expected_track_end is None:
+        return fallback, "track end unknown"
+    
+    to_boundary = expected_track_end - now
+    if to_boundary <= -BOUNDARY_WINDOW:
+        # Boundary passed without a track change: re-measure on the next tick
+        expected_track_end = None
+        return UPDATE_INTERVAL, "track end overdue"
+    
+    if push_enabled:
+        return min(SAFETY_POLL_INTERVAL, to_boundary + BOUNDARY_WINDOW), "safety poll after track end"
+    if to_boundary > BOUNDARY_WINDOW:
+        return min(MAX_POLL_INTERVAL, max(FAST_POLL_INTERVAL, to_boundary - BOUNDARY_WINDOW)), "mid-track back-off"
+    return FAST_POLL_INTERVAL, "near track boundary"
+
+class PollStats:
+    """Counts snapshot fetches and calls, and reports the hourly saving over fixed polling"""
+
+    def __init__(self):
+        self.window_start = time.monotonic()
+        self.calls = 0
+        self.ticks = 0
+        self.last_fetch = None
+        self.longest_gap = 0.0
+
+    def record(self, calls, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self.last_fetch is not None:
+            self.longest_gap = max(self.longest_gap, now - self.last_fetch)
+        self.last_fetch = now
+        self.calls += calls
+        self.ticks += 1
+
+    def maybe_report(self, now, interval):
+        elapsed = now - self.window_start
+        if elapsed < 3600:
+            return
+        
+        calls_per_hour = self.calls * 3600 / elapsed
+        # Measured from the fetches actually taken, not from the chosen interval
+        stats = {
+            "window_seconds": round(elapsed),
+            "ticks": self.ticks,
+            "fetches_per_hour": round(self.ticks * 3600 / elapsed),
+            "mean_fetch_interval": round(elapsed / self.ticks, 1) if self.ticks else None,
+            "longest_fetch_gap": round(self.longest_gap, 1),
+            "calls_per_hour": round(calls_per_hour),
+            "fixed_poll_calls_per_hour": round(FIXED_POLL_CALLS_PER_HOUR),
+            "calls_saved_per_hour": round(FIXED_POLL_CALLS_PER_HOUR - calls_per_hour),
+            "current_interval": interval,
+            "reported_at": time.time()
+        }
+        print(f"Adaptive polling: {stats['fetches_per_hour']} fetches/hour "
+              f"(mean every {stats['mean_fetch_interval']}s), {stats['calls_per_hour']} calls/hour, "
+              f"{stats['calls_saved_per_hour']} saved vs fixed {UPDATE_INTERVAL}s polling")
+        write_cache_file(POLL_STATS_CACHE, stats)
+        
+        self.window_start = now
+        self.calls = 0
+        self.ticks = 0
+        self.longest_gap = 0.0
+
+class PeriodicTask:
+    """Next-due schedule on the monotonic clock"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_due = time.monotonic()
+
+    def due(self, now):
+        return now >= self.next_due
+
+    def trigger(self, at=None):
+        self.next_due = time.monotonic() if at is None else at
+
 def daemon_loop():
     """Main daemon loop"""
     print("Starting metadata caching daemon...")
     setup_cache_dir()
     
+    # With push notifications the poll is only a safety net; without them keep the fast poll
+    push_enabled = start_notify_listener()
+    now_task = PeriodicTask(SAFETY_POLL_INTERVAL if push_enabled else UPDATE_INTERVAL)
+    heartbeat_task = PeriodicTask(HEARTBEAT_INTERVAL)
+    confirm_pending = False
+    poll_stats = PollStats()
+    
     while True:
         try:
-            # Update current track metadata
-            current_metadata = get_current_metadata()
-            if current_metadata:
-                write_cache_file(NOW_CACHE, current_metadata)
+            if track_change_event.is_set():
+                track_change_event.clear()
+                now_task.trigger()
+                confirm_pending = True
             
-            # Update next tracks (less frequently to avoid overload)
-            if time.time() % 15 < UPDATE_INTERVAL:  # Every 15 seconds
-                next_tracks = get_next_tracks()
-                write_cache_file(NEXT_CACHE, next_tracks)
+            now = time.monotonic()
+            if now_task.due(now):
+                # One Icecast fetch and one metadata fetch feed both caches; the
+                # upcoming queue rides on the same snapshot rather than its own timer
+                snapshot = fetch_snapshot()
+                
+                current_metadata = get_current_metadata(snapshot)
+                if current_metadata:
+                    write_cache_file(NOW_CACHE, current_metadata)
+                write_cache_file(NEXT_CACHE, get_next_tracks(snapshot, current_metadata))
+                calls = 2 + (1 if update_track_boundary() else 0)
+                poll_stats.record(calls, now)
+                
+                interval, reason = choose_poll_interval(time.monotonic(), push_enabled)
+                now_task.trigger(at=now + interval)
+                print(f"Next poll in {interval:.1f}s ({reason})")
+                poll_stats.maybe_report(now, interval)
+                
+                if confirm_pending:
+                    # Icecast picks up the new title slightly after the track starts
+                    now_task.trigger(at=now + CONFIRM_DELAY)
+                    confirm_pending = False
+                
+                # A fresh snapshot also counts as a beat
+                heartbeat_task.trigger()
             
-            time.sleep(UPDATE_INTERVAL)
+            # Readers judge liveness by the heartbeat, so it keeps beating between fetches
+            now = time.monotonic()
+            if heartbeat_task.due(now):
+                write_heartbeat()
+                heartbeat_task.trigger(at=now + HEARTBEAT_INTERVAL)
+            
+            # Sleep until the next task is due or a track change is pushed
+            track_change_event.wait(max(0, min(now_task.next_due, heartbeat_task.next_due) - time.monotonic()))
             
         except KeyboardInterrupt:
             print("Daemon stopped by user")
@@ -439,4 +638,4 @@ def daemon_loop():
             time.sleep(UPDATE_INTERVAL)
 
 if __name__ == "__main__":
-    daemon_loop()
\ No newline at end of file
+    daemon_loop()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback, useMemo } from 'react';
+import React, { useState, useEffect, useCallback, useMemo, useRef } from 'react';
 import axios from 'axios';
 import io from 'socket.io-client';
 import { motion, AnimatePresence } from 'framer-motion';
@@ -32,6 +32,13 @@ interface HistoryItem {
   album?: string;
   audio_url?: string;
   text?: string;
+  seq?: number;
+}
+
+interface HistoryChanges {
+  seq: number;
+  items: HistoryItem[];
+  reset: boolean;
 }
 
 function App() {
@@ -42,6 +49,7 @@ function App() {
   const [loading, setLoading] = useState(true);
   const [trackStartTime, setTrackStartTime] = useState<number>(0);
   const [currentTime, setCurrentTime] = useState<number>(Date.now());
+  const historySeq = useRef<number | null>(null); // seq of the newest history item held
 
   const API_BASE = `${window.location.protocol}//${window.location.hostname}:5055`;
   
@@ -103,15 +111,28 @@ function App() {
     }
   }, [API_BASE]);
 
-  // Fetch history
+  // Fetch history: only what is newer than the newest item held, once there is one
   const fetchHistory = useCallback(async () => {
     try {
+      if (historySeq.current !== null) {
+        const response = await axios.get<HistoryChanges>(`${API_BASE}/api/history?since=${historySeq.current}&limit=20`);
+        const { seq, items, reset } = response.data;
+        historySeq.current = seq;
+        if (reset) {
+          setHistory(items.slice(0, 20));
+        } else if (items.length) {
+          setHistory(prevHistory => [...items, ...prevHistory].slice(0, 20));
+        }
+        return;
+      }
+      
       console.log('Fetching history from:', `${API_BASE}/api/history`);
       const response = await axios.get(`${API_BASE}/api/history`);
       const historyData = response.data.history || response.data; // Support both new and old API format
       console.log('History response length:', historyData.length);
       console.log('First few history items:', historyData.slice(0, 3));
       setHistory(historyData.slice(0, 20)); // Show last 20 items
+      historySeq.current = historyData.length && historyData[0].seq !== undefined ? historyData[0].seq : null;
     } catch (error) {
       console.error('Failed to fetch history:', error);
     }
@@ -191,12 +212,23 @@ function App() {
         return trackInfo;
       });
       
-      fetchHistory(); // Refresh history when track changes
+      fetchHistory(); // Catch up on history (only new items are fetched)
       fetchNextTracks(true); // Refresh upcoming tracks from Liquidsoap
     });
 
     socket.on('history_update', (historyItem: HistoryItem) => {
       console.log('📜 History update received:', historyItem);
+      if (historyItem.seq !== undefined) {
+        // Skip items already fetched; a gap means one was missed, so catch up
+        if (historySeq.current !== null && historyItem.seq <= historySeq.current) {
+          return;
+        }
+        if (historySeq.current !== null && historyItem.seq > historySeq.current + 1) {
+          fetchHistory();
+          return;
+        }
+        historySeq.current = historyItem.seq;
+      }
       setHistory(prevHistory => {
         // Add new item to the beginning of history (most recent first)
         const newHistory = [historyItem, ...prevHistory];
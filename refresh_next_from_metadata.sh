@@ -44,6 +44,8 @@ fetch_meta() {
   echo '[]'
 } | python3 - "$OUT" "${RIDS[@]}" <<'PY'
 import json, os, sys, subprocess, shlex, re
+sys.path.insert(0, "/opt/ai-radio")
+from liquidsoap_metadata import parse_kv
 
 OUT=sys.argv[1]
 rids=sys.argv[2:]
@@ -74,19 +76,7 @@ for rid in rids:
     block = telnet_cmd(f"request.metadata {rid}")
     if not block.strip():
         continue
-    meta={}
-    # lines are like: key="value"
-    for ln in block.splitlines():
-        m=re.match(r'^([^=]+)="(.*)"$', ln.strip())
-        if not m: 
-            continue
-        k,v=m.group(1).strip(), m.group(2)
-        # unescape \u0000 etc.
-        try:
-            v=bytes(v, "utf-8").decode("unicode_escape")
-        except Exception:
-            pass
-        meta[k]=v
+    meta=parse_kv(block)
 
     # build a compact track object
     title   = meta.get("title") or ""
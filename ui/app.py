@@ -3,6 +3,7 @@
 AI Radio Flask Application - Refactored
 Modern, modular architecture with clean separation of concerns
 """
+import signal
 import sys
 sys.path.append('/opt/ai-radio')  # Add parent directory to path
 
@@ -11,7 +12,9 @@ from flask_socketio import SocketIO
 
 from config import config
 from routes import register_routes, register_websocket_handlers
+from routes.websocket import broadcast_history_item
 from services import MetadataService, HistoryService, TTSService
+from services.history import history_buffer
 
 # Initialize Flask application
 app = Flask(__name__)
@@ -29,6 +32,9 @@ tts_service = TTSService()
 register_routes(app)
 register_websocket_handlers(socketio)
 
+# Every new history item goes out to clients as a single-item history_update
+history_buffer.add_listener(lambda item: broadcast_history_item(socketio, item))
+
 # Legacy function imports for backward compatibility with existing Liquidsoap integration
 # These will be gradually migrated to the new service layer
 def push_event(event_data):
@@ -57,6 +63,9 @@ def push_event(event_data):
         })
     
     elif event_data.get('type') == 'dj':
+        # Record the play; its transcript is already stored, so the row links to it on insert
+        history_service.add_track(event_data)
+        
         # Handle DJ commentary events
         socketio.emit('dj_update', {
             'text': event_data.get('text', ''),
@@ -81,6 +90,13 @@ if __name__ == "__main__":
     print(f"🎤 TTS Directory: {config.tts_root}")
     print("🚀 Ready to rock!")
     
+    # Exit cleanly on SIGTERM so the batched history writer flushes at exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # This process owns ai_radio.db: checkpoint, optimize and vacuum it at quiet moments
+    from db_maintenance import MaintenanceScheduler
+    MaintenanceScheduler().start()
+    
     socketio.run(
         app, 
         host=config.HOST, 
@@ -4,6 +4,8 @@ import urllib.parse
 import sys
 sys.path.append('/opt/ai-radio')  # Add parent directory to path
 from database import db_manager, get_history, add_history_entry, create_tts_entry, get_tts_entry_by_filename
+from liquidsoap_metadata import parse_kv
+from metadata_cache import HEARTBEAT_STALE_AFTER, CacheReader
 from datetime import datetime
 from pathlib import Path
 from flask import Flask, jsonify, request, send_from_directory, send_file, abort, Response
@@ -38,6 +40,9 @@ BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
 NOW_JSON   = "/opt/ai-radio/now.json"
 NOW_TXT    = "/opt/ai-radio/nowplaying.txt"
 
+# Daemon now-playing cache, re-parsed only when its version moves
+_now_cache_reader = CacheReader("/opt/ai-radio/cache/now_metadata.json")
+
 TTS_DIR    = "/opt/ai-radio/tts_queue"
 TTS_FALLBACK_DIR = "/opt/ai-radio/tts"
 GEN_SCRIPT = "/opt/ai-radio/gen_dj_clip.sh"
@@ -618,21 +623,11 @@ def synthesize_with_elevenlabs(text, output_path):
 def _ls(cmd: str, timeout: float = 2.5):
     return _ls_lines(cmd, timeout)
 
-_key_val = re.compile(r'^\s*([A-Za-z0-9_./-]+)="?(.*?)"?\s*$')
-
 def _parse_metadata_block(text: str) -> dict:
     """
     Turn Liquidsoap key="val" lines into a dict.
     """
-    out = {}
-    for line in text.splitlines():
-        m = _key_val.match(line)
-        if not m: 
-            continue
-        k, v = m.group(1), m.group(2)
-        # Unescape simple cases: Liquidsoap prints quotes as-is
-        out[k] = v
-    return out
+    return parse_kv(text)
 
 def _ls_request_all() -> list[int]:
     """
@@ -674,7 +669,6 @@ def _metadata_for_rid(rid: str | int):
 def _ls_cmd(cmd: str, timeout: float = 2.5):
     return _ls_lines(cmd, timeout)
 
-_kv_re = re.compile(r'([a-zA-Z0-9_]+)="([^"]*)"')
 
 # Global cache for metadata consistency across endpoints
 _cached_metadata = {"current": None, "next": [], "timestamp": 0}
@@ -713,12 +707,9 @@ def _get_current_track_from_icecast() -> dict | None:
     Returns dict with title/artist or None if failed.
     """
     # Try cached metadata first (most reliable)
-    cache_path = "/opt/ai-radio/cache/now_metadata.json"
     try:
-        if os.path.exists(cache_path):
-            with open(cache_path, 'r') as f:
-                cached_data = json.load(f)
-                
+        cached_data, _ = _now_cache_reader.read()
+        if cached_data:
             # Skip DJ content
             title = cached_data.get("title", "").strip()
             artist = cached_data.get("artist", "").strip()
@@ -766,20 +757,16 @@ def _get_now_playing() -> dict | None:
     import time as time_mod
     
     # ONLY read from daemon cache - never make telnet calls
-    cache_file = "/opt/ai-radio/cache/now_metadata.json"
     try:
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r') as f:
-                cached_data = json.load(f)
-            
-            # Accept cache up to 30 seconds old (daemon updates every 3s)
-            cache_age = time_mod.time() - cached_data.get("cached_at", 0)
-            if cache_age < 30:
-                print(f"DEBUG: Using daemon cached metadata (age: {cache_age:.1f}s)")
-                return cached_data
+        cached_data, heartbeat_age = _now_cache_reader.read()
+        if cached_data:
+            # The file only changes with the track; the daemon heartbeat carries freshness
+            if heartbeat_age is not None and heartbeat_age < HEARTBEAT_STALE_AFTER:
+                print(f"DEBUG: Using daemon cached metadata (heartbeat {heartbeat_age:.1f}s)")
+                return dict(cached_data)
             else:
-                print(f"DEBUG: Cache is too old ({cache_age:.1f}s), daemon may be down")
-                return cached_data  # Still return stale data rather than making telnet calls
+                print(f"DEBUG: Daemon heartbeat is stale ({heartbeat_age}), daemon may be down")
+                return dict(cached_data)  # Still return stale data rather than making telnet calls
         else:
             print("DEBUG: No cache file found, daemon may not be running")
     except Exception as e:
@@ -800,21 +787,7 @@ def _get_now_playing() -> dict | None:
 
 def _parse_kv_block(text: str) -> dict:
     """Parse lines like key="val" into dict; ignores '--- n ---' separators."""
-    out = {}
-    for ln in text.splitlines():
-        ln = ln.strip()
-        if not ln or ln.startswith('---') or ln == 'END':
-            continue
-        if '=' not in ln:
-            continue
-        k, v = ln.split('=', 1)
-        v = v.strip()
-        if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
-            v = v[1:-1]
-        out[k.strip()] = v
-    return out
-
-_key_val_re = re.compile(r'([^=]+)="(.*)"$')
+    return parse_kv(text)
 
 # Simple cache for now playing to avoid repeated slow Liquidsoap calls
 _now_playing_cache = {"data": None, "timestamp": 0}
@@ -826,13 +799,7 @@ def _ls_kv(cmd: str, timeout=2.5) -> dict:
     Run a liquidsoap command that returns key="value" lines (e.g. request.metadata N)
     and parse into a dict. Multiple lines are supported.
     """
-    d = {}
-    for line in _ls_cmd(cmd, timeout=timeout):
-        m = _kv_re.match(line.strip())
-        if m:
-            k, v = m.group(1), m.group(2)
-            d[k] = v
-    return d
+    return parse_kv("\n".join(_ls_cmd(cmd, timeout=timeout)))
 
 def _clean_file(path_or_uri: str) -> str:
     """Normalize LS filename/initial_uri into a filesystem path."""
@@ -896,14 +863,7 @@ def _parse_kv_lines(lines):
     """
     Parse Liquidsoap key="val" lines into a dict.
     """
-    out = {}
-    for ln in lines:
-        # format: key="value"
-        if "=" in ln:
-            k, v = ln.split("=", 1)
-            v = v.strip().strip('"')
-            out[k.strip()] = v
-    return out
+    return parse_kv("\n".join(lines))
 
 def _maybe_record_play(now_dict: dict):
     """
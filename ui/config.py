@@ -26,6 +26,7 @@ class Config:
     # File Paths
     NOW_JSON = ROOT_DIR / "cache" / "now_metadata.json"
     NOW_TXT = ROOT_DIR / "nowplaying.txt"
+    REMAINING_JSON = ROOT_DIR / "cache" / "remaining_time.json"
     NEXT_JSON = ROOT_DIR / "next.json"
     HISTORY_FILE = ROOT_DIR / "play_history.json"
     
@@ -47,6 +48,7 @@ class Config:
     
     # History Settings
     MAX_HISTORY = 300
+    HISTORY_BUFFER_SIZE = 200  # recent events kept in memory for /api/history and deltas
     DEDUP_WINDOW_MS = 60_000
     
     # DJ Generation
@@ -10,59 +10,69 @@ from flask import Blueprint, jsonify, request, send_file, abort
 from urllib.parse import quote, unquote
 
 from config import config
-from services import MetadataService, HistoryService, TTSService
+from services import MetadataService, HistoryService, TTSService, QueueService
+from database import (clean_transcript, get_stats, get_storage_info, get_transcripts, parse_history_cursor,
+                      save_transcript, search as search_database)
+from db_maintenance import read_report as read_maintenance_report
+from library_index import embedded_art, library_index
+from liquidsoap_client import get_client, LiquidsoapError
 from utils.file import safe_json_read, safe_json_write
 
 # Initialize services
 metadata_service = MetadataService()
 history_service = HistoryService() 
 tts_service = TTSService()
+queue_service = QueueService()
 
 api_bp = Blueprint('api', __name__)
 
+# Upper bound on events accepted by one /api/events request
+MAX_EVENT_BATCH = 100
+
+# Upper bound on results returned by one /api/search request
+MAX_SEARCH_LIMIT = 100
+
+def format_tts_title(text):
+    """Display title for a DJ transcript: unquoted and at most 100 characters"""
+    transcript = clean_transcript(text)
+    if len(transcript) > 100:
+        transcript = transcript[:97] + "..."
+    return transcript if transcript else "DJ Commentary"
+
+def is_tts_file(filename):
+    """Whether a queued file is a DJ intro/outro"""
+    return bool(filename) and ("/tts/intro_" in filename or "/tts/outro_" in filename)
+
 def get_tts_transcript(filename):
-    """Get transcript text for a TTS audio file"""
+    """Get transcript text for a TTS audio file (from tts_entries, never the .txt file)"""
     if not filename or not filename.endswith('.mp3'):
         return "DJ Commentary"
-    
-    # Convert audio filename to text filename
-    txt_filename = filename.replace('.mp3', '.txt')
-    
-    try:
-        if os.path.exists(txt_filename):
-            with open(txt_filename, 'r', encoding='utf-8') as f:
-                transcript = f.read().strip()
-                # Clean up the transcript - remove quotes and limit length for display
-                transcript = transcript.strip('"\'').strip()
-                if len(transcript) > 100:
-                    transcript = transcript[:97] + "..."
-                return transcript if transcript else "DJ Commentary"
-        else:
-            return "DJ Commentary"
-    except Exception as e:
-        print(f"Error reading TTS transcript from {txt_filename}: {e}")
-        return "DJ Commentary"
+    audio_filename = os.path.basename(filename)
+    return format_tts_title(get_transcripts([audio_filename]).get(audio_filename))
 
-@api_bp.route("/event")
-def api_event():
+def ingest_event(params):
     """
-    Ingest events from Liquidsoap (announce_song/after_song).
+    Validate one Liquidsoap event and feed it to push_event.
     
-    Supported event types:
-    - song: Track play events
-    - dj: DJ commentary events
-    - metadata_refresh: Metadata update events
+    Args:
+        params: Mapping of event fields (query args or a decoded JSON object)
+        
+    Returns:
+        The event type, or None if the type is unknown
     """
     from app import socketio, push_event  # Import to avoid circular dependency
     
-    ev_type = request.args.get("type", "song")
-    now_ms = int(time.time() * 1000)
+    ev_type = params.get("type", "song")
+    try:
+        now_ms = int(params.get("time") or time.time() * 1000)
+    except (TypeError, ValueError):
+        now_ms = int(time.time() * 1000)
     
     if ev_type == "song":
-        filename = request.args.get("filename", "")
-        title = request.args.get("title", "")[:512]
-        artist = request.args.get("artist", "")[:512]
-        album = request.args.get("album", "")[:512]
+        filename = params.get("filename", "")
+        title = params.get("title", "")[:512]
+        artist = params.get("artist", "")[:512]
+        album = params.get("album", "")[:512]
         
         # Generate artwork URL for history display
         artwork_url = ""
@@ -83,14 +93,19 @@ def api_event():
             "artwork_url": artwork_url,
         }
     elif ev_type == "dj":
-        audio_url = request.args.get("audio_url", "")
+        audio_url = params.get("audio_url", "")
         # Extract filename from audio_url (e.g. "/tts/intro_123.mp3" -> "intro_123.mp3")
         filename = ""
         if audio_url.startswith("/tts/"):
             filename = f"/opt/ai-radio{audio_url}"
         
-        # Get transcript from text file if available
-        transcript = get_tts_transcript(filename) if filename else "DJ Commentary"
+        # Store the transcript first so the play row links to it (see trg_history_link_tts)
+        text = params.get("text", "")[:2000]
+        if filename and text:
+            save_transcript(os.path.basename(filename), text)
+            transcript = format_tts_title(text)
+        else:
+            transcript = get_tts_transcript(filename) if filename else "DJ Commentary"
         
         row = {
             "type": "dj", 
@@ -99,30 +114,85 @@ def api_event():
             "artist": "AI DJ", 
             "album": "DJ Intro",
             "filename": filename,
-            "text": request.args.get("text", "")[:2000],
+            "text": text,
             "audio_url": audio_url,
             "artwork_url": "/static/station-cover.jpg",
         }
     elif ev_type == "metadata_refresh":
         # Handle metadata refresh events from Liquidsoap track changes
-        print(f"DEBUG: Metadata refresh - {request.args.get('artist', 'Unknown')} - {request.args.get('title', 'Unknown')}")
+        print(f"DEBUG: Metadata refresh - {params.get('artist', 'Unknown')} - {params.get('title', 'Unknown')}")
         
         # Emit real-time update to connected clients
         socketio.emit('metadata_update', {
-            'artist': request.args.get("artist", ""),
-            'title': request.args.get("title", ""),
-            'album': request.args.get("album", ""),
+            'artist': params.get("artist", ""),
+            'title': params.get("title", ""),
+            'album': params.get("album", ""),
             'time': now_ms
         })
         
-        return jsonify({"ok": True, "type": "metadata_refresh"})
+        return ev_type
     else:
-        return jsonify({"ok": False, "error": "unknown type"}), 400
+        return None
     
     # Use the database system via push_event
     push_event(row)
+    return ev_type
+
+@api_bp.route("/event")
+def api_event():
+    """
+    Ingest events from Liquidsoap (announce_song/after_song).
+    
+    Supported event types:
+    - song: Track play events
+    - dj: DJ commentary events
+    - metadata_refresh: Metadata update events
+    """
+    ev_type = ingest_event(request.args)
+    
+    if ev_type is None:
+        return jsonify({"ok": False, "error": "unknown type"}), 400
+    if ev_type == "metadata_refresh":
+        return jsonify({"ok": True, "type": "metadata_refresh"})
     return jsonify({"ok": True})
 
+@api_bp.route("/events", methods=["POST"])
+def api_events():
+    """
+    Batched, fire-and-forget event ingest for Liquidsoap.
+    
+    Accepts a JSON object or an array of objects with the same fields as
+    /api/event, so radio.liq can post from http.post without spawning
+    curl/wget processes.
+    """
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        return jsonify({"ok": False, "error": "expected a JSON object or array"}), 400
+    if len(payload) > MAX_EVENT_BATCH:
+        return jsonify({"ok": False, "error": f"batch larger than {MAX_EVENT_BATCH} events"}), 413
+    
+    accepted = 0
+    rejected = 0
+    for event in payload:
+        if not isinstance(event, dict):
+            rejected += 1
+            continue
+        
+        # Liquidsoap may send numbers or nulls; /api/event works on strings
+        params = {key: "" if value is None else str(value) for key, value in event.items()}
+        try:
+            if ingest_event(params) is None:
+                rejected += 1
+            else:
+                accepted += 1
+        except Exception as e:
+            print(f"Error ingesting event {params.get('type', 'song')}: {e}")
+            rejected += 1
+    
+    return jsonify({"ok": rejected == 0, "accepted": accepted, "rejected": rejected})
+
 @api_bp.route("/cover", methods=["GET"])
 def api_cover():
     """
@@ -182,7 +252,7 @@ def api_cover():
 @api_bp.route("/cover/online", methods=["GET"])  
 def api_cover_online():
     """
-    Fetch album art for tracks by searching music library files.
+    Fetch album art for tracks from music library files found in the library index.
     Falls back to default cover if no embedded art found.
     """
     artist = request.args.get("artist", "").strip()
@@ -192,86 +262,28 @@ def api_cover_online():
         return send_file("/opt/ai-radio/ui/static/station-cover.jpg"), 200
     
     try:
-        # Use the same search mechanism as duration lookup to find audio files
         from mutagen import File as MutaFile
-        import subprocess
-        import os
-        
-        # Search for files matching the artist and optionally album
-        music_dirs = ["/mnt/music/Music", "/mnt/music/media"]
-        
-        # Sanitize search terms
-        import re
-        clean_artist = re.sub(r'[^\w\s\-\.]', '', artist).strip()
-        clean_album = re.sub(r'[^\w\s\-\.]', '', album).strip() if album else ""
-        
-        # Generate search patterns
-        patterns = []
-        if clean_album:
-            patterns.extend([
-                f"*{clean_artist}*{clean_album}*",
-                f"*{clean_album}*{clean_artist}*",
-                f"*{clean_album}*"
-            ])
-        patterns.extend([
-            f"*{clean_artist}*",
-        ])
-        
-        # Search in music directories
-        for music_dir in music_dirs:
-            if not os.path.exists(music_dir):
-                continue
+        
+        # Only files the index saw with embedded art, best match first
+        for file_path in library_index.find_art(artist, album):
+            try:
+                audio_file = MutaFile(file_path)
+                art_data = embedded_art(audio_file) if audio_file else None
                 
-            for pattern in patterns:
-                try:
-                    cmd = ["find", music_dir, "-type", "f", 
-                          "(", "-iname", "*.mp3", "-o", "-iname", "*.m4a", "-o", 
-                          "-iname", "*.flac", "-o", "-iname", "*.wav", ")",
-                          "-ipath", f"*{pattern}*"]
+                if art_data:
+                    # Determine content type
+                    content_type = "image/jpeg"  # Default
+                    if art_data.startswith(b'\x89PNG'):
+                        content_type = "image/png"
+                    elif art_data.startswith(b'GIF'):
+                        content_type = "image/gif"
+                    
+                    from io import BytesIO
+                    return send_file(BytesIO(art_data), mimetype=content_type)
                     
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-                    if result.returncode == 0 and result.stdout.strip():
-                        files = result.stdout.strip().split('\n')
-                        
-                        # Try to extract album art from first matching file
-                        for file_path in files[:3]:
-                            file_path = file_path.strip()
-                            if file_path and os.path.exists(file_path):
-                                try:
-                                    audio_file = MutaFile(file_path)
-                                    if not audio_file:
-                                        continue
-                                    
-                                    # Look for album art in various formats
-                                    art_data = None
-                                    if hasattr(audio_file, 'pictures') and audio_file.pictures:
-                                        # FLAC
-                                        art_data = audio_file.pictures[0].data
-                                    elif 'APIC:' in audio_file:
-                                        # MP3 ID3v2
-                                        art_data = audio_file['APIC:'].data
-                                    elif 'covr' in audio_file:
-                                        # MP4/M4A
-                                        art_data = audio_file['covr'][0]
-                                    
-                                    if art_data:
-                                        # Determine content type
-                                        content_type = "image/jpeg"  # Default
-                                        if art_data.startswith(b'\x89PNG'):
-                                            content_type = "image/png"
-                                        elif art_data.startswith(b'GIF'):
-                                            content_type = "image/gif"
-                                        
-                                        print(f"Found album art for {artist} - {album} in: {file_path}")
-                                        from io import BytesIO
-                                        return send_file(BytesIO(art_data), mimetype=content_type)
-                                        
-                                except Exception as e:
-                                    print(f"Error reading album art from {file_path}: {e}")
-                                    continue
-                                    
-                except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-                    continue
+            except Exception as e:
+                print(f"Error reading album art from {file_path}: {e}")
+                continue
     
     except Exception as e:
         print(f"Error in album art search: {e}")
@@ -353,59 +365,11 @@ def api_now():
     try:
         current_track = metadata_service.get_current_track()
         
-        # Add time remaining from telnet (cached to avoid too many calls)
-        try:
-            import time
-            import subprocess
-            
-            # Only fetch remaining time every 5 seconds to avoid telnet spam
-            current_time = time.time()
-            cache_key = 'remaining_time_cache'
-            
-            # Simple module-level cache (you could use Redis/etc for production)
-            if not hasattr(api_now, '_cache'):
-                api_now._cache = {}
-            
-            if (cache_key not in api_now._cache or 
-                current_time - api_now._cache[cache_key]['timestamp'] > 5):
-                
-                # Get remaining time from Liquidsoap telnet
-                result = subprocess.run(
-                    ['bash', '-c', 'echo -e "output.icecast.remaining\\nquit" | nc localhost 1234'],
-                    capture_output=True, text=True, timeout=2
-                )
-                
-                if result.returncode == 0:
-                    lines = result.stdout.strip().split('\n')
-                    for line in lines:
-                        if line.replace('.', '').replace('-', '').isdigit():
-                            remaining_seconds = float(line)
-                            api_now._cache[cache_key] = {
-                                'remaining': remaining_seconds,
-                                'timestamp': current_time
-                            }
-                            break
-                    else:
-                        # Fallback calculation if telnet fails
-                        if current_track.get('duration') and current_track.get('track_started_at'):
-                            elapsed = current_time - current_track['track_started_at']
-                            remaining_seconds = max(0, current_track['duration'] - elapsed)
-                        else:
-                            remaining_seconds = 0
-                        
-                        api_now._cache[cache_key] = {
-                            'remaining': remaining_seconds,
-                            'timestamp': current_time
-                        }
-            
-            current_track['time_remaining'] = api_now._cache[cache_key]['remaining']
-            
-        except Exception as e:
-            print(f"Error getting remaining time: {e}")
-            # Fallback calculation
-            current_time = time.time()
+        # time_remaining comes from the daemon's remaining-time cache; fall back to
+        # duration and start time when the daemon has not measured this track
+        if current_track.get('time_remaining') is None:
             if current_track.get('duration') and current_track.get('track_started_at'):
-                elapsed = current_time - current_track['track_started_at']
+                elapsed = time.time() - current_track['track_started_at']
                 current_track['time_remaining'] = max(0, current_track['duration'] - elapsed)
             else:
                 current_track['time_remaining'] = 0
@@ -416,12 +380,76 @@ def api_now():
 
 @api_bp.route("/history", methods=["GET"])
 def api_history():
-    """Get play history"""
+    """
+    Get play history, newest first.
+    
+    Pass the X-Next-Cursor header of one page as ?before= to fetch the next
+    (older) page; the header is absent on the last page.
+    
+    Pass the "seq" of the newest item held as ?since= to get only newer items,
+    as {"seq", "items", "reset"}; with "reset" true the client's seq was
+    unknown and items is the latest page, to be used in place of its list.
+    """
     try:
         limit = request.args.get('limit', 50, type=int)
-        history = history_service.get_history(limit=limit)
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                return jsonify(history_service.get_history_since(int(since), limit=limit))
+            except ValueError:
+                return jsonify({"error": "Invalid since"}), 400
+        
+        before = request.args.get('before')
+        if before and parse_history_cursor(before) is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+        
+        history = history_service.get_history(limit=limit, before=before)
         # Return direct array for frontend compatibility (not wrapped in object)
-        return jsonify(history)
+        response = jsonify(history)
+        if history and len(history) >= limit and history[-1].get("cursor"):
+            response.headers['X-Next-Cursor'] = history[-1]["cursor"]
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route("/search", methods=["GET"])
+def api_search():
+    """
+    Full-text search over what the DJ said and what played, best match first.
+    
+    ?q= words to find (the last one matches as a prefix), ?type=dj or song to
+    search one side only, ?limit= and ?offset= to page. Snippets are
+    HTML-escaped with the matches wrapped in <mark>.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Missing q"}), 400
+        kind = request.args.get('type') or None
+        if kind not in (None, 'dj', 'song'):
+            return jsonify({"error": "type must be dj or song"}), 400
+        limit = max(1, min(request.args.get('limit', 20, type=int), MAX_SEARCH_LIMIT))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        
+        results = search_database(query, limit=limit, offset=offset, kind=kind)
+        return jsonify({
+            "query": query,
+            "results": results,
+            "offset": offset,
+            "next_offset": offset + limit if len(results) >= limit else None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route("/db/status", methods=["GET"])
+def api_db_status():
+    """Database row counts, file/WAL sizes and the last maintenance run's step timings"""
+    try:
+        return jsonify({
+            "stats": get_stats(),
+            "storage": get_storage_info(),
+            "maintenance": read_maintenance_report()
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -429,25 +457,11 @@ def api_history():
 def api_next():
     """Get upcoming tracks"""
     try:
-        # Refresh next.json if the refresh parameter is provided OR automatically every 30 seconds
+        # Refresh next.json if the refresh parameter is provided OR automatically every 30 seconds.
+        # The refresh runs in the background so this request never waits on Liquidsoap.
         refresh = request.args.get('refresh', 'false').lower() == 'true'
-        
-        # Auto-refresh logic: check if we should automatically refresh based on time
-        cache_file = Path("/opt/ai-radio/next.json")
-        auto_refresh = False
-        if cache_file.exists():
-            cache_age = time.time() - cache_file.stat().st_mtime
-            auto_refresh = cache_age > 30  # Auto-refresh if cache is older than 30 seconds
-        else:
-            auto_refresh = True  # Refresh if cache doesn't exist
-            
-        if refresh or auto_refresh:
-            try:
-                result = subprocess.run(['/opt/ai-radio/refresh_next_from_requests.sh'], 
-                                       capture_output=True, text=True, timeout=10)
-                print(f"Next track refresh result: {result.returncode} (auto={auto_refresh})")
-            except Exception as e:
-                print(f"Failed to refresh next tracks: {e}")
+        if refresh or queue_service.is_stale(max_age=30):
+            queue_service.refresh_in_background()
         
         next_track_data = metadata_service.get_next_track()
         next_tracks = []
@@ -458,14 +472,17 @@ def api_next():
         elif isinstance(next_track_data, list):
             next_tracks = next_track_data
         
+        # All queued TTS transcripts in one query
+        transcripts = get_transcripts([os.path.basename(track.get("filename", ""))
+                                       for track in next_tracks if is_tts_file(track.get("filename", ""))])
+        
         # Clean up and ensure artwork URLs are present
         for track in next_tracks:
             filename = track.get("filename", "")
             
             # Handle TTS files specially
-            if filename and ("/tts/intro_" in filename or "/tts/outro_" in filename):
-                transcript = get_tts_transcript(filename)
-                track["title"] = transcript
+            if is_tts_file(filename):
+                track["title"] = format_tts_title(transcripts.get(os.path.basename(filename)))
                 track["artist"] = "AI DJ"
                 track["album"] = "DJ Intro"
                 track["type"] = "dj"
@@ -500,15 +517,11 @@ def api_next():
 def api_skip():
     """Skip current track"""
     try:
-        # Send skip command to Liquidsoap via telnet
-        import telnetlib
+        # Send skip command to Liquidsoap over the shared telnet connection
         try:
-            tn = telnetlib.Telnet('127.0.0.1', 1234, timeout=5)
-            tn.write(b'skip\n')
-            response = tn.read_until(b'END', timeout=5)
-            tn.close()
+            get_client(config.TELNET_HOST, config.TELNET_PORT).command("skip", timeout=5)
             return jsonify({"ok": True, "message": "Track skipped"})
-        except Exception as telnet_error:
+        except LiquidsoapError as telnet_error:
             return jsonify({"ok": False, "error": f"Failed to connect to Liquidsoap: {str(telnet_error)}"}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -63,15 +63,21 @@ def register_websocket_handlers(socketio):
             emit('error', {'message': f'Failed to get current track: {e}'})
     
     @socketio.on('request_history')
-    def handle_history_request():
-        """Handle request for play history"""
+    def handle_history_request(data=None):
+        """Handle request for play history; {'since': seq} asks for newer items only"""
         try:
             from services import HistoryService
             history_service = HistoryService()
             
             limit = 20  # Default limit
+            since = data.get('since') if isinstance(data, dict) else None
+            if isinstance(since, int):
+                changes = history_service.get_history_since(since, limit=limit)
+                emit('history_update', {'history': changes['items'], 'seq': changes['seq'],
+                                        'reset': changes['reset']})
+                return
             history = history_service.get_history(limit=limit)
-            emit('history_update', {'history': history})
+            emit('history_update', {'history': history, 'seq': history_service.buffer.seq})
         except Exception as e:
             print(f"Error handling history request: {e}")
             emit('error', {'message': f'Failed to get history: {e}'})
@@ -89,6 +95,19 @@ def broadcast_track_change(socketio, track_info):
     except Exception as e:
         print(f"Error broadcasting track change: {e}")
 
+def broadcast_history_item(socketio, item):
+    """
+    Broadcast one new history item to all connected clients
+    
+    Args:
+        socketio: SocketIO instance
+        item: History item, with its "seq"
+    """
+    try:
+        socketio.emit('history_update', item)
+    except Exception as e:
+        print(f"Error broadcasting history item: {e}")
+
 def broadcast_metadata_update(socketio, metadata):
     """
     Broadcast metadata update to all connected clients
@@ -4,5 +4,6 @@ Service layer for AI Radio business logic
 from .metadata import MetadataService
 from .history import HistoryService
 from .tts import TTSService
+from .queue import QueueService
 
-__all__ = ['MetadataService', 'HistoryService', 'TTSService']
\ No newline at end of file
+__all__ = ['MetadataService', 'HistoryService', 'TTSService', 'QueueService']
\ No newline at end of file
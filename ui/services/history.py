@@ -4,18 +4,120 @@ History service for managing play history
 import sys
 sys.path.append('/opt/ai-radio')  # Add parent directory to path
 
+import os
+import threading
 import time
-from typing import Dict, List
+from collections import deque
+from typing import Callable, Dict, List, Optional
 
 from config import config
-from database import add_history_entry, get_history as get_db_history
+from database import READ_FLUSH_TIMEOUT, add_history_entry, db_manager, get_history as get_db_history
+from database import dj_audio_url, get_transcripts, make_history_cursor, parse_history_cursor
+
+class HistoryBuffer:
+    """
+    The most recent history events, shared by every HistoryService in the process.
+    
+    Each event gets a sequence number one above the previous one, so clients
+    can ask for just what is newer than the last event they saw. Numbering
+    starts at the startup time in milliseconds, so a restarted process never
+    hands out a number a client already holds for a different event.
+    """
+    
+    def __init__(self, size: int):
+        self._items = deque(maxlen=size)  # newest first
+        self._lock = threading.Lock()
+        self._seq = int(time.time() * 1000)
+        self._loaded = False
+        self._listeners = []
+    
+    @property
+    def size(self) -> int:
+        return self._items.maxlen
+    
+    @property
+    def seq(self) -> int:
+        """Sequence number of the newest event"""
+        return self._seq
+    
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+    
+    def load(self, items: List[Dict]):
+        """Seed an empty buffer with events read from the database, newest first"""
+        with self._lock:
+            if self._loaded:
+                return
+            for item in reversed(items[:self.size]):
+                self._seq += 1
+                item["seq"] = self._seq
+                self._items.appendleft(item)
+            self._loaded = True
+    
+    def append(self, item: Dict) -> Dict:
+        """Add the newest event, number it and tell the listeners"""
+        with self._lock:
+            self._seq += 1
+            item["seq"] = self._seq
+            self._items.appendleft(item)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(dict(item))
+            except Exception as e:
+                print(f"Error in history listener: {e}")
+        return item
+    
+    def latest(self, limit: int) -> List[Dict]:
+        """Up to limit events, newest first"""
+        with self._lock:
+            return [dict(item) for item in list(self._items)[:limit]]
+    
+    def since(self, seq: int) -> Optional[List[Dict]]:
+        """
+        Events newer than seq, newest first.
+        
+        Returns None when seq is not one this buffer can continue from: older
+        than its oldest event, or from another process run.
+        """
+        with self._lock:
+            oldest = self._items[-1]["seq"] if self._items else self._seq + 1
+            if seq < oldest - 1 or seq > self._seq:
+                return None
+            return [dict(item) for item in self._items if item["seq"] > seq]
+    
+    def set_cursor(self, item: Dict, cursor: str):
+        """Give a buffered event its paging cursor once its row is committed"""
+        with self._lock:
+            item["cursor"] = cursor
+    
+    def has_pending(self) -> bool:
+        """Whether any buffered event is still waiting for its database row"""
+        with self._lock:
+            return any(not item.get("cursor") for item in self._items)
+    
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """Call listener with every new event (from the thread that recorded it)"""
+        with self._lock:
+            self._listeners.append(listener)
+    
+    def clear(self):
+        """Drop every event; any seq handed out before is then answered with a reset"""
+        with self._lock:
+            self._items.clear()
+            self._seq += 1
+
+# Process-wide: routes and WebSocket handlers create their own HistoryService
+history_buffer = HistoryBuffer(config.HISTORY_BUFFER_SIZE)
 
 class HistoryService:
     """Service for managing track play history"""
     
-    def __init__(self):
+    def __init__(self, buffer: HistoryBuffer = None):
         self._last_event_key = None
         self._last_event_time = 0
+        self.buffer = buffer or history_buffer
     
     def add_track(self, track_data: Dict) -> bool:
         """
@@ -47,8 +149,14 @@ class HistoryService:
             current_time - self._last_event_time < config.DEDUP_WINDOW_MS):
             return False
         
-        # Save to database immediately
-        success = self._save_to_database(event)
+        # Seed the buffer before queueing the row, or the seed would already include it
+        self._ensure_loaded()
+        
+        # Hand off to the batched database writer; the buffered copy gets its
+        # paging cursor once the row is committed
+        item = self._format_event(event)
+        success = self._save_to_database(
+            event, on_commit=lambda row_id: self.buffer.set_cursor(item, make_history_cursor(item["time"], row_id)))
         if not success:
             return False
         
@@ -56,61 +164,56 @@ class HistoryService:
         self._last_event_key = event_key
         self._last_event_time = current_time
         
-        
+        self.buffer.append(item)
         return True
     
-    def get_history(self, limit: int = None) -> List[Dict]:
+    def get_history(self, limit: int = None, before: Optional[str] = None) -> List[Dict]:
         """
         Get recent play history.
         
         Args:
             limit: Maximum number of entries to return
+            before: Cursor from a previous page; only older entries are returned
             
         Returns:
-            List of track events, most recent first
+            List of track events, most recent first, each with its own "cursor"
         """
+        limit = limit or 100
         try:
-            # Get from database
-            db_history = get_db_history(limit=limit or 100)
+            # The first page comes from the in-memory buffer
+            if before is None and limit <= self.buffer.size and self._ensure_loaded():
+                self._settle()
+                return self.buffer.latest(limit)
             
-            # Convert database format to expected format
-            history_list = []
-            for row in db_history:
-                item = {
-                    "type": row.get("type", "song"),
-                    "time": row.get("timestamp", 0),
-                    "title": row.get("title", ""),
-                    "artist": row.get("artist", ""),
-                    "album": row.get("album", ""),
-                    "filename": row.get("filename", ""),
-                    "artwork_url": row.get("artwork_url", ""),
-                    "audio_url": row.get("audio_url", ""),
-                    "text": row.get("text", ""),  # Include transcript text for DJ entries
-                    "created_at": row.get("created_at", "")
-                }
-                
-                # For DJ entries without text, try to read from txt file
-                if item["type"] == "dj" and not item["text"]:
-                    filename = row.get("filename", "")
-                    if filename and filename.endswith('.mp3'):
-                        txt_file = filename.replace('.mp3', '.txt')
-                        try:
-                            if __import__('os').path.exists(txt_file):
-                                with open(txt_file, 'r', encoding='utf-8') as f:
-                                    content = f.read().strip()
-                                    if content:
-                                        item["text"] = content.strip('"\'').strip()
-                        except Exception as e:
-                            print(f"Error reading txt file {txt_file}: {e}")
-                
-                history_list.append(item)
-            
-            return history_list
+            # Get from database
+            position = parse_history_cursor(before) if before else None
+            return [self._format_row(row) for row in get_db_history(limit=limit, before=position)]
             
         except Exception as e:
             print(f"Error: Failed to get history from database: {e}")
             return []
     
+    def get_history_since(self, seq: int, limit: int = None) -> Dict:
+        """
+        Get the events recorded after sequence number seq.
+        
+        Args:
+            seq: The "seq" of the newest event the client has
+            limit: Maximum number of entries when the client has to start over
+            
+        Returns:
+            {"seq": newest sequence number, "items": newer events, most recent
+            first, "reset": True if seq was unknown and items is instead the
+            latest page, which replaces whatever the client holds}
+        """
+        self._ensure_loaded()
+        self._settle()
+        items = self.buffer.since(seq)
+        reset = items is None
+        if reset:
+            items = self.get_history(limit=min(limit or 100, self.buffer.size))
+        return {"seq": self.buffer.seq, "items": items, "reset": reset}
+    
     def clear_history(self) -> bool:
         """
         Clear all history.
@@ -119,12 +222,12 @@ class HistoryService:
             True if successful
         """
         try:
-            from database import DatabaseManager
-            db_manager = DatabaseManager()
+            from database import db_manager
             with db_manager.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM play_history")
                 conn.commit()
+            self.buffer.clear()
             return True
         except Exception as e:
             print(f"Error clearing history: {e}")
@@ -146,8 +249,65 @@ class HistoryService:
         
         return f"t|{title}|{artist}|{album}"
     
-    def _save_to_database(self, event: Dict) -> bool:
-        """Save single event to database"""
+    def _ensure_loaded(self) -> bool:
+        """Seed the shared buffer from the database the first time it is used"""
+        if self.buffer.loaded:
+            return True
+        try:
+            self.buffer.load([self._format_row(row) for row in get_db_history(limit=self.buffer.size)])
+            return True
+        except Exception as e:
+            print(f"Error: Failed to load history buffer: {e}")
+            return False
+    
+    def _settle(self):
+        """Wait briefly for buffered events still queued for the writer, so they have their cursor"""
+        if self.buffer.has_pending():
+            db_manager.writer.flush(timeout=READ_FLUSH_TIMEOUT)
+    
+    @staticmethod
+    def _format_row(row: Dict) -> Dict:
+        """Convert a database row to the API event format"""
+        return {
+            "type": row.get("type", "song"),
+            "time": row.get("timestamp", 0),
+            "title": row.get("title", ""),
+            "artist": row.get("artist", ""),
+            "album": row.get("album", ""),
+            "filename": row.get("filename", ""),
+            "artwork_url": row.get("artwork_url", ""),
+            "audio_url": row.get("audio_url", ""),
+            "text": row.get("text", ""),  # Include transcript text for DJ entries
+            "created_at": row.get("created_at", ""),
+            "cursor": make_history_cursor(row.get("timestamp", 0), row.get("id", 0))
+        }
+    
+    @staticmethod
+    def _format_event(event: Dict) -> Dict:
+        """An event in the same format as _format_row gives its database row"""
+        audio_url = text = ""
+        if event["type"] == "dj":
+            # As get_history does: the clip URL from the path, the text from the linked TTS entry
+            audio_url = dj_audio_url(event["filename"])
+            if event["filename"].endswith(".mp3"):
+                audio_filename = os.path.basename(event["filename"])
+                text = get_transcripts([audio_filename]).get(audio_filename, "")
+        return {
+            "type": event["type"],
+            "time": event["time"],
+            "title": event["title"],
+            "artist": event["artist"],
+            "album": event["album"],
+            "filename": event["filename"],
+            "artwork_url": event["artwork_url"],
+            "audio_url": audio_url,
+            "text": text,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+            "cursor": None  # set once the row is committed
+        }
+    
+    def _save_to_database(self, event: Dict, on_commit: Callable[[int], None] = None) -> bool:
+        """Queue single event for the background database writer"""
         try:
             add_history_entry(
                 entry_type=event.get("type", "song"),
@@ -156,7 +316,9 @@ class HistoryService:
                 artist=event.get("artist", ""),
                 album=event.get("album", ""),
                 filename=event.get("filename", ""),
-                artwork_url=event.get("artwork_url", "")
+                artwork_url=event.get("artwork_url", ""),
+                sync=False,
+                on_commit=on_commit
             )
             return True
         except Exception as e:
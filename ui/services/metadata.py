@@ -1,25 +1,153 @@
 """
 Metadata service for handling current track and history information
 """
+import sys
+sys.path.append('/opt/ai-radio')  # Add parent directory to path
+
 import json
-import socket
+import threading
 import time
 import os
+from collections import OrderedDict
 from pathlib import Path
-from contextlib import closing
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from config import config
+from database import lookup_track_info, normalize_key
+from library_index import library_index
+from liquidsoap_client import get_client
+from liquidsoap_metadata import parse_sections
+from metadata_cache import HEARTBEAT_NAME, CacheReader, read_heartbeat
 from utils.file import safe_json_read, locked_json_read
 from utils.text import parse_kv_text
 
+# Within this many seconds of the last check the source files are not looked at again
+CURRENT_TRACK_CHECK_INTERVAL = 1.0
+
+DURATION_MEMO_SIZE = 4096  # tracks whose duration is remembered
+DURATION_NEGATIVE_TTL = 600  # seconds before a track with no known duration is looked up again
+
+class DurationMemo:
+    """Bounded LRU of track durations; misses are remembered for a while too"""
+    
+    def __init__(self, size: int = DURATION_MEMO_SIZE, negative_ttl: float = DURATION_NEGATIVE_TTL):
+        self.size = size
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # key -> (duration or None, expires_at or None)
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Tuple[bool, Optional[float]]:
+        """(True, duration) for a remembered answer, which may be None; (False, None) otherwise"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            duration, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, duration
+    
+    def put(self, key: Tuple, duration: Optional[float]):
+        expires_at = time.monotonic() + self.negative_ttl if duration is None else None
+        with self._lock:
+            self._entries[key] = (duration, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+duration_memo = DurationMemo()
+
+def read_audio_duration(path: str) -> Optional[float]:
+    """Duration of one audio file from its tags, or None"""
+    try:
+        from mutagen import File as MutaFile
+    except ImportError:
+        return None
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        audio = MutaFile(path)
+        if audio and audio.info and getattr(audio.info, 'length', 0) > 0:
+            return float(audio.info.length)
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+    return None
+
+class CurrentTrackCache:
+    """
+    Current track metadata shared by every MetadataService in the process.
+    
+    The value is rebuilt only when its sources change (see
+    MetadataService._source_key) or its time-to-live runs out. One caller at a
+    time checks and rebuilds; callers arriving meanwhile wait and get the same
+    result, so concurrent requests cost one read.
+    """
+    
+    def __init__(self, check_interval: float = CURRENT_TRACK_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.builds = 0
+        self._lock = threading.Lock()
+        self._scope = None
+        self._key = None
+        self._value = None
+        self._checked_at = 0.0
+        self._expires_at = None
+    
+    def get(self, scope: Any, key: Callable[[], Any], build: Callable[[], Tuple[Any, Optional[float]]]) -> Any:
+        """
+        Return the cached value, rebuilding it if needed.
+        
+        Args:
+            scope: Identifies the sources (their paths); a new scope is always checked
+            key: Returns the sources' current versions
+            build: Returns (value, ttl); ttl is None when only a source change
+                invalidates the value
+        """
+        with self._lock:
+            now = time.monotonic()
+            fresh = (self._value is not None and scope == self._scope
+                     and (self._expires_at is None or now < self._expires_at))
+            if fresh and now - self._checked_at < self.check_interval:
+                return self._value
+            
+            current_key = key()
+            if not fresh or current_key != self._key:
+                self._value, ttl = build()
+                self._scope = scope
+                self._key = current_key
+                self._expires_at = now + ttl if ttl else None
+                self.builds += 1
+            self._checked_at = now
+            return self._value
+    
+    def clear(self):
+        with self._lock:
+            self._value = None
+
+# Process-wide: app.py, the API routes and the WebSocket handlers each create a MetadataService
+current_track_cache = CurrentTrackCache()
+
+def _mtime(path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError, ValueError):
+        return None
+
 class MetadataService:
     """Service for retrieving and managing track metadata"""
     
-    def __init__(self):
+    def __init__(self, cache: CurrentTrackCache = None):
         self._last_telnet_time = 0
         self._telnet_cache = {}
         self._telnet_cache_ttl = 5  # Cache for 5 seconds
+        self._now_reader = None
+        self._cache = cache or current_track_cache
     
     def get_current_track(self) -> Dict:
         """
@@ -27,36 +155,53 @@ class MetadataService:
         
         Priority: JSON file -> text file -> telnet -> defaults
         
+        The merged result is shared process-wide and rebuilt only when a source
+        file changes; the remaining time is extrapolated on every call.
+        
         Returns:
             Dictionary with track metadata
         """
+        scope = (str(config.NOW_JSON), str(config.NOW_TXT), str(config.REMAINING_JSON))
+        track, remaining = self._cache.get(scope, self._source_key, self._build_current_track)
+        
+        data = dict(track)
+        data.setdefault("timestamp", int(time.time()))
+        
+        # Remaining time and duration maintained by the metadata daemon
+        self._apply_remaining_time(data, remaining)
+        return data
+    
+    def _source_key(self) -> Tuple:
+        """
+        Versions of everything get_current_track reads: each file's mtime, plus
+        the daemon's version for its cache files (mtimes can be coarse)
+        """
+        heartbeat = read_heartbeat(os.path.join(os.path.dirname(str(config.NOW_JSON)), HEARTBEAT_NAME)) or {}
+        versions = heartbeat.get("versions", {})
+        now_json, remaining_json = str(config.NOW_JSON), str(config.REMAINING_JSON)
+        return (versions.get(os.path.basename(now_json)), _mtime(now_json),
+                versions.get(os.path.basename(remaining_json)), _mtime(remaining_json),
+                _mtime(config.NOW_TXT))
+    
+    def _build_current_track(self) -> Tuple[Tuple[Dict, Dict], Optional[float]]:
+        """Read and merge the sources; returns ((track, remaining_time), ttl)"""
         data = {}
+        ttl = None
         
-        # Primary source: JSON metadata file
-        if config.NOW_JSON.exists():
-            json_data = safe_json_read(config.NOW_JSON, {})
-            if isinstance(json_data, dict):
-                data.update(json_data)
+        # Primary source: JSON metadata file (re-parsed only when its version moves)
+        json_data = self._read_now_json()
+        if isinstance(json_data, dict):
+            data.update(json_data)
         
         # Fallback 1: Text file (key=value or "Artist - Title")
         if config.NOW_TXT.exists() and not (data.get("title") and data.get("artist")):
             data.update(self._read_text_metadata())
         
-        # Fallback 2: Liquidsoap telnet (cached)
+        # Fallback 2: Liquidsoap telnet (cached); no file tells us when it changes
         if not data.get("title"):
             telnet_data = self._get_telnet_metadata()
             data.update(telnet_data)
-        
-        # Apply defaults
-        data.setdefault("title", "Unknown title")
-        data.setdefault("artist", "Unknown artist") 
-        data.setdefault("album", "")
-        data.setdefault("artwork_url", "")
-        data.setdefault("filename", "")
-        
-        # Add frontend compatibility fields
-        data.setdefault("type", "song")
-        data.setdefault("timestamp", int(time.time()))
+            ttl = self._telnet_cache_ttl
         
         # Add track timing if available (from started_at field)
         if "started_at" in data:
@@ -65,14 +210,67 @@ class MetadataService:
             except (ValueError, TypeError):
                 pass
         
-        # Try to get actual duration from audio file
+        remaining = safe_json_read(config.REMAINING_JSON, {})
+        if not isinstance(remaining, dict):
+            remaining = {}
+        
+        # Duration measured by the metadata daemon, else from the audio file
+        # (only for a real track, before the placeholders below are filled in)
+        self._apply_remaining_time(data, remaining)
+        data.pop("time_remaining", None)  # extrapolated per call
         if not data.get("duration") and data.get("title") and data.get("artist"):
-            duration = self._get_track_duration(data["title"], data["artist"], data.get("album"))
+            duration = self._get_track_duration(data["title"], data["artist"], data.get("album"),
+                                                data.get("filename"))
             if duration:
                 data["duration"] = duration
         
+        # Apply defaults
+        data.setdefault("title", "Unknown title")
+        data.setdefault("artist", "Unknown artist") 
+        data.setdefault("album", "")
+        data.setdefault("artwork_url", "")
+        data.setdefault("filename", "")
+        
+        # Add frontend compatibility fields
+        data.setdefault("type", "song")
+        return (data, remaining), ttl
+    
+    def _read_now_json(self) -> Dict:
+        """Read the daemon's now-playing cache through a version-aware reader"""
+        path = str(config.NOW_JSON)
+        if self._now_reader is None or self._now_reader.filepath != path:
+            self._now_reader = CacheReader(path)
+        data, _ = self._now_reader.read(default={})
         return data
     
+    def _apply_remaining_time(self, data: Dict, remaining: Dict = None):
+        """
+        Add duration and time_remaining from the daemon's remaining_time.json.
+        
+        The daemon measures output.icecast.remaining once per track, so the
+        value is extrapolated here without any telnet call.
+        
+        Args:
+            data: Track metadata to update
+            remaining: The file's parsed content, if already read
+        """
+        if remaining is None:
+            remaining = safe_json_read(config.REMAINING_JSON, {})
+        if not isinstance(remaining, dict) or remaining.get("remaining") is None:
+            return
+        
+        # Only trust the measurement if it belongs to the track being reported
+        if remaining.get("track_started_at") != data.get("track_started_at"):
+            return
+        
+        try:
+            elapsed = time.time() - float(remaining["measured_at"])
+            data["time_remaining"] = max(0.0, float(remaining["remaining"]) - elapsed)
+            if remaining.get("duration") and not data.get("duration"):
+                data["duration"] = float(remaining["duration"])
+        except (KeyError, TypeError, ValueError):
+            pass
+    
     def get_next_track(self) -> Optional[Dict]:
         """
         Get next track information if available.
@@ -118,8 +316,8 @@ class MetadataService:
             return self._telnet_cache.copy()
         
         try:
-            lines = self._liquidsoap_command("output.icecast.metadata")
-            raw = '\n'.join(lines)
+            raw = get_client(config.TELNET_HOST, config.TELNET_PORT).command_raw(
+                "output.icecast.metadata")
             
             # Parse telnet response for current track (section 1)
             data = self._parse_telnet_metadata(raw)
@@ -134,158 +332,49 @@ class MetadataService:
             # Return cached data on error, or empty dict
             return self._telnet_cache.copy()
     
-    def _parse_telnet_metadata(self, raw: str) -> Dict:
-        """Parse Liquidsoap telnet metadata response"""
-        lines = raw.split('\n')
-        current_track = {}
-        in_current_section = False
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Look for current track section (--- 1 ---)
-            if line == "--- 1 ---":
-                in_current_section = True
-                continue
-            elif line.startswith("--- ") and line.endswith(" ---"):
-                in_current_section = False
-                continue
-            
-            # Parse metadata in current section
-            if in_current_section and "=" in line:
-                try:
-                    key, value = line.split("=", 1)
-                    key = key.strip().strip('"')
-                    value = value.strip().strip('"')
-                    current_track[key] = value
-                except ValueError:
-                    continue
-        
-        return current_track
-    
-    def _liquidsoap_command(self, command: str) -> List[str]:
-        """Execute Liquidsoap telnet command"""
-        try:
-            with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
-                sock.settimeout(2)
-                sock.connect((config.TELNET_HOST, config.TELNET_PORT))
-                
-                # Send command
-                sock.sendall(f"{command}\n".encode())
-                
-                # Read response
-                response = b""
-                while True:
-                    try:
-                        chunk = sock.recv(1024)
-                        if not chunk:
-                            break
-                        response += chunk
-                        if b"END" in response:
-                            break
-                    except socket.timeout:
-                        break
-                
-                # Process response
-                lines = response.decode('utf-8', errors='ignore').splitlines()
-                # Remove "END" marker if present
-                return [line for line in lines if line.strip() != "END"]
-                
-        except (socket.error, socket.timeout):
-            return []
+    def _parse_telnet_metadata(self, raw) -> Dict:
+        """Parse Liquidsoap telnet metadata response (current track is section 1)"""
+        return parse_sections(raw).get(1, {})
     
-    def _get_track_duration(self, title: str, artist: str, album: str = None) -> Optional[float]:
+    def _get_track_duration(self, title: str, artist: str, album: str = None,
+                            filename: str = None) -> Optional[float]:
         """
-        Find and extract duration from audio file by searching for track metadata.
+        Duration of a track in seconds, without searching the music directories.
+        
+        Taken from the library index for the track's own file or, failing
+        that, for any indexed copy of the track; files the index has not seen
+        yet are read directly, then the file the tracks table last recorded.
+        Answers, including "not found", are memoized per (artist, title, album).
         
         Args:
             title: Track title
             artist: Artist name
             album: Album name (optional)
+            filename: Audio file path from the track's metadata (optional)
             
         Returns:
             Duration in seconds or None if not found
         """
-        try:
-            from mutagen import File as MutaFile
-        except ImportError:
-            return None
-        
-        # Common music directories to search
-        music_dirs = ["/mnt/music/Music", "/mnt/music/media"]
-        
-        # Generate possible filename patterns
-        patterns = []
-        
-        # Sanitize strings for filename matching
-        clean_title = self._sanitize_for_search(title)
-        clean_artist = self._sanitize_for_search(artist)
-        clean_album = self._sanitize_for_search(album) if album else ""
-        
-        # Try different search patterns
-        if album:
-            patterns.extend([
-                f"*{clean_artist}*{clean_album}*{clean_title}*",
-                f"*{clean_artist}*{clean_album}*",
-                f"*{clean_album}*{clean_title}*",
-            ])
+        key = (normalize_key(artist), normalize_key(title), normalize_key(album))
+        found, duration = duration_memo.get(key)
+        if found:
+            return duration
         
-        patterns.extend([
-            f"*{clean_artist}*{clean_title}*",
-            f"*{clean_title}*{clean_artist}*",
-            f"*{clean_title}*",
-        ])
-        
-        # Search in music directories
-        for music_dir in music_dirs:
-            if not os.path.exists(music_dir):
-                continue
-                
-            for pattern in patterns:
-                try:
-                    # Use find command for efficient searching - search for audio files first, then filter by name
-                    import subprocess
-                    
-                    # First find all audio files in the directory
-                    cmd = ["find", music_dir, "-type", "f", 
-                          "(", "-iname", "*.mp3", "-o", "-iname", "*.m4a", "-o", 
-                          "-iname", "*.flac", "-o", "-iname", "*.wav", ")",
-                          "-iname", pattern]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-                    if result.returncode == 0 and result.stdout.strip():
-                        files = result.stdout.strip().split('\n')
-                        
-                        # Try to extract duration from first matching file
-                        for file_path in files[:3]:  # Limit to first 3 matches
-                            file_path = file_path.strip()
-                            if file_path and os.path.exists(file_path):
-                                try:
-                                    audio = MutaFile(file_path)
-                                    if audio and audio.info and hasattr(audio.info, 'length'):
-                                        duration = float(audio.info.length)
-                                        if duration > 0:
-                                            print(f"Found duration {duration:.1f}s for '{title}' in: {file_path}")
-                                            return duration
-                                except Exception as e:
-                                    print(f"Error reading {file_path}: {e}")
-                                    continue
-                                    
-                except (subprocess.TimeoutExpired, subprocess.SubprocessError) as e:
-                    print(f"Find command error: {e}")
-                    continue
-        
-        return None
-    
-    def _sanitize_for_search(self, text: str) -> str:
-        """Sanitize text for file search patterns"""
-        if not text:
-            return ""
+        duration = None
+        if filename:
+            indexed = library_index.get(filename)
+            duration = indexed["duration"] if indexed else read_audio_duration(filename)
+        if duration is None:
+            track = library_index.find_track(artist, title, album)
+            duration = track["duration"] if track else None
+        if duration is None:
+            try:
+                info = lookup_track_info(artist, title)
+            except Exception as e:
+                print(f"Error looking up track file: {e}")
+                info = None
+            if info and info.get("filename") and info["filename"] != filename:
+                duration = read_audio_duration(info["filename"])
         
-        # Remove special characters that could interfere with shell patterns
-        import re
-        # Keep only alphanumeric, spaces, and basic punctuation
-        sanitized = re.sub(r'[^\w\s\-\.]', '', text)
-        # Replace multiple spaces with single space
-        sanitized = re.sub(r'\s+', ' ', sanitized).strip()
-        return sanitized
\ No newline at end of file
+        duration_memo.put(key, duration)
+        return duration
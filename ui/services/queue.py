@@ -0,0 +1,96 @@
+"""
+Queue service for reading upcoming Liquidsoap requests into next.json
+"""
+import sys
+sys.path.append('/opt/ai-radio')  # Add parent directory to path
+
+import re
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import quote
+
+from config import config
+from liquidsoap_client import get_client, LiquidsoapError
+from liquidsoap_metadata import parse_kv
+from utils.file import atomic_write
+
+class QueueService:
+    """Service for keeping next.json in sync with the Liquidsoap request queue"""
+
+    def __init__(self, limit: int = 8):
+        self.limit = limit
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+    def read_queue(self) -> List[Dict]:
+        """
+        Read upcoming requests from Liquidsoap.
+
+        One round trip fetches request.all, a second one pipelines every
+        request.metadata call, so the cost no longer grows with queue length.
+
+        Returns:
+            List of track dictionaries in queue order
+        """
+        client = get_client(config.TELNET_HOST, config.TELNET_PORT)
+
+        rid_lines = client.command("request.all")
+        rids = re.findall(r'\d+', rid_lines[0])[:self.limit] if rid_lines else []
+        if not rids:
+            return []
+
+        blocks = client.pipeline_raw([f"request.metadata {rid}" for rid in rids])
+        return [self._track_from_metadata(rid, raw) for rid, raw in zip(rids, blocks)]
+
+    def refresh(self) -> bool:
+        """
+        Refresh next.json from the Liquidsoap queue.
+
+        Returns:
+            True if next.json was rewritten
+        """
+        try:
+            tracks = self.read_queue()
+        except LiquidsoapError as e:
+            print(f"Failed to refresh next tracks: {e}")
+            return False
+
+        return atomic_write(config.NEXT_JSON, tracks)
+
+    def is_stale(self, max_age: float = 30) -> bool:
+        """Check whether next.json is missing or older than max_age seconds"""
+        try:
+            return time.time() - config.NEXT_JSON.stat().st_mtime > max_age
+        except OSError:
+            return True
+
+    def refresh_in_background(self) -> bool:
+        """
+        Start a background refresh unless one is already running.
+
+        Returns:
+            True if a new refresh was started
+        """
+        with self._refresh_lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return False
+
+            self._refresh_thread = threading.Thread(target=self.refresh, daemon=True)
+            self._refresh_thread.start()
+            return True
+
+    def _track_from_metadata(self, rid: str, raw: bytes) -> Dict:
+        """Build a next.json entry from a raw request.metadata response"""
+        meta = parse_kv(raw)
+
+        filename = meta.get("filename") or meta.get("initial_uri", "").replace("file://", "")
+
+        return {
+            "rid": int(rid),
+            "title": meta.get("title", ""),
+            "artist": meta.get("artist") or meta.get("albumartist", ""),
+            "album": meta.get("album", ""),
+            "filename": filename,
+            "artwork_url": f"/api/cover?file={quote(filename)}" if filename else ""
+        }
@@ -0,0 +1,418 @@
+"""
+Tests for the pooled SQLite DatabaseManager
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.append('/opt/ai-radio')
+
+import database
+from database import DatabaseManager
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(database.__file__)), "db_init.sql")
+
+class DatabaseTestCase(unittest.TestCase):
+    """Creates a scratch database from db_init.sql for each test"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "ai_radio.db")
+        conn = sqlite3.connect(self.db_path)
+        with open(SCHEMA) as f:
+            conn.executescript(f.read())
+        conn.close()
+        self.manager = DatabaseManager(self.db_path)
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmp.cleanup()
+
+class TestConnectionPool(DatabaseTestCase):
+
+    def test_wal_and_pragmas(self):
+        """Test pooled connections run in WAL mode with a busy timeout"""
+        with self.manager.get_connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], database.BUSY_TIMEOUT_MS)
+
+    def test_connection_is_reused(self):
+        """Test a released connection is handed out again instead of reconnecting"""
+        with self.manager.get_connection() as first:
+            pass
+        with self.manager.get_connection() as second:
+            self.assertIs(first, second)
+
+    def test_uncommitted_work_is_rolled_back(self):
+        """Test a block that raises leaves nothing behind on the pooled connection"""
+        with self.assertRaises(RuntimeError):
+            with self.manager.get_connection() as conn:
+                conn.execute("INSERT INTO play_history (type, timestamp, title) VALUES ('song', 1, 'x')")
+                raise RuntimeError("boom")
+
+        self.assertEqual(self.manager.get_history(), [])
+
+    def test_concurrent_readers_and_writer(self):
+        """Test reads from several threads while another thread inserts"""
+        errors = []
+
+        def write():
+            for i in range(50):
+                self.manager.add_history_entry("song", 1000 + i, title=f"Song {i}", artist="A")
+
+        def read():
+            try:
+                for _ in range(50):
+                    self.manager.get_history(limit=10)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.manager.get_history(limit=100)), 50)
+
+class TestBatchedWriter(DatabaseTestCase):
+
+    def test_sync_insert_returns_row_id(self):
+        """Test a synchronous insert waits for the commit and returns the ID"""
+        row_id = self.manager.add_history_entry("song", 1000, title="Song")
+        self.assertIsInstance(row_id, int)
+        self.assertEqual(self.manager.get_history()[0]["id"], row_id)
+
+    def test_async_inserts_commit_in_one_batch(self):
+        """Test queued inserts land together and are visible after flush"""
+        for i in range(10):
+            self.assertIsNone(self.manager.add_history_entry("song", 1000 + i, title=f"Song {i}", sync=False))
+
+        self.assertTrue(self.manager.writer.flush(timeout=5))
+        self.assertEqual(len(self.manager.get_history(limit=100)), 10)
+
+    def test_failed_row_does_not_sink_batch(self):
+        """Test a constraint error only fails its own insert"""
+        self.manager.create_tts_entry(1, "hi", "a.mp3", "a.txt", sync=False)
+        self.manager.create_tts_entry(1, "dup", "b.mp3", "b.txt", sync=False)  # timestamp is UNIQUE
+        self.manager.create_tts_entry(2, "there", "c.mp3", "c.txt", sync=False)
+        self.manager.writer.flush(timeout=5)
+
+        self.assertEqual(len(self.manager.get_recent_tts_entries()), 2)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.manager.create_tts_entry(2, "again", "d.mp3", "d.txt")
+
+    def test_close_flushes_pending_rows(self):
+        """Test rows queued before shutdown are committed by close"""
+        for i in range(5):
+            self.manager.add_history_entry("song", 1000 + i, sync=False)
+        self.manager.writer.close()
+
+        with self.manager.get_connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM play_history").fetchone()[0], 5)
+
+class TestKeysetPagination(DatabaseTestCase):
+
+    def test_pages_walk_history_without_gaps(self):
+        """Test before= cursors return every row once, including equal timestamps"""
+        for i in range(25):
+            self.manager.add_history_entry("song", 1000 + i // 3, title=f"Song {i}")
+
+        seen = []
+        before = None
+        while True:
+            page = self.manager.get_history(limit=7, before=before)
+            if not page:
+                break
+            seen.extend(row["id"] for row in page)
+            before = database.parse_history_cursor(
+                database.make_history_cursor(page[-1]["timestamp"], page[-1]["id"]))
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_cursor_query_seeks_index(self):
+        """Test the cursor query is served by the timestamp index without a sort"""
+        with self.manager.get_connection() as conn:
+            plan = " ".join(row[3] for row in conn.execute("""
+                EXPLAIN QUERY PLAN
+                SELECT h.* FROM play_history h
+                LEFT JOIN tts_entries t ON h.tts_entry_id = t.id
+                WHERE (h.timestamp, h.id) < (?, ?)
+                ORDER BY h.timestamp DESC, h.id DESC LIMIT 50
+            """, (1, 1)))
+
+        self.assertIn("idx_history_timestamp", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_parse_history_cursor(self):
+        """Test malformed cursors are rejected"""
+        self.assertEqual(database.parse_history_cursor("1700000000000:42"), (1700000000000, 42))
+        self.assertIsNone(database.parse_history_cursor("nope"))
+        self.assertIsNone(database.parse_history_cursor(None))
+
+class TestTrackLookup(DatabaseTestCase):
+
+    def test_lookup_ignores_case_and_spacing(self):
+        """Test lookups match casefolded, whitespace-collapsed keys"""
+        self.manager.add_history_entry("song", 1000, title="Straße  Song", artist="The Band",
+                                       filename="/mnt/music/old.mp3")
+        self.manager.add_history_entry("song", 2000, title="Straße Song", artist="the  band",
+                                       filename="/mnt/music/new.mp3")
+
+        info = self.manager.lookup_track_info("THE BAND ", "strasse song")
+        self.assertEqual(info["filename"], "/mnt/music/new.mp3")
+        self.assertIsNone(self.manager.lookup_track_info("Other", "Straße Song"))
+
+    def test_migration_backfills_existing_rows(self):
+        """Test a pre-migration database gains keys, track links and version on first use"""
+        legacy_path = os.path.join(self.tmp.name, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("""CREATE TABLE play_history (id INTEGER PRIMARY KEY, type TEXT, timestamp INTEGER,
+                        title TEXT, artist TEXT, album TEXT, filename TEXT, artwork_url TEXT,
+                        tts_entry_id INTEGER)""")
+        conn.execute("""CREATE TABLE tts_entries (id INTEGER PRIMARY KEY, timestamp INTEGER, text TEXT,
+                        audio_filename TEXT, track_title TEXT, track_artist TEXT, status TEXT DEFAULT 'active')""")
+        conn.execute("""INSERT INTO play_history (type, timestamp, title, artist, filename)
+                        VALUES ('song', 1, 'Song', 'Artist', '/a.mp3')""")
+        conn.commit()
+        conn.close()
+
+        manager = DatabaseManager(legacy_path)
+        try:
+            self.assertEqual(manager.lookup_track_info("artist", "song")["filename"], "/a.mp3")
+            with manager.get_connection() as conn:
+                self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], database.SCHEMA_MIGRATIONS[-1][0])
+                indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            self.assertNotIn("idx_history_track_key", indexes)
+            self.assertIn("idx_history_track", indexes)
+            self.assertEqual(manager.get_track_plays("Artist", "Song")["play_count"], 1)
+        finally:
+            manager.close()
+
+class TestTracks(DatabaseTestCase):
+
+    def test_plays_link_to_one_track(self):
+        """Test repeated plays share a track row with a running count and last play"""
+        self.manager.add_history_entry("song", 1000, title="Song", artist="Band", album="First",
+                                       filename="/mnt/music/song.mp3")
+        self.manager.add_history_entry("song", 3000, title="song ", artist="BAND", album="First",
+                                       filename="/mnt/music/song.mp3")
+        self.manager.add_history_entry("song", 2000, title="Other", artist="Band")
+
+        track = self.manager.get_track_plays("band", "song")
+        self.assertEqual((track["play_count"], track["first_played_at"], track["last_played_at"]), (2, 1000, 3000))
+        self.assertEqual([t["title"] for t in self.manager.get_recently_played()], ["Song", "Other"])
+        self.assertEqual(self.manager.get_most_played(limit=1)[0]["id"], track["id"])
+
+        with self.manager.get_connection() as conn:
+            rows = conn.execute("SELECT track_id, album, filename FROM play_history WHERE title_key = 'song'").fetchall()
+        self.assertEqual({tuple(row) for row in rows}, {(track["id"], None, None)})
+
+    def test_history_restores_per_play_metadata(self):
+        """Test history rows read back with their own values or the track's"""
+        self.manager.add_history_entry("song", 1000, title="Song", artist="Band", album="Album",
+                                       filename="/a.mp3", artwork_url="/art.jpg")
+        self.manager.add_history_entry("song", 2000, title="Song", artist="Band", album="Live",
+                                       filename="/a.mp3", artwork_url="/art.jpg")
+
+        newest, oldest = self.manager.get_history()
+        self.assertEqual((newest["album"], newest["filename"], newest["artwork_url"]), ("Live", "/a.mp3", "/art.jpg"))
+        self.assertEqual(oldest["album"], "Album")
+        self.assertNotIn("track_album", newest)
+        self.assertEqual(self.manager.lookup_track_info("band", "song")["album"], "Live")
+
+    def test_delete_rewinds_track(self):
+        """Test deleting the latest play lowers the count and restores the previous last play"""
+        self.manager.add_history_entry("song", 1000, title="Song", artist="Band")
+        latest = self.manager.add_history_entry("song", 2000, title="Song", artist="Band")
+        with self.manager.get_connection() as conn:
+            conn.execute("DELETE FROM play_history WHERE id = ?", (latest,))
+            conn.commit()
+
+        track = self.manager.get_track_plays("Band", "Song")
+        self.assertEqual((track["play_count"], track["last_played_at"]), (1, 1000))
+
+    def test_recently_played_uses_index(self):
+        """Test recently-played is an ordered index walk rather than an aggregate"""
+        with self.manager.get_connection() as conn:
+            plan = " ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM tracks WHERE play_count > 0 AND last_played_at >= ? "
+                "ORDER BY last_played_at DESC LIMIT 50", (0,)))
+        self.assertIn("idx_tracks_last_played", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+class TestSearch(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager.create_tts_entry(1, "Coming up, a rainy day classic from the vault", "a.mp3", "a.txt",
+                                      track_title="Rain", track_artist="Band")
+        self.manager.create_tts_entry(2, "That was <b>sunshine</b> all the way", "b.mp3", "b.txt")
+        self.manager.add_history_entry("song", 1000, title="Rainy Day Women", artist="Bob Dylan", album="Blonde")
+        self.manager.add_history_entry("song", 2000, title="Purple Rain", artist="Prince", album="Purple Rain")
+
+    def test_ranked_results_from_both_sides(self):
+        """Test transcripts and tracks are searched together, with prefix matching on the last word"""
+        results = self.manager.search("rain")
+        self.assertEqual({(r["kind"], r["title"]) for r in results},
+                         {("dj", "Rain"), ("song", "Rainy Day Women"), ("song", "Purple Rain")})
+        self.assertEqual([r["rank"] for r in results], sorted(r["rank"] for r in results))
+
+        songs = self.manager.search("rainy day", kind="song")
+        self.assertEqual([r["title"] for r in songs], ["Rainy Day Women"])
+        self.assertEqual(songs[0]["play_count"], 1)
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        """Test stored markup is escaped while matches are wrapped in <mark>"""
+        result = self.manager.search("sunshine", kind="dj")[0]
+        self.assertIn("&lt;b&gt;<mark>sunshine</mark>&lt;/b&gt;", result["snippet"])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test edits and deletes are reflected without a rebuild"""
+        with self.manager.get_connection() as conn:
+            conn.execute("UPDATE tts_entries SET text = 'Snow is falling' WHERE timestamp = 2")
+            conn.execute("DELETE FROM tts_entries WHERE timestamp = 1")
+            conn.commit()
+
+        self.assertEqual(self.manager.search("sunshine"), [])
+        self.assertEqual(len(self.manager.search("snow")), 1)
+        self.assertEqual(self.manager.search("rain", kind="dj"), [])
+
+    def test_paging_and_hostile_input(self):
+        """Test limit/offset paging and that FTS syntax in the query is treated as text"""
+        first = self.manager.search("rain", limit=2)
+        rest = self.manager.search("rain", limit=2, offset=2)
+        self.assertEqual((len(first), len(rest)), (2, 1))
+        self.assertEqual(self.manager.search('rain" OR NEAR(*'), [])
+        self.assertEqual(self.manager.search("  "), [])
+
+    def test_migration_adds_missing_indexed_columns(self):
+        """Test an old tts_entries without track columns still gets a search index"""
+        legacy_path = os.path.join(self.tmp.name, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("""CREATE TABLE play_history (id INTEGER PRIMARY KEY, type TEXT, timestamp INTEGER,
+                        title TEXT, artist TEXT, album TEXT, filename TEXT, artwork_url TEXT,
+                        tts_entry_id INTEGER)""")
+        conn.execute("""CREATE TABLE tts_entries (id INTEGER PRIMARY KEY, timestamp INTEGER, text TEXT,
+                        audio_filename TEXT, status TEXT DEFAULT 'active')""")
+        conn.execute("INSERT INTO tts_entries (timestamp, text, audio_filename) VALUES (1, 'Stormy weather', 'a.mp3')")
+        conn.commit()
+        conn.close()
+
+        manager = DatabaseManager(legacy_path)
+        try:
+            self.assertEqual([r["kind"] for r in manager.search("stormy")], ["dj"])
+        finally:
+            manager.close()
+
+class TestStatCounters(DatabaseTestCase):
+
+    def count(self, sql, params=()):
+        with self.manager.get_connection() as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+    def test_counters_follow_inserts_updates_and_deletes(self):
+        """Test get_stats matches a full COUNT(*) after every kind of change"""
+        now = int(time.time() * 1000)
+        for i in range(6):
+            self.manager.add_history_entry("song" if i % 3 else "dj", now - i * 1000, title=f"Song {i}")
+        for i in range(4):
+            self.manager.create_tts_entry(now + i, f"Line {i}", f"{i}.mp3", f"{i}.txt")
+
+        with self.manager.get_connection() as conn:
+            conn.execute("UPDATE tts_entries SET status = 'deleted' WHERE timestamp = ?", (now,))
+            conn.execute("UPDATE tts_entries SET status = 'active' WHERE timestamp = ?", (now,))
+            conn.execute("UPDATE tts_entries SET status = 'deleted' WHERE timestamp = ?", (now + 1,))
+            conn.execute("DELETE FROM tts_entries WHERE timestamp = ?", (now + 2,))
+            conn.execute("UPDATE play_history SET type = 'dj' WHERE title = 'Song 1'")
+            conn.execute("DELETE FROM play_history WHERE title = 'Song 2'")
+            conn.commit()
+
+        stats = self.manager.get_stats()
+        self.assertEqual(stats['total_tts_entries'], self.count("SELECT COUNT(*) FROM tts_entries"))
+        self.assertEqual(stats['active_tts_entries'],
+                         self.count("SELECT COUNT(*) FROM tts_entries WHERE status = 'active'"))
+        self.assertEqual(stats['song_history_count'],
+                         self.count("SELECT COUNT(*) FROM play_history WHERE type = 'song'"))
+        self.assertEqual(stats['dj_history_count'],
+                         self.count("SELECT COUNT(*) FROM play_history WHERE type = 'dj'"))
+        self.assertEqual((stats['active_tts_entries'], stats['song_history_count']), (2, 2))
+
+    def test_recent_activity_window_is_exact(self):
+        """Test the 24h count includes the partial first hour and nothing older"""
+        now = int(time.time() * 1000)
+        day = 86400 * 1000
+        for offset in (day + 60000, day - 60000, day - 3600000, 1000):
+            self.manager.add_history_entry("song", now - offset, title="Song")
+
+        self.assertEqual(self.manager.get_stats()['recent_activity_24h'], 3)
+
+    def test_migration_seeds_counters_from_existing_rows(self):
+        """Test rows written before the counters existed are counted"""
+        with self.manager.get_connection() as conn:
+            conn.execute("INSERT INTO play_history (type, timestamp, title) VALUES ('song', 1, 'Old')")
+            conn.execute("UPDATE stat_counters SET value = 0")
+            conn.commit()
+            database._migrate_stat_counters(conn)
+            conn.commit()
+
+        self.assertEqual(self.manager.get_stats()['song_history_count'], 1)
+
+class TestTranscripts(DatabaseTestCase):
+
+    def test_dj_plays_link_to_transcript_by_filename(self):
+        """Test a DJ play inserted with just its audio path gets its transcript in history"""
+        self.manager.create_tts_entry(1700000000, "Coming up next", "intro_1700000000.mp3", "intro_1700000000.txt")
+        self.manager.add_history_entry("dj", 1, title="DJ", filename="/opt/ai-radio/tts/intro_1700000000.mp3")
+        self.manager.add_history_entry("dj", 2, title="DJ", filename="/opt/ai-radio/tts/unknown_1.mp3")
+
+        history = self.manager.get_history()
+        self.assertEqual(history[1]['text'], "Coming up next")
+        self.assertIsNone(history[0]['tts_entry_id'])
+
+    def test_save_transcript_fills_or_creates_once(self):
+        """Test save_transcript fills empty text, creates missing entries and keeps existing text"""
+        self.manager.create_tts_entry(1700000000, "", "intro_1700000000.mp3", "intro_1700000000.txt")
+        self.assertTrue(self.manager.save_transcript("intro_1700000000.mp3", '"Hello there"'))
+        self.assertTrue(self.manager.save_transcript("outro_1700000500.mp3", "Goodbye"))
+        self.manager.save_transcript("intro_1700000000.mp3", "Replacement")
+        self.assertFalse(self.manager.save_transcript("outro_1700000900.mp3", "  "))
+
+        self.assertEqual(self.manager.get_transcripts(["intro_1700000000.mp3", "outro_1700000500.mp3", "x.mp3", ""]),
+                         {"intro_1700000000.mp3": "Hello there", "outro_1700000500.mp3": "Goodbye"})
+        self.assertEqual(self.manager.get_tts_entry_by_filename("outro_1700000500.mp3")['timestamp'], 1700000500)
+
+    def test_save_transcript_same_timestamp(self):
+        """Test transcripts made in the same second each get an entry"""
+        self.assertTrue(self.manager.save_transcript("intro_a.mp3", "First", 1700000000))
+        self.assertTrue(self.manager.save_transcript("intro_b.mp3", "Second", 1700000000))
+
+        self.assertEqual(self.manager.get_transcripts(["intro_a.mp3", "intro_b.mp3"]),
+                         {"intro_a.mp3": "First", "intro_b.mp3": "Second"})
+        self.assertEqual(self.manager.get_tts_entry_by_filename("intro_b.mp3")['timestamp'], 1700000001)
+
+    def test_migration_links_existing_plays(self):
+        """Test DJ plays written before the link trigger existed are linked by the migration"""
+        tts_id = self.manager.create_tts_entry(1700000000, "Hello", "intro_1700000000.mp3", "intro_1700000000.txt")
+        with self.manager.get_connection() as conn:
+            conn.execute("DROP TRIGGER trg_history_link_tts")
+            conn.execute("INSERT INTO play_history (type, timestamp, filename) "
+                         "VALUES ('dj', 1, '/opt/ai-radio/tts/intro_1700000000.mp3')")
+            conn.commit()
+            database._migrate_transcripts(conn)
+            conn.commit()
+            linked = conn.execute("SELECT tts_entry_id FROM play_history").fetchone()[0]
+            plan = " ".join(row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM tts_entries WHERE audio_filename = 'x.mp3'"))
+
+        self.assertEqual(linked, tts_id)
+        self.assertIn("idx_tts_audio_filename", plan)
+
+if __name__ == '__main__':
+    unittest.main()
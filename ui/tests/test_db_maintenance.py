@@ -0,0 +1,76 @@
+"""
+Tests for the SQLite maintenance scheduler
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append('/opt/ai-radio')
+
+import database
+import db_maintenance
+from database import DatabaseManager
+from db_maintenance import MaintenanceScheduler, read_report
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(database.__file__)), "db_init.sql")
+
+class TestMaintenanceScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "ai_radio.db")
+        self.report_path = os.path.join(self.tmp.name, "cache", "db_maintenance.json")
+        conn = sqlite3.connect(self.db_path)
+        with open(SCHEMA) as f:
+            conn.executescript(f.read())
+        conn.close()
+        self.manager = DatabaseManager(self.db_path)
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmp.cleanup()
+
+    def test_run_releases_free_pages_and_reports(self):
+        """Test a run checkpoints, vacuums freed pages and records timings and sizes"""
+        with self.manager.get_connection() as conn:
+            conn.executemany("INSERT INTO play_history (type, timestamp, title, metadata) VALUES ('dj', ?, 'x', ?)",
+                             [(i, "x" * 2000) for i in range(500)])
+            conn.commit()
+            conn.execute("DELETE FROM play_history")
+            conn.commit()
+
+        report = MaintenanceScheduler(self.manager, report_path=self.report_path).run_once()
+
+        self.assertEqual(set(report["steps"]), {"wal_checkpoint", "optimize", "incremental_vacuum", "analyze"})
+        self.assertGreater(report["steps"]["incremental_vacuum"]["pages_released"], 0)
+        self.assertTrue(all("ms" in step for step in report["steps"].values()))
+        self.assertEqual(report["storage"]["auto_vacuum"], "incremental")
+        self.assertEqual(report["storage"]["wal_bytes"], 0)
+        self.assertEqual(read_report(self.report_path)["finished_at"], report["finished_at"])
+
+    def test_budget_skips_remaining_steps(self):
+        """Test only the closing checkpoint runs once the budget is spent"""
+        report = MaintenanceScheduler(self.manager, report_path=self.report_path, budget=0).run_once()
+        self.assertEqual(list(report["steps"]), ["wal_checkpoint"])
+        self.assertEqual(report["skipped"], ["optimize", "incremental_vacuum", "analyze"])
+
+    def test_schedule_waits_for_idle_and_survives_restart(self):
+        """Test a due run waits for an idle database and the next scheduler resumes the schedule"""
+        scheduler = MaintenanceScheduler(self.manager, report_path=self.report_path)
+        scheduler.last_run = time.time() - scheduler.interval
+        self.manager.last_used = time.monotonic()
+        self.assertFalse(scheduler.is_due())
+
+        self.manager.last_used = time.monotonic() - db_maintenance.MAINTENANCE_IDLE
+        self.assertTrue(scheduler.is_due())
+
+        scheduler.run_once()
+        restarted = MaintenanceScheduler(self.manager, report_path=self.report_path)
+        self.assertFalse(restarted.is_due())
+        self.assertNotIn("analyze", dict(restarted.steps(time.time())))
+
+if __name__ == '__main__':
+    unittest.main()
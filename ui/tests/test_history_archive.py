@@ -0,0 +1,97 @@
+"""
+Tests for moving old play history into monthly archives
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+
+sys.path.append('/opt/ai-radio')
+
+import database
+import history_archive
+from database import DatabaseManager
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(database.__file__)), "db_init.sql")
+DAY_MS = 86400 * 1000
+
+def ms(year, month, day):
+    return int(datetime(year, month, day, 12, tzinfo=timezone.utc).timestamp() * 1000)
+
+class TestHistoryArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "ai_radio.db")
+        self.archive_dir = os.path.join(self.tmp.name, "archive")
+        conn = sqlite3.connect(self.db_path)
+        with open(SCHEMA) as f:
+            conn.executescript(f.read())
+        conn.close()
+        self.manager = DatabaseManager(self.db_path)
+
+        self.now = int(time.time() * 1000)
+        self.manager.add_history_entry("song", ms(2020, 1, 5), title="Song", artist="Band", album="Album")
+        self.manager.add_history_entry("song", ms(2020, 1, 20), title="Song", artist="Band", album="Album")
+        tts_id = self.manager.create_tts_entry(ms(2020, 2, 3) // 1000, "Hello", "a.mp3", "a.txt")
+        self.manager.add_history_entry("dj", ms(2020, 2, 3), title="DJ", tts_entry_id=tts_id)
+        self.manager.add_history_entry("song", self.now - DAY_MS, title="Song", artist="Band", album="Album")
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmp.cleanup()
+
+    def archive(self):
+        return history_archive.archive_old_history(self.manager, days=30, archive_dir=self.archive_dir)
+
+    def test_moves_old_months_out_of_live_database(self):
+        """Test whole months past the horizon are archived and recent rows stay"""
+        results = self.archive()
+
+        self.assertEqual(results, {"2020-01": {"history": 2, "tts": 0}, "2020-02": {"history": 1, "tts": 1}})
+        self.assertEqual([row["timestamp"] for row in self.manager.get_history()], [self.now - DAY_MS])
+        self.assertEqual(self.manager.get_recent_tts_entries(), [])
+        self.assertEqual([month for month, _ in history_archive.list_archives(self.archive_dir)],
+                         [datetime(2020, 1, 1, tzinfo=timezone.utc), datetime(2020, 2, 1, tzinfo=timezone.utc)])
+
+    def test_track_counts_survive_archiving(self):
+        """Test lifetime play counts are kept while get_stats reflects the live rows"""
+        self.archive()
+
+        track = self.manager.get_track_plays("Band", "Song")
+        self.assertEqual((track["play_count"], track["first_played_at"]), (3, ms(2020, 1, 5)))
+        self.assertEqual(self.manager.get_stats()["song_history_count"], 1)
+
+    def test_attached_archives_answer_old_queries(self):
+        """Test the union views see archived and live rows with resolved metadata"""
+        self.archive()
+
+        with history_archive.archive_connection(db_path=self.db_path, archive_dir=self.archive_dir) as conn:
+            rows = conn.execute("SELECT type, album FROM all_play_history ORDER BY timestamp").fetchall()
+            text = conn.execute("SELECT text FROM all_tts_entries").fetchone()[0]
+
+        self.assertEqual([tuple(row) for row in rows],
+                         [("song", "Album"), ("song", "Album"), ("dj", ""), ("song", "Album")])
+        self.assertEqual(text, "Hello")
+
+        with history_archive.archive_connection(start_ms=ms(2020, 2, 1), db_path=self.db_path,
+                                                archive_dir=self.archive_dir) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM all_play_history").fetchone()[0], 2)
+
+    def test_late_rows_merge_into_existing_archive(self):
+        """Test a second run adds to a month's archive instead of replacing it"""
+        self.archive()
+        self.manager.add_history_entry("song", ms(2020, 1, 25), title="Late", artist="Band")
+        self.assertEqual(self.archive(), {"2020-01": {"history": 1, "tts": 0}})
+
+        with history_archive.archive_connection(end_ms=ms(2020, 2, 1), db_path=self.db_path,
+                                                archive_dir=self.archive_dir) as conn:
+            self.assertEqual(conn.execute(
+                "SELECT COUNT(*) FROM all_play_history WHERE timestamp < ?", (ms(2020, 2, 1),)).fetchone()[0], 3)
+        self.assertEqual(os.listdir(self.archive_dir).count("history-2020-01.db.work"), 0)
+
+if __name__ == '__main__':
+    unittest.main()
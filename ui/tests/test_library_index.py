@@ -0,0 +1,133 @@
+"""
+Tests for the music library index and its scanner
+"""
+import os
+import sys
+import tempfile
+import unittest
+import wave
+
+sys.path.append('/opt/ai-radio')
+
+from library_index import LibraryIndex, distinct_roots, scan_library
+
+def write_track(path, title=None, artist=None, album=None, art=False, seconds=0.5):
+    """A short silent WAV file with ID3 tags"""
+    from mutagen.id3 import APIC, TALB, TIT2, TPE1
+    from mutagen.wave import WAVE
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\0\0" * int(8000 * seconds))
+    audio = WAVE(path)
+    audio.add_tags()
+    for frame, value in ((TIT2, title), (TPE1, artist), (TALB, album)):
+        if value:
+            audio.tags.add(frame(encoding=3, text=value))
+    if art:
+        audio.tags.add(APIC(encoding=3, mime="image/png", type=3, desc="", data=b"\x89PNG cover"))
+    audio.save()
+
+class TestLibraryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "music")
+        self.db_path = os.path.join(self.tmp.name, "library_index.db")
+        write_track(os.path.join(self.root, "Band", "First", "01.wav"), "Opening", "Band", "First", art=True)
+        write_track(os.path.join(self.root, "Band", "Live", "01.wav"), "Opening", "Band", "Live", seconds=1.0)
+        write_track(os.path.join(self.root, "media", "Other Band - Closer.wav"))
+        with open(os.path.join(self.root, "media", "broken.mp3"), "wb") as f:
+            f.write(b"not audio")
+        with open(os.path.join(self.root, "media", "cover.jpg"), "wb") as f:
+            f.write(b"not indexed")
+        self.index = LibraryIndex(self.db_path)
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_scan_records_tags_and_lookups_use_them(self):
+        """Test the scan indexes every audio file once and lookups match on normalized keys"""
+        stats = scan_library(self.db_path, [self.root, os.path.join(self.root, "media")], workers=1)
+
+        self.assertEqual((stats["files"], stats["probed"], stats["errors"]), (4, 4, 1))
+        self.assertFalse(stats["resumed"])
+        first = self.index.get(os.path.join(self.root, "Band", "First", "01.wav"))
+        self.assertEqual((first["codec"], first["has_art"], first["album"]), ("WAVE", 1, "First"))
+        self.assertAlmostEqual(first["duration"], 0.5, places=2)
+        self.assertEqual(self.index.get(os.path.join(self.root, "media", "Other Band - Closer.wav"))["artist"],
+                         "Other Band")
+        self.assertIsNotNone(self.index.get(os.path.join(self.root, "media", "broken.mp3"))["error"])
+
+        self.assertAlmostEqual(self.index.find_track(" band", "OPENING", "live")["duration"], 1.0, places=2)
+        self.assertEqual(self.index.find_track("Other Band", "Closer")["codec"], "WAVE")
+        self.assertIsNone(self.index.find_track("Band", "Missing"))
+        self.assertEqual(self.index.find_art("band", "Live"), [first["path"]])  # falls back to the artist
+        self.assertEqual(self.index.find_art("Other Band"), [])
+
+    def test_rescan_skips_unchanged_and_drops_missing_files(self):
+        """Test only changed files are read again and deleted files leave the index"""
+        scan_library(self.db_path, [self.root], workers=1)
+        live = os.path.join(self.root, "Band", "Live", "01.wav")
+        write_track(live, "Encore", "Band", "Live")
+        os.remove(os.path.join(self.root, "media", "broken.mp3"))
+
+        stats = scan_library(self.db_path, [self.root], workers=1)
+
+        self.assertEqual((stats["files"], stats["probed"], stats["unchanged"], stats["removed"]), (3, 1, 2, 1))
+        self.assertEqual(self.index.get(live)["title"], "Encore")
+        self.assertIsNone(self.index.get(os.path.join(self.root, "media", "broken.mp3")))
+        self.assertTrue(all(scan["finished_at"] for scan in self.index.scans()))
+
+    def test_interrupted_scan_resumes_and_keeps_unmounted_roots(self):
+        """Test committed batches survive an interruption and a missing root removes nothing"""
+        batches = []
+        def interrupt(stats):
+            batches.append(stats["probed"])
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            scan_library(self.db_path, [self.root], workers=1, batch=2, progress=interrupt)
+        self.assertEqual(batches, [2])
+
+        stats = scan_library(self.db_path, [self.root], workers=1, batch=2)
+        self.assertTrue(stats["resumed"])
+        self.assertEqual((stats["probed"], stats["unchanged"]), (2, 2))
+
+        stats = scan_library(self.db_path, [os.path.join(self.tmp.name, "unmounted")], workers=1)
+        self.assertEqual((stats["files"], stats["removed"]), (0, 0))
+        self.assertEqual(len(self.index._query("SELECT path FROM library_files", ())), 4)
+
+    def test_parallel_scan_matches_serial(self):
+        """Test the process pool reads the same rows as an in-process scan"""
+        stats = scan_library(self.db_path, [self.root], workers=2)
+        self.assertEqual((stats["probed"], stats["errors"]), (4, 1))
+        self.assertEqual(self.index.find_track("Band", "Opening", "First")["has_art"], 1)
+
+    def test_missing_index_and_nested_roots(self):
+        """Test lookups return nothing before the first scan and nested roots are walked once"""
+        self.assertIsNone(self.index.get("/mnt/music/a.mp3"))
+        self.assertEqual(self.index.find_art("Band", "First"), [])
+        self.assertFalse(os.path.exists(self.db_path))
+
+        media = os.path.join(self.root, "media")
+        self.assertEqual(distinct_roots([media, self.root, self.root + "/", "/nonexistent"]),
+                         [os.path.realpath(self.root)])
+
+    def test_symlinked_root_lookups(self):
+        """Test files scanned through a symlinked root are found by any form of their path"""
+        link = os.path.join(self.tmp.name, "linked")
+        os.symlink(self.root, link)
+        scan_library(self.db_path, [link], workers=1)
+
+        real = os.path.join(os.path.realpath(self.root), "Band", "First", "01.wav")
+        for path in (os.path.join(link, "Band", "First", "01.wav"),
+                     os.path.join(self.root, "Band", "Live", "..", "First", "01.wav"), real):
+            self.assertEqual(self.index.get(path)["path"], real)
+
+if __name__ == '__main__':
+    unittest.main()
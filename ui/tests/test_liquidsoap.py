@@ -0,0 +1,153 @@
+"""
+Tests for the shared Liquidsoap telnet client
+"""
+import socket
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append('/opt/ai-radio')
+
+import liquidsoap_client
+from liquidsoap_client import LiquidsoapClient, LiquidsoapError
+from liquidsoap_metadata import parse_kv, parse_sections
+
+class FakeLiquidsoap:
+    """Minimal line-based server answering like the Liquidsoap telnet interface"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.connections = 0
+        self.received = []
+        self.close_after_first = False
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        buffer = b""
+        with conn:
+            while True:
+                try:
+                    chunk = conn.recv(4096)
+                except OSError:
+                    return
+                if not chunk:
+                    return
+                buffer += chunk
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    cmd = line.decode().strip()
+                    if cmd == "quit":
+                        return
+                    self.received.append(cmd)
+                    body = self.responses.get(cmd, "")
+                    conn.sendall((body + "\r\nEND\r\n" if body else "END\r\n").encode())
+                    if self.close_after_first:
+                        self.close_after_first = False
+                        return
+
+    def close(self):
+        self.server.close()
+
+class TestLiquidsoapClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeLiquidsoap({
+            "request.all": "5 6 7",
+            "request.metadata 5": 'title="Five"\r\nartist="Band"',
+            "uptime": "0d 00h 01m 02s",
+        })
+        self.client = LiquidsoapClient("127.0.0.1", self.server.port)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_command_frames_on_end(self):
+        """Test a single command returns its lines without END"""
+        self.assertEqual(self.client.command("request.all"), ["5 6 7"])
+
+    def test_pipeline_reuses_connection(self):
+        """Test pipelined commands come back in order over one connection"""
+        results = self.client.pipeline(["request.all", "request.metadata 5", "unknown"])
+
+        self.assertEqual(results[0], ["5 6 7"])
+        self.assertEqual(results[1], ['title="Five"', 'artist="Band"'])
+        self.assertEqual(results[2], [])
+
+        self.client.command("uptime")
+        self.assertEqual(self.server.connections, 1)
+
+    def test_reconnects_after_server_closes(self):
+        """Test a connection dropped by the server is transparently replaced"""
+        self.server.close_after_first = True
+        self.client.command("uptime")
+
+        self.assertEqual(self.client.command("request.all"), ["5 6 7"])
+        self.assertEqual(self.server.connections, 2)
+
+    def test_backoff_after_failed_connect(self):
+        """Test failed connects are not retried before the backoff expires"""
+        self.server.close()
+        client = LiquidsoapClient("127.0.0.1", self.server.port)
+
+        with self.assertRaises(LiquidsoapError):
+            client.command("uptime")
+
+        with patch('liquidsoap_client.socket.create_connection') as mock_connect:
+            with self.assertRaises(LiquidsoapError):
+                client.command("uptime")
+            mock_connect.assert_not_called()
+
+    def test_get_client_is_shared(self):
+        """Test every caller gets the same client for a server"""
+        first = liquidsoap_client.get_client("127.0.0.1", self.server.port)
+        second = liquidsoap_client.get_client("127.0.0.1", self.server.port)
+        self.assertIs(first, second)
+
+class TestMetadataParser(unittest.TestCase):
+
+    def test_parse_sections_in_response_order(self):
+        """Test --- N --- sections are returned in order and empty ones dropped"""
+        raw = (b'--- 3 ---\r\ntitle="Three"\r\n--- 2 ---\r\n'
+               b'--- 1 ---\r\ntitle="One"\r\nartist="Band"\r\nEND\r\n')
+        sections = parse_sections(raw)
+
+        self.assertEqual(list(sections), [3, 1])
+        self.assertEqual(sections[1], {"title": "One", "artist": "Band"})
+
+    def test_ignored_keys_are_skipped(self):
+        """Test cover art and encoder padding never reach the result"""
+        raw = b'title="Song"\nCOVER="\xff\xd8\xff"\nitunsmpb=" 00000000"\nalbum="A"'
+        self.assertEqual(parse_kv(raw), {"title": "Song", "album": "A"})
+
+    def test_escapes_and_utf8(self):
+        """Test quoted values are unescaped consistently and decoded as UTF-8"""
+        raw = 'title="Say \\"Hi\\" \\\\ bye"\nartist="Caf\u00e9"\nalbum="Sigur R\\u00f3s"'
+        result = parse_kv(raw.encode("utf-8"))
+
+        self.assertEqual(result["title"], 'Say "Hi" \\ bye')
+        self.assertEqual(result["artist"], "Caf\u00e9")
+        self.assertEqual(result["album"], "Sigur R\u00f3s")
+
+    def test_unquoted_and_str_input(self):
+        """Test unquoted values and str payloads are accepted"""
+        self.assertEqual(parse_kv("rid=5\nstatus=playing"), {"rid": "5", "status": "playing"})
+        self.assertEqual(parse_kv(b""), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Tests for the metadata daemon's change-only cache files
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append('/opt/ai-radio')
+
+from metadata_cache import CacheReader, CacheWriter, read_heartbeat
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.now_path = os.path.join(self.dir, "now_metadata.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rewrites_only_on_change(self):
+        """Test cached_at alone does not cause a rewrite and versions increase"""
+        writer = CacheWriter(self.dir)
+
+        self.assertTrue(writer.write(self.now_path, {"title": "A", "cached_at": 1}))
+        self.assertFalse(writer.write(self.now_path, {"title": "A", "cached_at": 2}))
+        self.assertTrue(writer.write(self.now_path, {"title": "B", "cached_at": 3}))
+
+        with open(self.now_path) as f:
+            data = json.load(f)
+        self.assertEqual(data["title"], "B")
+        self.assertEqual(data["version"], 2)
+
+    def test_versions_survive_restart(self):
+        """Test a new writer continues from the versions in the heartbeat"""
+        writer = CacheWriter(self.dir)
+        writer.write(self.now_path, {"title": "A"})
+        writer.heartbeat()
+
+        restarted = CacheWriter(self.dir)
+        restarted.write(self.now_path, {"title": "A"})
+        self.assertEqual(restarted.versions["now_metadata.json"], 2)
+
+    def test_reader_skips_reparse_until_version_moves(self):
+        """Test the reader keeps its parsed copy while the version is unchanged"""
+        writer = CacheWriter(self.dir)
+        writer.write(self.now_path, {"title": "A"})
+        writer.heartbeat()
+
+        reader = CacheReader(self.now_path)
+        data, age = reader.read()
+        self.assertEqual(data["title"], "A")
+        self.assertLess(age, 5)
+
+        # Same version in the heartbeat: the cached object is returned as-is
+        again, _ = reader.read()
+        self.assertIs(again, data)
+
+        writer.write(self.now_path, {"title": "B"})
+        writer.heartbeat()
+        data, _ = reader.read()
+        self.assertEqual(data["title"], "B")
+        self.assertEqual(read_heartbeat(writer.heartbeat_path)["versions"]["now_metadata.json"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
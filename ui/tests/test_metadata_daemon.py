@@ -0,0 +1,64 @@
+"""
+Tests for the metadata daemon's per-tick snapshot
+"""
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append('/opt/ai-radio')
+
+import metadata_daemon
+
+class TestSnapshotDeadlines(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        metadata_daemon.last_track_id = None
+        metadata_daemon.track_started_at = None
+
+    def tearDown(self):
+        # Let the late Liquidsoap worker finish so it does not hold a pool thread
+        self.release.set()
+
+    def late_liquidsoap(self):
+        self.release.wait(5)
+        return {0: {"artist": "Band", "title": "Song", "filename": "/music/song.mp3"}}
+
+    def test_liquidsoap_timeout_falls_back_to_icecast(self):
+        """Test a Liquidsoap fetch past its deadline still yields now-playing from Icecast"""
+        with patch.object(metadata_daemon, "LIQUIDSOAP_DEADLINE", 0.05), \
+             patch.object(metadata_daemon, "DEADLINE_GRACE", 0.05), \
+             patch.object(metadata_daemon, "fetch_liquidsoap_sections", self.late_liquidsoap), \
+             patch.object(metadata_daemon, "fetch_icecast_title", return_value="Band - Song"):
+            snapshot = metadata_daemon.fetch_snapshot()
+
+        self.assertEqual(snapshot.sections, ())
+        self.assertEqual(snapshot.icecast_title, "Band - Song")
+
+        metadata = metadata_daemon.get_current_metadata(snapshot)
+        self.assertEqual(metadata["artist"], "Band")
+        self.assertEqual(metadata["title"], "Song")
+        self.assertEqual(metadata["source"], "icecast_only")
+        self.assertIsNotNone(metadata["track_started_at"])
+
+    def test_icecast_only_tick_keeps_track_start(self):
+        """Test switching between Icecast-only and full ticks is not a track change"""
+        full = metadata_daemon.MetadataSnapshot(
+            icecast_title="Band - Song",
+            sections=((0, {"artist": "Band", "title": "Song", "filename": "/music/song.mp3"}),),
+            fetched_at=0)
+        icecast_only = metadata_daemon.MetadataSnapshot(
+            icecast_title="Band - Song", sections=(), fetched_at=0)
+
+        started = metadata_daemon.get_current_metadata(full)["track_started_at"]
+        self.assertEqual(metadata_daemon.get_current_metadata(icecast_only)["track_started_at"], started)
+        self.assertEqual(metadata_daemon.get_current_metadata(full)["track_started_at"], started)
+
+    def test_no_sources_returns_nothing(self):
+        """Test a tick with neither source writes nothing"""
+        snapshot = metadata_daemon.MetadataSnapshot(icecast_title=None, sections=(), fetched_at=0)
+        self.assertEqual(metadata_daemon.get_current_metadata(snapshot), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests for the JSON-to-SQLite migration and TTS relinking tools
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.append('/opt/ai-radio')
+
+import database
+import init_database
+from backfill_transcripts import backfill_transcripts
+from database import DatabaseManager
+from fix_tts_linking import find_dj_item, index_dj_items
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(database.__file__)), "db_init.sql")
+
+class TestTTSLinking(unittest.TestCase):
+
+    def test_find_dj_item_picks_nearest_within_window(self):
+        """Test the bisect join matches the closest DJ item under a second away"""
+        times, items = index_dj_items([
+            {"type": "dj", "time": 5000, "audio_url": "/tts/b.mp3"},
+            {"type": "song", "time": 2000},
+            {"type": "dj", "time": 2000, "audio_url": "/tts/a.mp3"},
+            {"type": "dj", "time": 2100},  # no audio, never a candidate
+        ])
+
+        self.assertEqual(times, [2000, 5000])
+        self.assertEqual(find_dj_item(times, items, 2400)["audio_url"], "/tts/a.mp3")
+        self.assertEqual(find_dj_item(times, items, 4800)["audio_url"], "/tts/b.mp3")
+        self.assertIsNone(find_dj_item(times, items, 3500))
+        self.assertIsNone(find_dj_item([], [], 1000))
+
+    def test_insert_data_links_in_one_pass(self):
+        """Test init_database inserts TTS rows first so DJ history links to their IDs"""
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, "ai_radio.db"))
+            with open(SCHEMA) as f:
+                conn.executescript(f.read())
+
+            tts_entries = [{'timestamp': 1700000000, 'text': 'Hello', 'audio_filename': 'custom_1700000000.mp3',
+                            'text_filename': 'custom_1700000000.txt', 'track_title': None, 'track_artist': None,
+                            'mode': 'custom', 'status': 'active', 'file_size': 1}]
+            history_entries = [
+                {'type': 'dj', 'timestamp': 1700000000500, 'title': 'DJ', 'artist': '', 'album': '',
+                 'filename': '', 'artwork_url': '', 'metadata': None,
+                 'audio_url': '/tts/custom_1700000000.mp3', 'tts_entry_id': None},
+                {'type': 'song', 'timestamp': 1700000001000, 'title': 'Song', 'artist': 'Band', 'album': '',
+                 'filename': '', 'artwork_url': '', 'metadata': None, 'audio_url': '', 'tts_entry_id': None},
+            ]
+            init_database.insert_data(conn, tts_entries, history_entries)
+
+            rows = conn.execute("SELECT type, tts_entry_id FROM play_history ORDER BY timestamp").fetchall()
+            tts_id = conn.execute("SELECT id FROM tts_entries").fetchone()[0]
+            conn.close()
+
+        self.assertEqual(rows, [('dj', tts_id), ('song', None)])
+
+class TestTranscriptBackfill(unittest.TestCase):
+
+    def test_backfill_copies_txt_files_once(self):
+        """Test empty entries and unknown DJ audio get their .txt transcript and plays are linked"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "ai_radio.db")
+            conn = sqlite3.connect(db_path)
+            with open(SCHEMA) as f:
+                conn.executescript(f.read())
+            conn.close()
+            for name, text in [("intro_1700000000", '"Up next"\n'), ("outro_1700000500", "That was it")]:
+                with open(os.path.join(tmp, name + ".txt"), "w") as f:
+                    f.write(text)
+
+            manager = DatabaseManager(db_path)
+            manager.create_tts_entry(1700000000, "", "intro_1700000000.mp3", "intro_1700000000.txt")
+            manager.create_tts_entry(1700000900, "", "custom_1700000900.mp3", "custom_1700000900.txt")
+            manager.add_history_entry("dj", 1, filename=os.path.join(tmp, "outro_1700000500.mp3"))
+
+            dry = backfill_transcripts(manager, [tmp], dry_run=True)
+            counts = backfill_transcripts(manager, [tmp])
+            again = backfill_transcripts(manager, [tmp])
+            history = manager.get_history()
+            transcripts = manager.get_transcripts(["intro_1700000000.mp3", "outro_1700000500.mp3"])
+            manager.writer.close()
+            manager.close()
+
+        self.assertEqual(dry, {"filled": 1, "created": 1, "linked": 0, "missing": 1})
+        self.assertEqual(counts, {"filled": 1, "created": 1, "linked": 1, "missing": 1})
+        self.assertEqual(again, {"filled": 0, "created": 0, "linked": 0, "missing": 1})
+        self.assertEqual(transcripts, {"intro_1700000000.mp3": "Up next", "outro_1700000500.mp3": "That was it"})
+        self.assertEqual(history[0]['text'], "That was it")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -68,6 +68,79 @@ class TestAPIRoutes(unittest.TestCase):
             self.assertTrue(data['ok'])
             mock_push.assert_called_once()
     
+    def test_api_event_dj_stores_transcript(self):
+        """Test a DJ event's text goes to the database and titles the row without reading disk"""
+        with patch('app.push_event') as mock_push, \
+             patch('routes.api.save_transcript') as mock_save, \
+             patch('routes.api.get_transcripts') as mock_lookup:
+            response = self.client.get('/api/event?type=dj&audio_url=/tts/intro_1700000000.mp3&text="Hello"')
+            
+            self.assertEqual(response.status_code, 200)
+            mock_save.assert_called_once_with("intro_1700000000.mp3", '"Hello"')
+            mock_lookup.assert_not_called()
+            self.assertEqual(mock_push.call_args[0][0]['title'], "Hello")
+    
+    def test_api_event_dj_play_links_transcript(self):
+        """Test a DJ event records its play, linked to the transcript it carried"""
+        import os
+        import sqlite3
+        import database
+        from services.history import HistoryBuffer, HistoryService
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "ai_radio.db")
+            schema = os.path.join(os.path.dirname(os.path.abspath(database.__file__)), "db_init.sql")
+            conn = sqlite3.connect(db_path)
+            with open(schema) as f:
+                conn.executescript(f.read())
+            conn.close()
+            manager = database.DatabaseManager(db_path)
+            
+            try:
+                with patch('routes.api.save_transcript', manager.save_transcript), \
+                     patch('routes.api.get_transcripts', manager.get_transcripts), \
+                     patch('services.history.db_manager', manager), \
+                     patch('services.history.add_history_entry', manager.add_history_entry), \
+                     patch('services.history.get_db_history', manager.get_history), \
+                     patch('services.history.get_transcripts', manager.get_transcripts), \
+                     patch('app.history_service', HistoryService(buffer=HistoryBuffer(10))), \
+                     patch('app.socketio') as mock_socketio:
+                    response = self.client.get('/api/event?type=dj&audio_url=/tts/intro_1700000000.mp3'
+                                               '&text=Coming+up+next&time=1700000000000')
+                    manager.writer.flush(timeout=5)
+                
+                self.assertEqual(response.status_code, 200)
+                mock_socketio.emit.assert_called_once()
+                play = manager.get_history(limit=1)[0]
+                self.assertEqual((play['type'], play['text']), ('dj', "Coming up next"))
+                self.assertEqual(play['tts_entry_id'],
+                                 manager.get_tts_entry_by_filename("intro_1700000000.mp3")['id'])
+            finally:
+                manager.close()
+    
+    def test_api_events_batch(self):
+        """Test batched event ingest counts accepted and rejected events"""
+        with patch('routes.api.ingest_event', side_effect=["song", None]) as mock_ingest:
+            response = self.client.post('/api/events',
+                                      data=json.dumps([
+                                          {"type": "song", "title": "Test", "artist": "Artist"},
+                                          {"type": "bogus"},
+                                          "not an event"
+                                      ]),
+                                      content_type='application/json')
+            
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertEqual(data['accepted'], 1)
+            self.assertEqual(data['rejected'], 2)
+            self.assertEqual(mock_ingest.call_count, 2)
+    
+    def test_api_events_rejects_non_json(self):
+        """Test batched event ingest requires a JSON body"""
+        response = self.client.post('/api/events', data='type=song')
+        
+        self.assertEqual(response.status_code, 400)
+    
     def test_api_event_invalid_type(self):
         """Test API event endpoint with invalid type"""
         response = self.client.get('/api/event?type=invalid')
@@ -110,6 +183,73 @@ class TestAPIRoutes(unittest.TestCase):
             self.assertIn('history', data)
             self.assertEqual(len(data['history']), 2)
     
+    def test_api_history_next_cursor(self):
+        """Test a full history page advertises the cursor for the next page"""
+        mock_history = [
+            {"title": "Song 2", "time": 2000, "cursor": "2000:2"},
+            {"title": "Song 1", "time": 1000, "cursor": "1000:1"}
+        ]
+        
+        with patch('routes.api.history_service') as mock_service:
+            mock_service.get_history.return_value = mock_history
+            
+            response = self.client.get('/api/history?limit=2&before=3000:3')
+            
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers.get('X-Next-Cursor'), "1000:1")
+            mock_service.get_history.assert_called_once_with(limit=2, before="3000:3")
+    
+    def test_api_history_since(self):
+        """Test ?since= returns only the changes object"""
+        changes = {"seq": 12, "items": [{"title": "Song 3", "seq": 12}], "reset": False}
+        
+        with patch('routes.api.history_service') as mock_service:
+            mock_service.get_history_since.return_value = changes
+            
+            response = self.client.get('/api/history?since=11&limit=20')
+            
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data), changes)
+            mock_service.get_history_since.assert_called_once_with(11, limit=20)
+            mock_service.get_history.assert_not_called()
+        
+        self.assertEqual(self.client.get('/api/history?since=latest').status_code, 400)
+    
+    def test_api_history_rejects_bad_cursor(self):
+        """Test a malformed cursor is a client error"""
+        response = self.client.get('/api/history?before=yesterday')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_api_search(self):
+        """Test search passes paging through and offers the next offset"""
+        mock_results = [{"kind": "dj", "id": 1, "snippet": "<mark>rain</mark> tonight"}] * 2
+        
+        with patch('routes.api.search_database', return_value=mock_results) as mock_search:
+            response = self.client.get('/api/search?q=rain&type=dj&limit=2&offset=4')
+            
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertEqual(data['results'], mock_results)
+            self.assertEqual(data['next_offset'], 6)
+            mock_search.assert_called_once_with("rain", limit=2, offset=4, kind="dj")
+    
+    def test_api_search_rejects_bad_input(self):
+        """Test a missing query or unknown type is a client error"""
+        self.assertEqual(self.client.get('/api/search').status_code, 400)
+        self.assertEqual(self.client.get('/api/search?q=x&type=album').status_code, 400)
+    
+    def test_api_db_status(self):
+        """Test the database status combines stats, storage and the maintenance report"""
+        with patch('routes.api.get_stats', return_value={"song_history_count": 3}), \
+             patch('routes.api.get_storage_info', return_value={"db_bytes": 4096, "wal_bytes": 0}), \
+             patch('routes.api.read_maintenance_report', return_value={"duration_ms": 12.5}):
+            response = self.client.get('/api/db/status')
+            
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertEqual(data['storage']['db_bytes'], 4096)
+            self.assertEqual(data['maintenance']['duration_ms'], 12.5)
+    
     def test_api_tts_status(self):
         """Test TTS status API endpoint"""
         mock_status = {
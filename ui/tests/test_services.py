@@ -1,6 +1,7 @@
 """
 Tests for service layer
 """
+import os
 import unittest
 import tempfile
 import json
@@ -8,14 +9,236 @@ import time
 from pathlib import Path
 from unittest.mock import patch, mock_open, MagicMock
 
-from services.metadata import MetadataService
-from services.history import HistoryService  
+from services.metadata import CurrentTrackCache, DurationMemo, MetadataService, duration_memo
+from services.history import HistoryBuffer, HistoryService
 from services.tts import TTSService
+from services.queue import QueueService
+
+class TestCurrentTrackCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.now_json = Path(self.tmp.name) / "now_metadata.json"
+        self.write_now("First")
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def write_now(self, title):
+        self.now_json.write_text(json.dumps({"title": title, "artist": "Artist"}))
+    
+    def test_concurrent_callers_share_one_build(self):
+        """Test N concurrent callers wait for a single build"""
+        import threading
+        cache = CurrentTrackCache()
+        builds = []
+        
+        def build():
+            builds.append(1)
+            time.sleep(0.1)
+            return {"title": "Song"}, None
+        
+        threads = [threading.Thread(target=cache.get, args=("scope", lambda: 1, build)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(cache.get("scope", lambda: 1, build), {"title": "Song"})
+    
+    def test_rebuilds_on_key_change_scope_change_or_expiry(self):
+        """Test only a new source version, new scope or expired TTL triggers a rebuild"""
+        cache = CurrentTrackCache(check_interval=0)
+        version = [1]
+        build = lambda: ({"n": cache.builds}, None)
+        
+        cache.get("a", lambda: version[0], build)
+        cache.get("a", lambda: version[0], build)
+        self.assertEqual(cache.builds, 1)
+        
+        version[0] = 2
+        cache.get("a", lambda: version[0], build)
+        cache.get("b", lambda: version[0], build)
+        self.assertEqual(cache.builds, 3)
+        
+        version[0] = 3
+        cache.get("b", lambda: version[0], lambda: ({}, 0.01))
+        time.sleep(0.02)
+        cache.get("b", lambda: version[0], build)
+        self.assertEqual(cache.builds, 5)
+    
+    @patch('services.metadata.config')
+    def test_services_share_cache_until_file_changes(self, mock_config):
+        """Test separate MetadataService instances read the file once, and again after it changes"""
+        mock_config.NOW_JSON = self.now_json
+        mock_config.NOW_TXT = Path(self.tmp.name) / "nowplaying.txt"
+        mock_config.REMAINING_JSON = Path(self.tmp.name) / "remaining_time.json"
+        cache = CurrentTrackCache(check_interval=0)
+        first, second = MetadataService(cache=cache), MetadataService(cache=cache)
+        
+        with patch.object(MetadataService, '_get_track_duration', return_value=None):
+            self.assertEqual(first.get_current_track()["title"], "First")
+            self.assertEqual(second.get_current_track()["title"], "First")
+            self.assertEqual(cache.builds, 1)
+            
+            self.write_now("Second")
+            os.utime(self.now_json, ns=(0, 10**18))  # a distinct mtime even on coarse clocks
+            self.assertEqual(second.get_current_track()["title"], "Second")
+            self.assertEqual(cache.builds, 2)
+
+class TestHistoryBuffer(unittest.TestCase):
+    
+    def setUp(self):
+        self.buffer = HistoryBuffer(3)
+        self.buffer.load([{"title": "Old 2"}, {"title": "Old 1"}])
+    
+    def test_since_returns_only_newer_items(self):
+        """Test items carry consecutive seq numbers and since() returns the newer ones"""
+        start = self.buffer.seq
+        self.buffer.append({"title": "New"})
+        
+        self.assertGreaterEqual(start, int(time.time() * 1000) - 60_000)  # numbered from startup time
+        self.assertEqual([item["title"] for item in self.buffer.latest(3)], ["New", "Old 2", "Old 1"])
+        self.assertEqual([item["title"] for item in self.buffer.since(start)], ["New"])
+        self.assertEqual(self.buffer.since(start + 1), [])
+    
+    def test_unknown_seq_needs_reset(self):
+        """Test a seq that fell out of the buffer or is from another run gets None"""
+        first = self.buffer.seq - 1
+        for i in range(3):
+            self.buffer.append({"title": f"New {i}"})
+        
+        self.assertIsNone(self.buffer.since(first))
+        self.assertIsNone(self.buffer.since(self.buffer.seq + 1))
+        self.assertEqual(len(self.buffer.since(self.buffer.seq - 2)), 2)
+    
+    def test_listeners_get_each_new_item(self):
+        """Test listeners are called once per appended item, and the seed is not broadcast"""
+        received = []
+        self.buffer.add_listener(received.append)
+        self.buffer.load([{"title": "Ignored"}])  # already loaded
+        self.buffer.append({"title": "New"})
+        
+        self.assertEqual(received, [{"title": "New", "seq": self.buffer.seq}])
+    
+    def test_clear_resets_clients(self):
+        """Test a seq from before a clear is told to start over rather than given no changes"""
+        seq = self.buffer.seq
+        self.buffer.clear()
+        self.assertIsNone(self.buffer.since(seq))
+        self.assertEqual(self.buffer.since(self.buffer.seq), [])
+        
+        self.buffer.append({"title": "New"})
+        self.assertIsNone(self.buffer.since(seq))
+    
+    def test_set_cursor_updates_buffered_item(self):
+        """Test a cursor set after the commit shows up in later copies only"""
+        item = self.buffer.append({"title": "New"})
+        before = self.buffer.latest(1)[0]
+        self.buffer.set_cursor(item, "3000:3")
+        
+        self.assertNotIn("cursor", before)
+        self.assertEqual(self.buffer.latest(1)[0]["cursor"], "3000:3")
+
+class TestHistoryServiceBuffer(unittest.TestCase):
+    
+    def setUp(self):
+        self.rows = [{"id": 2, "type": "song", "timestamp": 2000, "title": "Song 2"},
+                     {"id": 1, "type": "song", "timestamp": 1000, "title": "Song 1"}]
+        self.service = HistoryService(buffer=HistoryBuffer(10))
+    
+    def add_entry(self, entry_type, timestamp, on_commit=None, **kwargs):
+        on_commit(3)  # the writer committed the row as ID 3
+    
+    def test_first_page_is_served_from_memory(self):
+        """Test the database is read once to seed the buffer, then writes keep it current"""
+        with patch('services.history.get_db_history', return_value=self.rows) as mock_db, \
+             patch('services.history.add_history_entry', side_effect=self.add_entry):
+            self.assertEqual([item["title"] for item in self.service.get_history(limit=5)], ["Song 2", "Song 1"])
+            seq = self.service.get_history(limit=1)[0]["seq"]
+            
+            self.assertTrue(self.service.add_track({"title": "Song 3", "artist": "A", "time": 3000}))
+            history = self.service.get_history(limit=5)
+            changes = self.service.get_history_since(seq)
+            stale = self.service.get_history_since(seq - 5)
+        
+        mock_db.assert_called_once()
+        self.assertEqual(history[0]["title"], "Song 3")
+        self.assertEqual(history[0]["cursor"], "3000:3")
+        self.assertEqual([item["title"] for item in changes["items"]], ["Song 3"])
+        self.assertEqual(changes["seq"], seq + 1)
+        self.assertFalse(changes["reset"])
+        self.assertTrue(stale["reset"])
+        self.assertEqual(len(stale["items"]), 3)
+    
+    def test_older_pages_still_come_from_database(self):
+        """Test a cursor request bypasses the buffer"""
+        with patch('services.history.get_db_history', return_value=self.rows[1:]) as mock_db:
+            history = self.service.get_history(limit=5, before="2000:2")
+        
+        mock_db.assert_called_once_with(limit=5, before=(2000, 2))
+        self.assertEqual(history[0]["cursor"], "1000:1")
+
+class TestHistoryServiceDatabase(unittest.TestCase):
+    """HistoryService against a scratch database instead of mocks"""
+
+    def setUp(self):
+        import sqlite3
+        import database
+        self.tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.tmp.name, "ai_radio.db")
+        schema = os.path.join(os.path.dirname(os.path.abspath(database.__file__)), "db_init.sql")
+        conn = sqlite3.connect(db_path)
+        with open(schema) as f:
+            conn.executescript(f.read())
+        conn.close()
+        self.manager = database.DatabaseManager(db_path)
+
+        for name, target in (('db_manager', self.manager),
+                             ('add_history_entry', self.manager.add_history_entry),
+                             ('get_db_history', self.manager.get_history),
+                             ('get_transcripts', self.manager.get_transcripts)):
+            patcher = patch(f'services.history.{name}', target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.service = HistoryService(buffer=HistoryBuffer(10))
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmp.cleanup()
+
+    def test_buffered_dj_item_matches_database_row(self):
+        """Test a DJ item served from memory carries the same transcript and clip URL as after a reload"""
+        self.manager.create_tts_entry(1700000000, "Coming up next", "intro_1700000000.mp3", "intro_1700000000.txt")
+        self.assertTrue(self.service.add_track({"type": "dj", "title": "DJ Intro", "artist": "AI DJ",
+                                                "filename": "/opt/ai-radio/tts/intro_1700000000.mp3",
+                                                "time": 1700000000000}))
+
+        buffered = self.service.get_history(limit=1)[0]
+        reloaded = self.service.get_history(limit=1, before="9999999999999:0")[0]
+
+        self.assertEqual(buffered["text"], "Coming up next")
+        self.assertEqual(buffered["audio_url"], "/api/tts/intro_1700000000.mp3")
+        for item in (buffered, reloaded):
+            item.pop("seq", None)
+            item.pop("created_at")
+        self.assertEqual(buffered, reloaded)
 
 class TestMetadataService(unittest.TestCase):
     
     def setUp(self):
         self.service = MetadataService()
+        duration_memo.clear()
+        # Duration lookups fall back to the tracks table; keep tests off the real database
+        lookup = patch('services.metadata.lookup_track_info', return_value=None)
+        self.mock_lookup = lookup.start()
+        self.addCleanup(lookup.stop)
+        index = patch('services.metadata.library_index')
+        self.mock_index = index.start()
+        self.mock_index.get.return_value = None
+        self.mock_index.find_track.return_value = None
+        self.addCleanup(index.stop)
     
     @patch('services.metadata.config')
     def test_get_current_track_from_json(self, mock_config):
@@ -53,6 +276,69 @@ class TestMetadataService(unittest.TestCase):
             self.assertEqual(result["title"], "Unknown title")
             self.assertEqual(result["artist"], "Unknown artist")
     
+    @patch('services.metadata.config')
+    def test_remaining_time_from_daemon_cache(self, mock_config):
+        """Test time_remaining is extrapolated from the daemon's measurement"""
+        now = time.time()
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            json.dump({"remaining": 100.0, "measured_at": now - 10,
+                       "track_started_at": 1000.0, "duration": 200.0}, f)
+            mock_config.REMAINING_JSON = Path(f.name)
+        
+        try:
+            data = {"track_started_at": 1000.0}
+            self.service._apply_remaining_time(data)
+            self.assertAlmostEqual(data["time_remaining"], 90.0, delta=1)
+            self.assertEqual(data["duration"], 200.0)
+            
+            # A measurement for another track is ignored
+            other = {"track_started_at": 2000.0}
+            self.service._apply_remaining_time(other)
+            self.assertNotIn("time_remaining", other)
+        finally:
+            Path(f.name).unlink()
+    
+    def test_track_duration_is_memoized_without_searching(self):
+        """Test duration comes from the file named in the tracks table, once, and misses are cached"""
+        self.mock_lookup.return_value = {"filename": "/mnt/music/a.mp3"}
+        
+        with patch('services.metadata.read_audio_duration', return_value=181.5) as mock_read, \
+             patch('subprocess.run') as mock_run:
+            self.assertEqual(self.service._get_track_duration("Song", "Artist", "Album"), 181.5)
+            self.assertEqual(self.service._get_track_duration(" song ", "ARTIST", "album"), 181.5)
+            mock_read.assert_called_once_with("/mnt/music/a.mp3")
+            
+            mock_read.return_value = None
+            self.assertIsNone(self.service._get_track_duration("Other", "Artist", filename="/mnt/music/b.mp3"))
+            self.assertIsNone(self.service._get_track_duration("Other", "Artist", filename="/mnt/music/b.mp3"))
+            self.assertEqual(mock_read.call_count, 3)  # own file, then the tracks table's; the retry is memoized
+            mock_run.assert_not_called()
+    
+    def test_track_duration_prefers_library_index(self):
+        """Test indexed files answer without reading audio or the tracks table"""
+        self.mock_index.get.return_value = {"duration": 240.0}
+        self.mock_index.find_track.return_value = {"duration": 199.0}
+        
+        with patch('services.metadata.read_audio_duration') as mock_read:
+            self.assertEqual(self.service._get_track_duration("Song", "Artist", filename="/mnt/music/a.mp3"), 240.0)
+            self.assertEqual(self.service._get_track_duration("Other", "Artist", "Album"), 199.0)
+            self.mock_index.find_track.assert_called_once_with("Artist", "Other", "Album")
+            mock_read.assert_not_called()
+            self.mock_lookup.assert_not_called()
+    
+    def test_duration_memo_expires_misses_and_evicts(self):
+        """Test negative entries expire and the memo stays within its size"""
+        memo = DurationMemo(size=2, negative_ttl=0.01)
+        memo.put(("a",), None)
+        self.assertEqual(memo.get(("a",)), (True, None))
+        time.sleep(0.02)
+        self.assertEqual(memo.get(("a",)), (False, None))
+        
+        for key in ("b", "c", "d"):
+            memo.put((key,), 1.0)
+        self.assertEqual(memo.get(("b",)), (False, None))
+        self.assertEqual(memo.get(("d",)), (True, 1.0))
+    
     def test_parse_telnet_metadata(self):
         """Test parsing telnet metadata response"""
         raw_response = """--- 0 ---
@@ -239,5 +525,40 @@ class TestTTSService(unittest.TestCase):
         self.assertTrue(result)
         mock_popen.assert_called_once()
 
+class TestQueueService(unittest.TestCase):
+    
+    def setUp(self):
+        self.service = QueueService()
+    
+    @patch('services.queue.get_client')
+    def test_read_queue_pipelines_metadata(self, mock_get_client):
+        """Test request.metadata calls are sent as one pipelined batch"""
+        client = MagicMock()
+        client.command.return_value = ["12 13"]
+        client.pipeline_raw.return_value = [
+            b'title="Song A"\r\nartist="Artist A"\r\nfilename="/mnt/music/a.mp3"',
+            b'title="Song B"\r\nalbumartist="Artist B"\r\ninitial_uri="file:///mnt/music/b.mp3"',
+        ]
+        mock_get_client.return_value = client
+        
+        tracks = self.service.read_queue()
+        
+        client.pipeline_raw.assert_called_once_with(["request.metadata 12", "request.metadata 13"])
+        self.assertEqual(tracks[0]["rid"], 12)
+        self.assertEqual(tracks[0]["artwork_url"], "/api/cover?file=/mnt/music/a.mp3")
+        self.assertEqual(tracks[1]["artist"], "Artist B")
+        self.assertEqual(tracks[1]["filename"], "/mnt/music/b.mp3")
+    
+    def test_refresh_in_background_single_flight(self):
+        """Test only one background refresh runs at a time"""
+        import threading
+        release = threading.Event()
+        
+        with patch.object(self.service, 'refresh', side_effect=lambda: release.wait(5)):
+            self.assertTrue(self.service.refresh_in_background())
+            self.assertFalse(self.service.refresh_in_background())
+            release.set()
+            self.service._refresh_thread.join(5)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file